@@ -0,0 +1,115 @@
+"""
+Cold start benchmarks: time to import the modules of the engine.
+
+Every case runs in a fresh interpreter (so nothing is cached in
+sys.modules), --repeat times; the best time is reported together with the
+optional heavy dependencies (networkx, matplotlib, process pools) that the
+case ended up loading. Results can be written as JSON and compared with a
+previous result file, like bench_suite.py.
+
+Usage:
+    python benchmarks/bench_import.py --repeat 5 --output imports.json
+    python benchmarks/bench_import.py --compare imports.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from bench_suite import metadata
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+HEAVY = ["networkx", "matplotlib", "concurrent.futures.process"]
+
+# Case name -> code to time. The array backend case builds and rewrites a
+# small mesh, i.e. it is the whole start of a batch run without drawing.
+CASES: Dict[str, str] = {
+    "numpy": "import numpy",
+    "graph": "import graph",
+    "productions.p0": "import productions.p0",
+    "visualization": "import visualization",
+    "animation": "import animation",
+    "apply_array": (
+        "from generators import build, regular\n"
+        "from productions.p0 import P0\n"
+        "build(*regular(4, 4), backend='array').apply_all(P0())"
+    ),
+    "first_draw": (
+        "import os, tempfile\n"
+        "from generators import build, regular\n"
+        "from visualization import draw\n"
+        "with tempfile.TemporaryDirectory() as tmp:\n"
+        "    draw(build(*regular(4, 4)), os.path.join(tmp, 'g.png'), mode='fast')"
+    ),
+}
+
+_RUNNER = """
+import json, sys, time
+start = time.perf_counter()
+exec(compile({code!r}, "<case>", "exec"))
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [name for name in {heavy!r} if name in sys.modules]]))
+"""
+
+
+def measure(code: str, repeat: int) -> Tuple[float, List[str]]:
+    """
+    Runs a case in fresh interpreters.
+
+    Returns:
+        Best time in seconds and the heavy modules the case imported
+    """
+    env = dict(os.environ)
+    paths = [str(SRC), str(Path(__file__).resolve().parent), env.get("PYTHONPATH", "")]
+    env["PYTHONPATH"] = os.pathsep.join(path for path in paths if path)
+    best, loaded = float("inf"), []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _RUNNER.format(code=code, heavy=HEAVY)],
+                                capture_output=True, text=True, check=True, env=env,
+                                cwd=SRC).stdout
+        seconds, loaded = json.loads(output.splitlines()[-1])
+        best = min(best, seconds)
+    return best, loaded
+
+
+def compare(results: List[dict], baseline_path: str) -> None:
+    """Prints the time of every case relative to a previous result file."""
+    with open(baseline_path) as f:
+        baseline = {record["case"]: record for record in json.load(f)["results"]}
+    print(f"\nrelative to {baseline_path} (time ratio, < 1 is faster):")
+    for record in results:
+        old = baseline.get(record["case"])
+        if old is None or not old["seconds"]:
+            continue
+        print(f"{record['case']:<16} {record['seconds'] / old['seconds']:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per case")
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--compare", help="previous JSON results to compare with")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'case':<16} {'time [ms]':>9}  heavy modules loaded")
+    for case in args.cases:
+        seconds, loaded = measure(CASES[case], args.repeat)
+        results.append({"case": case, "seconds": seconds, "loaded": loaded})
+        print(f"{case:<16} {seconds * 1000:9.1f}  {', '.join(loaded) or '-'}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": metadata(), "results": results}, f, indent=1)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Serial vs. parallel matching of P0 on a quad grid.
+
+Usage:
+    python benchmarks/bench_parallel.py --size 60 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import time
+
+from generators import build, regular
+from productions.p0 import P0
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=60, help="grid side (quads)")
+    parser.add_argument("--backend", default="networkx", choices=["networkx", "array"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    g = build(*regular(args.size, args.size), backend=args.backend)
+    plan = P0().plan
+    print(f"{args.size}x{args.size} grid, {args.backend} backend, {os.cpu_count()} CPUs")
+
+    serial, elapsed = timed(lambda: g.find_subgraph_isomorphisms(plan))
+    expected = {frozenset(m.items()) for m in serial}
+    print(f"find serial      {elapsed:8.3f}s  {len(serial)} matches")
+    for workers in args.workers:
+        found, elapsed = timed(lambda: g.find_subgraph_isomorphisms(plan, workers=workers))
+        same = {frozenset(m.items()) for m in found} == expected
+        print(f"find workers={workers:<3} {elapsed:8.3f}s  {len(found)} matches, same={same}")
+
+    _, elapsed = timed(lambda: build(*regular(args.size, args.size), backend=args.backend).apply(P0()))
+    print(f"apply serial     {elapsed:8.3f}s")
+    for workers in args.workers:
+        h = build(*regular(args.size, args.size), backend=args.backend)
+        applied, elapsed = timed(lambda: h.apply(P0(), workers=workers))
+        print(f"apply workers={workers:<2} {elapsed:8.3f}s  {applied} applied")
+
+
+if __name__ == "__main__":
+    main()
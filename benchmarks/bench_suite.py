@@ -0,0 +1,194 @@
+"""
+Scaling benchmarks: building, matching and applying P0 on synthetic meshes.
+
+Every phase is run on a freshly built graph for each mesh kind, backend and
+size. Times are the best of --repeat runs; peak memory is measured in a
+separate run under tracemalloc (it slows allocations down) and counts only
+what the phase itself allocates. Results are written as JSON, and a previous
+result file can be given with --compare to print time ratios per phase.
+
+Usage:
+    python benchmarks/bench_suite.py --sizes 100 10000 --output results.json
+    python benchmarks/bench_suite.py --output new.json --compare results.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import matplotlib
+import networkx
+import numpy
+
+from generators import MESHES, build, side_for
+from productions.p0 import P0
+
+SIZES = [10, 100, 1000, 10 ** 4, 10 ** 5, 10 ** 6]
+BACKENDS = ["networkx", "array"]
+
+
+def _draw(g, mode: str) -> int:
+    from visualization import draw
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        draw(g, os.path.join(tmp, "graph.png"), mode=mode)
+    return 0
+
+
+# Phase name -> (needs a built graph, operation). Build phases get the
+# generated elements, the others a graph built from them with add_edges.
+PHASES: Dict[str, Tuple[bool, Callable]] = {
+    "build": (False, lambda elements, backend: build(*elements, backend=backend)),
+    "build_bulk": (False, lambda elements, backend: build(*elements, bulk=True, backend=backend)),
+    "match": (True, lambda g: len(g.find_subgraph_isomorphisms(P0().plan))),
+    "apply": (True, lambda g: g.apply(P0())),
+    "apply_incremental": (True, lambda g: g.apply(P0(), incremental=True)),
+    "apply_all": (True, lambda g: g.apply_all(P0())),
+    "adjacency": (True, lambda g: sum(len(g.adjacent_hyperedges(label, "Q", shared=2).labels)
+                                      for label in g.hyperedges_with("Q").labels)),
+    "draw": (True, lambda g: _draw(g, "fast")),
+    "draw_networkx": (True, lambda g: _draw(g, "networkx")),
+}
+
+# Phases that are too slow for big graphs run only up to these sizes by
+# default (apply searches the whole graph again after every rewrite).
+LIMITS = {"apply": 10 ** 4, "draw_networkx": 10 ** 4}
+
+
+def _prepare(phase: str, mesh: str, side: int, backend: str) -> Callable[[], object]:
+    """Builds the input of a phase and returns the call to measure."""
+    needs_graph, operation = PHASES[phase]
+    elements = MESHES[mesh](side, side)
+    if needs_graph:
+        g = build(*elements, bulk=True, backend=backend)
+        return lambda: operation(g)
+    return lambda: operation(elements, backend)
+
+
+def measure(phase: str, mesh: str, side: int, backend: str, repeat: int,
+            memory: bool) -> Tuple[float, Optional[int], object]:
+    """
+    Runs one phase.
+
+    Returns:
+        Best time in seconds, peak memory in bytes (None if not measured)
+        and the value returned by the phase (graph size or number of
+        matches/applications)
+    """
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        call = _prepare(phase, mesh, side, backend)
+        start = time.perf_counter()
+        result = call()
+        best = min(best, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        call = _prepare(phase, mesh, side, backend)
+        tracemalloc.start()
+        try:
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    if not isinstance(result, int):
+        count = result.count_nodes()
+        result = count.normal + count.hyper
+    return best, peak, result
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata() -> dict:
+    """Environment the results were measured in."""
+    return {
+        "commit": _commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "networkx": networkx.__version__,
+        "matplotlib": matplotlib.__version__,
+    }
+
+
+def _key(record: dict) -> tuple:
+    return record["mesh"], record["backend"], record["side"], record["phase"]
+
+
+def compare(results: List[dict], baseline_path: str) -> None:
+    """Prints the time of every phase relative to a previous result file."""
+    with open(baseline_path) as f:
+        baseline = {_key(record): record for record in json.load(f)["results"]}
+    print(f"\nrelative to {baseline_path} (time ratio, < 1 is faster):")
+    for record in results:
+        old = baseline.get(_key(record))
+        if old is None or not old["seconds"]:
+            continue
+        ratio = record["seconds"] / old["seconds"]
+        mesh, backend, side, phase = _key(record)
+        print(f"{mesh:<10} {backend:<9} {side:>5} {phase:<18} {ratio:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="approximate numbers of nodes and hyperedges")
+    parser.add_argument("--meshes", nargs="+", default=list(MESHES), choices=list(MESHES))
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--phases", nargs="+", default=list(PHASES), choices=list(PHASES))
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per phase")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--all-sizes", action="store_true",
+                        help="run slow phases (apply, draw_networkx) at every size")
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--compare", help="previous JSON results to compare with")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'mesh':<10} {'backend':<9} {'side':>5} {'elements':>9} {'phase':<18} "
+          f"{'time [s]':>9} {'peak [MB]':>9} {'result':>8}")
+    for mesh in args.meshes:
+        for backend in args.backends:
+            for size in args.sizes:
+                side = side_for(size)
+                for phase in args.phases:
+                    if not args.all_sizes and size > LIMITS.get(phase, size):
+                        continue
+                    seconds, peak, result = measure(phase, mesh, side, backend,
+                                                    args.repeat, not args.no_memory)
+                    record = {"mesh": mesh, "backend": backend, "side": side, "elements": size,
+                              "phase": phase, "seconds": seconds, "peak_bytes": peak,
+                              "result": result}
+                    results.append(record)
+                    peak_mb = f"{peak / 2 ** 20:9.1f}" if peak is not None else f"{'-':>9}"
+                    print(f"{mesh:<10} {backend:<9} {side:>5} {size:>9} {phase:<18} "
+                          f"{seconds:9.4f} {peak_mb} {result:>8}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": metadata(), "results": results}, f, indent=1)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
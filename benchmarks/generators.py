@@ -0,0 +1,94 @@
+"""
+Graph generators for benchmarks.
+"""
+
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from node import Node  # noqa: E402
+from edge import HyperEdge  # noqa: E402
+from graph import Graph  # noqa: E402
+
+
+def quad_mesh(cols: int, rows: int, jitter: float = 0.0, holes: float = 0.0,
+              mixed_r: float = 0.0, seed: int = 0) -> Tuple[List[Node], List[HyperEdge]]:
+    """
+    Builds the elements of a cols x rows quad mesh, deterministically for a given seed.
+
+    Args:
+        cols: Number of quads along x
+        rows: Number of quads along y
+        jitter: Maximum random shift of a vertex along each axis (in quad sizes, < 0.5)
+        holes: Fraction of quads left out (their vertices and sides are
+            dropped if no other quad uses them)
+        mixed_r: Fraction of quads with r=1
+        seed: Seed of the random generator
+
+    Returns:
+        Nodes and hyperedges (E sides with b=1 on the boundary, then Q quads)
+    """
+    rng = random.Random(seed)
+    cells = [(i, j) for j in range(rows) for i in range(cols) if not holes or rng.random() >= holes]
+
+    nodes: Dict[Tuple[int, int], Node] = {}
+    for i, j in cells:
+        for corner in ((i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1)):
+            nodes.setdefault(corner, None)
+    for (i, j) in sorted(nodes, key=lambda c: (c[1], c[0])):
+        dx, dy = (rng.uniform(-jitter, jitter), rng.uniform(-jitter, jitter)) if jitter else (0, 0)
+        nodes[i, j] = Node(i + dx, j + dy, f"v{i}_{j}")
+
+    uses: Dict[Tuple[Tuple[int, int], Tuple[int, int]], int] = {}
+    quads = []
+    for i, j in cells:
+        corners = ((i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1))
+        for k in range(4):
+            side = tuple(sorted((corners[k], corners[(k + 1) % 4])))
+            uses[side] = uses.get(side, 0) + 1
+        r = 1 if mixed_r and rng.random() < mixed_r else 0
+        quads.append(HyperEdge(tuple(nodes[c] for c in corners), "Q", r=r))
+
+    edges = [HyperEdge((nodes[a], nodes[b]), "E", b=int(count == 1))
+             for (a, b), count in uses.items()]
+    return list(nodes.values()), edges + quads
+
+
+def regular(cols: int, rows: int, seed: int = 0):
+    """Elements of a full regular grid."""
+    return quad_mesh(cols, rows, seed=seed)
+
+
+def irregular(cols: int, rows: int, seed: int = 0):
+    """Elements of a grid with shifted vertices and 10% of the quads missing."""
+    return quad_mesh(cols, rows, jitter=0.3, holes=0.1, seed=seed)
+
+
+def mixed(cols: int, rows: int, seed: int = 0):
+    """Elements of a full grid with half of the quads already marked (r=1)."""
+    return quad_mesh(cols, rows, mixed_r=0.5, seed=seed)
+
+
+MESHES = {"grid": regular, "irregular": irregular, "mixed": mixed}
+
+
+def side_for(elements: int) -> int:
+    """Side of a square grid with about the given number of nodes and hyperedges (~4 per quad)."""
+    return max(1, round((elements / 4) ** 0.5))
+
+
+def build(nodes: List[Node], edges: List[HyperEdge], bulk: bool = False, **graph_args) -> Graph:
+    """Builds a graph from elements, one by one (add_node/add_edge) or with add_nodes/add_edges."""
+    g = Graph(**graph_args)
+    if bulk:
+        g.add_nodes(nodes)
+        g.add_edges(edges)
+    else:
+        for node in nodes:
+            g.add_node(node)
+        for edge in edges:
+            g.add_edge(edge)
+    return g
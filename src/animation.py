@@ -0,0 +1,314 @@
+"""
+Recording the history of a graph as an animation.
+
+A Recorder draws the graph once, like the fast mode of visualization.draw
+(one collection per kind of element), and then follows the graph's
+operation log. When a frame is taken, only the changed elements are
+touched: r updates recolour their polygon, removed elements are made
+transparent and added ones go into a new collection for that frame. When
+the hidden elements outnumber the live ones, or the per-frame collections
+pile up, the live elements are merged back into one collection per kind,
+so long runs don't slow down drawing. The figure is never rebuilt, and
+frames are either saved as a numbered PNG sequence or streamed to a
+matplotlib movie writer (GIF through Pillow, MP4 and others through
+ffmpeg). Like visualization, the module imports matplotlib only when the
+first Recorder is created.
+"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from graph import Graph
+from oplog import Operation
+from visualization import BBox, R_COLORS, _pyplot, _shapes
+
+if TYPE_CHECKING:
+    from matplotlib.animation import AbstractMovieWriter
+    from matplotlib.collections import Collection
+
+PathLike = Union[str, Path]
+
+# The layers are merged when there are more of them than this (or when
+# more elements are hidden than drawn).
+MAX_LAYERS = 32
+
+
+@lru_cache(maxsize=None)
+def _rgba() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """RGBA colours of polygons (per r), lines and points."""
+    from matplotlib.colors import to_rgba_array
+    return to_rgba_array(R_COLORS), to_rgba_array(["gray"])[0], to_rgba_array(["steelblue"])[0]
+
+
+class _Layer:
+    """
+    A collection together with the per-element colours the recorder edits.
+
+    The geometry (shapes, or xy of points) is kept too, so that the live
+    elements of several layers can be merged into a new collection.
+    """
+
+    def __init__(self, collection: 'Collection', rgba: np.ndarray, polygons: bool,
+                 shapes: Optional[list] = None, xy: Optional[np.ndarray] = None):
+        self.collection = collection
+        self.rgba = rgba
+        self.polygons = polygons
+        self.shapes = shapes
+        self.xy = xy
+        self.hidden = 0
+        self.dirty = False
+
+    @property
+    def kind(self) -> str:
+        if self.shapes is None:
+            return "points"
+        return "polygons" if self.polygons else "lines"
+
+    def set_r(self, i: int, r: int) -> None:
+        if self.polygons:
+            r_rgba = _rgba()[0]
+            self.rgba[i] = r_rgba[min(max(r, 0), len(r_rgba) - 1)]
+            self.dirty = True
+
+    def hide(self, i: int) -> None:
+        self.rgba[i, 3] = 0.0
+        self.hidden += 1
+        self.dirty = True
+
+    def flush(self) -> None:
+        from matplotlib.collections import LineCollection
+
+        if self.dirty:
+            if isinstance(self.collection, LineCollection):
+                self.collection.set_color(self.rgba)
+            else:
+                self.collection.set_facecolor(self.rgba)
+            self.dirty = False
+
+
+class Recorder:
+    """
+    Records frames of a changing graph into an animation or a PNG sequence.
+
+    Example:
+        with Recorder(graph, "draw/run.gif") as recorder:
+            for production in productions:
+                graph.apply(production)
+                recorder.frame()
+
+    The recorder subscribes to the graph's operation log (attaching one
+    for its lifetime if the graph has none), so it sees every change made
+    through the Graph API, including rollbacks. Labels are not drawn.
+    """
+
+    def __init__(self, graph: Graph, path: PathLike, fps: int = 5, dpi: int = 100,
+                 bbox: Optional[BBox] = None, frame_on_commit: bool = False,
+                 writer: Optional['AbstractMovieWriter'] = None):
+        """
+        Args:
+            graph: Graph to record
+            path: Output file; a path containing "{}" (e.g. "draw/run-{:04d}.png")
+                is a pattern for a PNG per frame, other paths are written by a
+                movie writer chosen by suffix (.gif: Pillow, else ffmpeg)
+            fps: Frames per second of the movie
+            dpi: Resolution of the frames
+            bbox: Optional fixed viewport (xmin, ymin, xmax, ymax); by default
+                the view follows the extent of the graph
+            frame_on_commit: If True, a frame is taken after every committed
+                transaction (every rewrite of apply, every apply_all sweep)
+            writer: Movie writer to use instead of the one chosen by suffix
+
+        Raises:
+            ValueError: If no writer is available for the file type
+        """
+        self.graph = graph
+        self.path = str(path)
+        self.dpi = dpi
+        self.bbox = bbox
+        self.frame_on_commit = frame_on_commit
+        self.frames = 0
+
+        plt = _pyplot()
+        from matplotlib import animation
+
+        self._fig, self._ax = plt.subplots(figsize=(10, 10))
+        self._ax.set_aspect("equal")
+        self._slots: Dict[str, Tuple[_Layer, int]] = {}
+        self._layers: List[_Layer] = []
+        self._pending: List[Operation] = []
+        self._draw_graph()
+
+        self._writer = None
+        if "{" not in self.path:
+            if writer is None:
+                if self.path.lower().endswith(".gif"):
+                    writer = animation.PillowWriter(fps=fps)
+                elif animation.FFMpegWriter.isAvailable():
+                    writer = animation.FFMpegWriter(fps=fps)
+                else:
+                    plt.close(self._fig)
+                    raise ValueError(f"No movie writer for {self.path} (ffmpeg is not installed)")
+            writer.setup(self._fig, self.path, dpi=dpi)
+            self._writer = writer
+
+        self._own_log = graph.log is None
+        self._log = graph.attach_log() if self._own_log else graph.log
+        self._log.subscribe(self._on_operation)
+
+    def _on_operation(self, operation: Operation) -> None:
+        if operation.kind == "commit" and self.frame_on_commit:
+            self.frame()
+        elif operation.kind not in ("begin", "commit", "abort"):
+            self._pending.append(operation)
+
+    def _add_layer(self, labels: List[str], shapes=None, r: Optional[np.ndarray] = None,
+                   xy: Optional[np.ndarray] = None, rgba: Optional[np.ndarray] = None) -> None:
+        """
+        Adds a collection of lines (2 vertices) or polygons coloured by r, or of points at xy.
+
+        Explicit rgba colours (one row per element) replace the default ones.
+        """
+        from matplotlib.collections import LineCollection, PolyCollection
+
+        if not len(labels):
+            return
+        r_rgba, line_rgba, point_rgba = _rgba()
+        if shapes is None:
+            if rgba is None:
+                rgba = np.tile(point_rgba, (len(labels), 1))
+            collection = self._ax.scatter(xy[:, 0], xy[:, 1], s=4, c=rgba, zorder=3)
+            layer = _Layer(collection, rgba, polygons=False, xy=xy)
+        elif all(len(shape) == 2 for shape in shapes):
+            if rgba is None:
+                rgba = np.tile(line_rgba, (len(labels), 1))
+            collection = LineCollection(shapes, colors=rgba, linewidths=0.8, zorder=2)
+            layer = _Layer(collection, rgba, polygons=False, shapes=shapes)
+        else:
+            if rgba is None:
+                rgba = r_rgba[np.clip(r, 0, len(r_rgba) - 1)]
+            collection = PolyCollection(shapes, facecolors=rgba, edgecolors="none", zorder=1)
+            layer = _Layer(collection, rgba, polygons=True, shapes=shapes)
+        if shapes is not None:
+            self._ax.add_collection(collection)
+        self._layers.append(layer)
+        for i, label in enumerate(labels):
+            self._slots[label] = (layer, i)
+
+    def _draw_graph(self) -> None:
+        """Creates the artists of the current graph."""
+        store = self.graph._store
+        for tag in sorted(store.tags()):
+            offsets, xy, r = store.tag_geometry(tag)
+            labels = store.tag_members(tag)
+            shapes, _ = _shapes(offsets, xy, None)
+            sizes = np.diff(offsets)
+            for mask in (sizes == 2, sizes != 2):
+                picked = np.flatnonzero(mask).tolist()
+                self._add_layer([labels[i] for i in picked], [shapes[i] for i in picked], r[mask])
+        self._add_layer(list(self.graph._nodes), xy=store.node_xy())
+        self._update_view()
+
+    def _update_view(self) -> None:
+        if self.bbox is not None:
+            self._ax.set_xlim(self.bbox[0], self.bbox[2])
+            self._ax.set_ylim(self.bbox[1], self.bbox[3])
+        else:
+            self._ax.autoscale_view()
+        self._ax.set_title(f"Graph: {len(self.graph._nodes)} nodes, "
+                           f"{len(self.graph._hyperedges)} hyperedges (frame {self.frames})")
+
+    def _apply_pending(self) -> None:
+        """Updates the artists with the operations logged since the last frame."""
+        added: Dict[str, Operation] = {}
+        for operation in self._pending:
+            kind, label = operation.kind, operation.label
+            if kind in ("add_node", "add_edge"):
+                slot = self._slots.get(label)
+                if kind == "add_edge" and slot is not None and label not in added:
+                    if operation.r is not None:
+                        slot[0].set_r(slot[1], operation.r)
+                    continue
+                if slot is not None:
+                    slot[0].hide(slot[1])
+                    del self._slots[label]
+                added[label] = operation
+            elif kind == "update_edge":
+                if label in added:
+                    old = added[label]
+                    added[label] = Operation(old.kind, label, old.node, old.edge,
+                                             operation.r if operation.r is not None else old.r,
+                                             old.b)
+                elif label in self._slots and operation.r is not None:
+                    layer, i = self._slots[label]
+                    layer.set_r(i, operation.r)
+            elif kind == "remove":
+                if added.pop(label, None) is None and label in self._slots:
+                    layer, i = self._slots.pop(label)
+                    layer.hide(i)
+        self._pending.clear()
+
+        nodes = [op for op in added.values() if op.kind == "add_node"]
+        if nodes:
+            xy = np.array([(op.node.x, op.node.y) for op in nodes], dtype=np.float64)
+            self._add_layer([op.label for op in nodes], xy=xy)
+        for lines in (True, False):
+            edges = [op for op in added.values()
+                     if op.kind == "add_edge" and (len(op.edge.nodes) == 2) == lines]
+            shapes = [np.array([(n.x, n.y) for n in op.edge.nodes]) for op in edges]
+            self._add_layer([op.label for op in edges], shapes,
+                            np.array([op.r or 0 for op in edges], dtype=np.int64))
+        for layer in self._layers:
+            layer.flush()
+        hidden = sum(layer.hidden for layer in self._layers)
+        if len(self._layers) > MAX_LAYERS or hidden > max(len(self._slots), MAX_LAYERS):
+            self._merge_layers()
+
+    def _merge_layers(self) -> None:
+        """Replaces all layers by one collection per kind holding only the live elements."""
+        kinds: Dict[str, Tuple[List[str], list, List[np.ndarray]]] = {
+            kind: ([], [], []) for kind in ("polygons", "lines", "points")}
+        for label, (layer, i) in self._slots.items():
+            labels, geometry, rgba = kinds[layer.kind]
+            labels.append(label)
+            geometry.append(layer.xy[i] if layer.shapes is None else layer.shapes[i])
+            rgba.append(layer.rgba[i])
+        for layer in self._layers:
+            layer.collection.remove()
+        self._layers = []
+        self._slots = {}
+        for kind, (labels, geometry, rgba) in kinds.items():
+            if kind == "points":
+                self._add_layer(labels, xy=np.array(geometry).reshape(-1, 2), rgba=np.array(rgba))
+            else:
+                self._add_layer(labels, geometry, rgba=np.array(rgba))
+
+    def frame(self) -> None:
+        """Brings the drawing up to date with the graph and writes it as the next frame."""
+        self._apply_pending()
+        self._update_view()
+        if self._writer is not None:
+            self._writer.grab_frame()
+        else:
+            self._fig.savefig(self.path.format(self.frames), dpi=self.dpi)
+        self.frames += 1
+
+    def close(self) -> None:
+        """Finishes the movie, stops following the graph and frees the figure."""
+        if self._log is None:
+            return
+        self._log.unsubscribe(self._on_operation)
+        if self._own_log and self.graph.log is self._log:
+            self.graph.detach_log()
+        self._log = None
+        if self._writer is not None:
+            self._writer.finish()
+        _pyplot().close(self._fig)
+
+    def __enter__(self) -> 'Recorder':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
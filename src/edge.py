@@ -1,42 +1,117 @@
-from dataclasses import dataclass
-from typing import Tuple
+from dataclasses import dataclass, field
+from typing import FrozenSet, Iterable, Optional, Tuple
 from node import Node
 
 
-@dataclass
+def edge_label(hypertag: str, node_labels: Iterable[str]) -> str:
+    """Returns the label of a hyperedge without building it (see HyperEdge.label)."""
+    return "_".join((hypertag,) + tuple(sorted(node_labels)))
+
+
+_GUARDED = frozenset({"nodes", "hypertag", "r", "b"})
+
+
+@dataclass(slots=True)
 class HyperEdge:
     """
     Represents a hyperedge in the graph.
 
     A hyperedge connects any number of vertices (not just 2 like a regular edge).
 
+    The key, label, hash and set of node labels are computed once at
+    construction, so `nodes` and `hypertag` are read-only. The key and the
+    label don't depend on the order of `nodes`, so the same edge listed in
+    the opposite orientation is the same graph element. A graph stores its
+    own copy of every hyperedge added to it, so graphs built from the same
+    objects don't share state. The r and b attributes of a stored copy are
+    read-only and changed with Graph.update_edge, which also keeps the
+    graph's indexes, journal and log up to date.
+
     Attributes:
         nodes: Tuple of vertices connected by this hyperedge
         hypertag: Type of hyperedge (e.g., "E" - edge, "Q" - quadrilateral)
         r: R attribute used for production matching (0 or 1)
         b: B attribute used for defining boundary edge (0 or 1)
     """
+    # Number of graph storages holding this object (a matched subgraph
+    # copied with MatchView.to_graph shares the objects of its graph).
+    _stores: int = field(default=0, init=False, repr=False, compare=False)
     nodes: Tuple[Node, ...]
     hypertag: str
     r: int = 0
     b: int = 1
+    _key: Tuple[str, Tuple[str, ...]] = field(init=False, repr=False, compare=False)
+    _label: str = field(init=False, repr=False, compare=False)
+    _node_labels: FrozenSet[str] = field(init=False, repr=False, compare=False)
+    _hash: int = field(init=False, repr=False, compare=False)
 
     def __post_init__(self):
         if len(self.nodes) < 2:
             raise ValueError("Hyperedge must connect at least 2 vertices")
+        node_labels = tuple(sorted(n.label for n in self.nodes))
+        self._key = (self.hypertag, node_labels)
+        self._label = "_".join((self.hypertag,) + node_labels)
+        self._node_labels = frozenset(node_labels)
+        self._hash = hash(self._key)
+
+    def __setattr__(self, name, value):
+        if name in _GUARDED:
+            if name in ("nodes", "hypertag"):
+                if hasattr(self, "_label"):
+                    raise AttributeError(f"HyperEdge.{name} is read-only, create a new HyperEdge instead")
+            elif self._stores:
+                raise AttributeError(f"HyperEdge.{name} of a hyperedge stored in a graph is read-only, "
+                                     f"use Graph.update_edge")
+        object.__setattr__(self, name, value)
+
+    @property
+    def key(self) -> Tuple[str, Tuple[str, ...]]:
+        """Canonical key: hypertag and sorted labels of the connected vertices."""
+        return self._key
 
     @property
     def label(self) -> str:
-        """Generates a unique label for the hyperedge based on type and vertices."""
-        node_labels = "_".join(n.label for n in self.nodes)
-        return f"{self.hypertag}_{node_labels}"
+        """Unique label for the hyperedge based on type and vertices (string form of the key)."""
+        return self._label
+
+    @property
+    def node_labels(self) -> FrozenSet[str]:
+        """Labels of the connected vertices (independent of their order)."""
+        return self._node_labels
+
+    def __setstate__(self, state):
+        # Unpickling sets every slot, including r and b of stored hyperedges.
+        for name, value in state[1].items():
+            object.__setattr__(self, name, value)
+
+    def update(self, r: Optional[int] = None, b: Optional[int] = None) -> None:
+        """Changes the r and/or b attributes (None leaves an attribute unchanged)."""
+        if r is not None:
+            self.r = r
+        if b is not None:
+            self.b = b
+
+    def _copy(self) -> 'HyperEdge':
+        """Copy that isn't stored in any graph, without recomputing the key and label."""
+        copy = object.__new__(HyperEdge)
+        for name in HyperEdge.__slots__:
+            object.__setattr__(copy, name, getattr(self, name))
+        object.__setattr__(copy, "_stores", 0)
+        return copy
+
+    def _write(self, r: Optional[int], b: Optional[int]) -> None:
+        """Like update, also for stored hyperedges (used by the storage backends only)."""
+        if r is not None:
+            object.__setattr__(self, "r", r)
+        if b is not None:
+            object.__setattr__(self, "b", b)
 
     def __hash__(self):
-        return hash((self.hypertag, self.nodes))
+        return self._hash
 
     def __eq__(self, other):
         if isinstance(other, HyperEdge):
-            return self.hypertag == other.hypertag and set(self.nodes) == set(other.nodes)
+            return self._hash == other._hash and self._key == other._key
         return False
 
     def __repr__(self):
@@ -0,0 +1,125 @@
+"""
+Rule engine running a schedule of productions to a fixpoint.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional, Sequence
+
+from graph import Graph
+from productions.production import Production
+
+
+@dataclass
+class RuleStats:
+    """Statistics of a single production during a run."""
+    applications: int = 0
+    attempts: int = 0
+    skipped: int = 0
+    time: float = 0.0
+
+
+@dataclass
+class RunReport:
+    """Result of RuleEngine.run."""
+    rules: Dict[str, RuleStats] = field(default_factory=dict)
+    rounds: int = 0
+    fixpoint: bool = False
+
+    @property
+    def applications(self) -> int:
+        """Total number of rewrites in the run."""
+        return sum(stats.applications for stats in self.rules.values())
+
+
+class RuleEngine:
+    """
+    Applies a schedule of productions until none of them can fire.
+
+    Every round goes through the productions in schedule order and applies
+    each one to its own fixpoint. A production is only tried if it is
+    "dirty" (a production producing one of the hypertags it consumes has
+    fired since it last found no match) and every hypertag of its left side
+    is present in the graph. The run ends at a fixpoint (a round without
+    rewrites) or when the round budget is used up.
+
+    The hypertags a production consumes are those of its left side, the
+    ones it produces are given by Production.produces (None means any).
+    """
+
+    MODES = ("sequential", "incremental", "maximal_independent")
+
+    def __init__(self, productions: Optional[Sequence[Production]] = None,
+                 max_rounds: Optional[int] = None, priority: bool = False,
+                 mode: str = "sequential"):
+        """
+        Args:
+            productions: Schedule (defaults to all registered productions,
+                in registration order)
+            max_rounds: Optional limit on the number of rounds
+            priority: If True, a round ends as soon as a production fires,
+                so the next round starts again from the first production
+            mode: How each production is applied: "sequential" (Graph.apply),
+                "incremental" (Graph.apply with incremental=True) or
+                "maximal_independent" (Graph.apply_all)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown apply mode: {mode}")
+        if productions is None:
+            productions = Production.get_all_productions()
+        self.productions = list(productions)
+        self.max_rounds = max_rounds
+        self.priority = priority
+        self.mode = mode
+        self._consumes: Dict[int, FrozenSet[str]] = {
+            i: frozenset(tag for tag, _ in p.plan.edges.values())
+            for i, p in enumerate(self.productions)
+        }
+
+    def _apply(self, graph: Graph, production: Production) -> int:
+        if self.mode == "maximal_independent":
+            return graph.apply_all(production)
+        return graph.apply(production, incremental=self.mode == "incremental")
+
+    def run(self, graph: Graph) -> RunReport:
+        """Runs the schedule on the graph and reports what happened."""
+        report = RunReport()
+        stats = []
+        for production in self.productions:
+            name = type(production).__name__
+            stats.append(report.rules.setdefault(name, RuleStats()))
+        dirty = set(range(len(self.productions)))
+
+        while self.max_rounds is None or report.rounds < self.max_rounds:
+            report.rounds += 1
+            fired = False
+            for i, production in enumerate(self.productions):
+                if i not in dirty:
+                    continue
+                if any(graph.count_hyperedges(tag) == 0 for tag in self._consumes[i]):
+                    stats[i].skipped += 1
+                    dirty.discard(i)
+                    continue
+
+                start = time.perf_counter()
+                applied = self._apply(graph, production)
+                stats[i].time += time.perf_counter() - start
+                stats[i].attempts += 1
+                stats[i].applications += applied
+                dirty.discard(i)
+
+                if applied:
+                    fired = True
+                    produces = production.produces
+                    for j, consumes in self._consumes.items():
+                        if produces is None or consumes & produces:
+                            dirty.add(j)
+                    dirty.discard(i)
+                    if self.priority:
+                        break
+
+            if not fired:
+                report.fixpoint = True
+                break
+
+        return report
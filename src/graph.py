@@ -1,8 +1,19 @@
+from bisect import bisect_right
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Optional, Iterator, Set
-import networkx as nx
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Mapping, Optional, Iterator, Sequence, Set, Tuple, Union
+import numpy as np
 from node import Node
 from edge import HyperEdge
+from matching import AnchoredMatcher, MatchPlan, MatchView, MatchWorklist, vf2_node_match
+from metrics import Metrics, ProductionMetrics, timer
+from oplog import OperationLog
+from persistence import PathLike, read_storage, write_storage
+from spatial import GridIndex
+from storage import HyperEdgeSet, create_storage
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 
 @dataclass
@@ -12,6 +23,14 @@ class NodeCount:
     hyper: int = 0
 
 
+@dataclass(frozen=True)
+class Snapshot:
+    """Position in a graph's change journal, see Graph.snapshot."""
+    epoch: int
+    position: int
+    generation: int = 0
+
+
 class Graph:
     """
     Class representing a graph with hyperedges.
@@ -19,47 +38,246 @@ class Graph:
     Since networkx doesn't support hyperedges natively,
     we convert each hyperedge to a special node connected
     to all vertices that the hyperedge connects.
+
+    The storage is selected with the `backend` argument: "networkx" keeps
+    that encoding in a networkx graph, "array" keeps the graph in compact
+    NumPy arrays (see storage.py) and builds the networkx encoding only
+    when it is needed (VF2 matching, drawing).
+
+    Node positions are indexed in a uniform grid (see spatial.py) for
+    geometric lookups. The index is built on the first query and then
+    kept up to date by add_node/remove_node.
     """
     
-    def __init__(self):
-        self._graph = nx.Graph()
-        self._nodes: dict[str, Node] = {}
-        self._hyperedges: dict[str, HyperEdge] = {}
+    def __init__(self, backend: str = "networkx", cell_size: float = 1.0,
+                 merge_tolerance: Optional[float] = None):
+        """
+        Args:
+            backend: Storage backend ("networkx" or "array")
+            cell_size: Cell size of the spatial index
+            merge_tolerance: If set, a new node added by a production's right
+                side is replaced by an existing node lying within this
+                distance (e.g. a midpoint already created by a neighbour)
+        """
+        self._store = create_storage(backend)
+        self._cell_size = cell_size
+        self._spatial: Optional[GridIndex] = None
+        self.merge_tolerance = merge_tolerance
+        self._journal: Optional[List[tuple]] = None
+        self._epoch = 0
+        # Rollbacks so far: the journal is rewritten from the target position
+        # on, so snapshots from an older generation beyond it become invalid.
+        # Kept as (generation, target position) with both increasing; a later
+        # rollback to a lower position supersedes the earlier ones.
+        self._generation = 0
+        self._cuts: List[Tuple[int, int]] = []
+        self.log: Optional[OperationLog] = None
+        self.metrics: Optional[Metrics] = None
+
+    def save(self, path: PathLike) -> None:
+        """
+        Writes the graph to a compact binary file (see persistence.py).
+
+        Args:
+            path: Destination file
+        """
+        write_storage(self._store, path)
+
+    @classmethod
+    def load(cls, path: PathLike, mmap: bool = True, backend: str = "array",
+             **graph_args) -> 'Graph':
+        """
+        Loads a graph written by save.
+
+        Args:
+            path: File to read
+            mmap: If True, the file is memory-mapped (copy-on-write) instead
+                of being read into memory; only the array backend keeps it
+                mapped
+            backend: Storage backend of the loaded graph
+            **graph_args: Other Graph arguments (cell_size, merge_tolerance)
+
+        Returns:
+            Loaded graph
+        """
+        return cls._from_storage(read_storage(path, mmap=mmap), backend, **graph_args)
+
+    @classmethod
+    def _from_storage(cls, store, backend: str, **graph_args) -> 'Graph':
+        """Wraps a filled storage in a Graph, moving it to another backend if needed."""
+        graph = cls(backend=backend, **graph_args)
+        if backend == store.name:
+            graph._store = store
+            return graph
+        for node in store.nodes.values():
+            graph._store.add_node(node)
+        for edge in store.hyperedges.values():
+            graph._store.add_edge(edge)
+        return graph
+
+    @property
+    def backend(self) -> str:
+        """Name of the storage backend."""
+        return self._store.name
+
+    @property
+    def _graph(self) -> 'nx.Graph':
+        """Bipartite networkx encoding of the graph."""
+        return self._store.to_networkx()
+
+    @property
+    def _nodes(self) -> Mapping[str, Node]:
+        return self._store.nodes
+
+    @property
+    def _hyperedges(self) -> Mapping[str, HyperEdge]:
+        return self._store.hyperedges
     
     def add_node(self, node: Node) -> None:
         """Adds a vertex to the graph."""
-        self._nodes[node.label] = node
-        self._graph.add_node(node.label, node=node, is_hyper=False)
+        if self._spatial is not None or self._journal is not None:
+            old = self._nodes.get(node.label)
+            if self._journal is not None:
+                self._journal.append(("node", node.label, old))
+            if self._spatial is not None:
+                if old is not None:
+                    self._spatial.remove(old.label, old.x, old.y)
+                self._spatial.insert(node.label, node.x, node.y)
+        self._store.add_node(node)
+        if self.log is not None:
+            self.log.append("add_node", node.label, node=node)
     
     def add_edge(self, edge: HyperEdge, check_nodes: bool = True) -> None:
         """
         Adds a hyperedge to the graph.
         
         The hyperedge is represented as a special node
-        connected to all vertices it connects.
+        connected to all vertices it connects. Hyperedges are stored
+        under their canonical label, so adding a hyperedge that already
+        exists (in any node order) only updates its r and b attributes.
         
         Args:
             edge: Hyperedge to add
             check_nodes: Whether to check node existence (False for productions)
         """
-        hyper_label = edge.label
-        
-        center_x = sum(n.x for n in edge.nodes) / len(edge.nodes)
-        center_y = sum(n.y for n in edge.nodes) / len(edge.nodes)
-        
-        hyper_node = Node(center_x, center_y, hyper_label, hyperref=edge)
-        
-        self._hyperedges[hyper_label] = edge
-        self._graph.add_node(hyper_label, node=hyper_node, is_hyper=True, hyperedge=edge)
-        
         for node in edge.nodes:
-            if check_nodes and node.label not in self._nodes:
-                raise ValueError(f"Node {node.label} does not exist in the graph")
             if node.label not in self._nodes:
-                self._nodes[node.label] = node
-                self._graph.add_node(node.label, node=node, is_hyper=False)
-            self._graph.add_edge(hyper_label, node.label)
+                if check_nodes:
+                    raise ValueError(f"Node {node.label} does not exist in the graph")
+                self.add_node(node)
+        if self._journal is not None:
+            self._journal.append(self._edge_entry(edge.label))
+        self._store.add_edge(edge)
+        if self.log is not None:
+            self.log.append("add_edge", edge.label, edge=edge, r=edge.r, b=edge.b)
     
+    def add_nodes(self, nodes: Iterable[Node] = (), labels: Optional[Sequence[str]] = None,
+                  xy: Optional[np.ndarray] = None) -> None:
+        """
+        Adds many vertices at once.
+
+        The vertices can be given as Node objects or as a list of labels with
+        an (n, 2) array of coordinates (no Node objects are created for the
+        array backend). Existing vertices are moved to the new position, and
+        of a label listed several times the last position is used.
+
+        Args:
+            nodes: Vertices to add
+            labels: Labels of further vertices
+            xy: Coordinates of the vertices listed in labels
+        """
+        nodes = list(nodes)
+        all_labels = [node.label for node in nodes]
+        coords = np.array([(node.x, node.y) for node in nodes], dtype=np.float64).reshape(-1, 2)
+        if labels is not None:
+            xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+            if len(labels) != len(xy):
+                raise ValueError(f"Got {len(labels)} labels for {len(xy)} positions")
+            all_labels.extend(labels)
+            coords = np.concatenate((coords, xy))
+        positions = dict(zip(all_labels, range(len(all_labels))))
+        if len(positions) != len(all_labels):
+            all_labels = list(positions)
+            coords = coords[list(positions.values())]
+
+        if self._spatial is not None or self._journal is not None:
+            for label, (x, y) in zip(all_labels, coords.tolist()):
+                old = self._nodes.get(label)
+                if self._journal is not None:
+                    self._journal.append(("node", label, old))
+                if self._spatial is not None:
+                    if old is not None:
+                        self._spatial.remove(old.label, old.x, old.y)
+                    self._spatial.insert(label, x, y)
+        self._store.add_nodes(all_labels, coords)
+        if self.log is not None:
+            for label, (x, y) in zip(all_labels, coords.tolist()):
+                self.log.append("add_node", label, node=Node(x, y, label))
+
+    def add_edges(self, edges: Iterable[HyperEdge], check_nodes: bool = True) -> None:
+        """
+        Adds many hyperedges at once.
+
+        The endpoints of the whole batch are checked together before anything
+        is added, so either all hyperedges are added or none. Like add_edge,
+        hyperedges that already exist only get their r and b updated.
+
+        Args:
+            edges: Hyperedges to add
+            check_nodes: Whether to check node existence; if False, missing
+                nodes are added from the hyperedges
+
+        Raises:
+            ValueError: If check_nodes is True and some hyperedges refer to
+                missing nodes (all of them are listed)
+        """
+        edges = list(edges)
+        missing: Dict[str, Node] = {}
+        for edge in edges:
+            for node in edge.nodes:
+                if node.label not in missing and node.label not in self._nodes:
+                    missing[node.label] = node
+
+        if missing and check_nodes:
+            broken = [edge.label for edge in edges if not edge.node_labels.isdisjoint(missing)]
+            raise ValueError(
+                f"Nodes {', '.join(sorted(missing))} do not exist in the graph "
+                f"(used by {len(broken)} hyperedges: {', '.join(broken)})")
+        if missing:
+            self.add_nodes(missing.values())
+        if self._journal is not None:
+            self._journal.extend(self._edge_entry(edge.label) for edge in edges)
+        self._store.add_edges(edges)
+        if self.log is not None:
+            for edge in edges:
+                self.log.append("add_edge", edge.label, edge=edge, r=edge.r, b=edge.b)
+
+    def _edge_entry(self, label: str) -> tuple:
+        """Journal entry undoing an add_edge of the given hyperedge."""
+        if label in self._hyperedges:
+            return ("attrs", label, self._store.edge_attr(label, "r"), self._store.edge_attr(label, "b"))
+        return ("edge", label)
+
+    def update_edge(self, label: str, r: Optional[int] = None, b: Optional[int] = None) -> None:
+        """
+        Changes attributes of a hyperedge stored in the graph.
+
+        Use this instead of assigning to a HyperEdge returned by the graph:
+        with the "array" backend those objects are copies.
+
+        Args:
+            label: Label of the hyperedge
+            r: New r value (None leaves it unchanged)
+            b: New b value (None leaves it unchanged)
+        """
+        if label not in self._hyperedges:
+            raise ValueError(f"Hyperedge {label} does not exist in the graph")
+        if self._journal is not None:
+            self._journal.append(self._edge_entry(label))
+        self._store.update_edge(label, r, b)
+        if self.log is not None:
+            self.log.append("update_edge", label, r=r, b=b)
+
     def get_node(self, label: str) -> Optional[Node]:
         """Returns the node with the given label."""
         return self._nodes.get(label)
@@ -68,6 +286,22 @@ class Graph:
         """Returns the hyperedge with the given label."""
         return self._hyperedges.get(label)
     
+    def _spatial_index(self) -> GridIndex:
+        if self._spatial is None:
+            self._spatial = GridIndex(self._cell_size)
+            for node in self._nodes.values():
+                self._spatial.insert(node.label, node.x, node.y)
+        return self._spatial
+
+    def find_node_at(self, x: float, y: float, tol: float = 1e-9) -> Optional[Node]:
+        """Returns the node closest to (x, y) within distance tol, or None."""
+        label = self._spatial_index().nearest(x, y, tol)
+        return self._nodes[label] if label is not None else None
+
+    def nodes_in_range(self, xmin: float, ymin: float, xmax: float, ymax: float) -> List[Node]:
+        """Returns all nodes inside the given box (borders included)."""
+        return [self._nodes[label] for label in self._spatial_index().in_range(xmin, ymin, xmax, ymax)]
+
     @property
     def nodes(self) -> List[Node]:
         """Returns list of all regular vertices."""
@@ -84,105 +318,665 @@ class Graph:
         Returns list of all nodes (regular and hyper) in order.
         Used for production matching.
         """
-        result = []
-        for label, data in self._graph.nodes(data=True):
-            result.append(data['node'])
-        return result
+        return self._store.ordered_nodes()
     
     def count_nodes(self) -> NodeCount:
         """Counts nodes in the graph by type."""
         return NodeCount(normal=len(self._nodes), hyper=len(self._hyperedges))
+
+    def count_hyperedges(self, tag: str, r: Optional[int] = None, b: Optional[int] = None) -> int:
+        """Returns the number of hyperedges with the given hypertag (and r and/or b values)."""
+        if r is None and b is None:
+            return self._store.tag_count(tag)
+        return len(self._store.index.members(tag, r, b))
+
+    def hyperedges_with(self, tag: str, r: Optional[int] = None,
+                        b: Optional[int] = None) -> HyperEdgeSet:
+        """
+        Returns the hyperedges with a hypertag, optionally only those with given r and/or b.
+
+        The result is a live view over an index kept by the storage (each
+        of the tag, (tag, r) and (tag, b) tables is built on its first query
+        and then updated by every change), so getting it costs O(1) and
+        iterating it O(k) in the number of hyperedges found, e.g.
+        graph.hyperedges_with("Q", r=0). Copy it (list(...)) before
+        changing the graph while iterating.
+        """
+        return HyperEdgeSet(self._store.index.members(tag, r, b), self._hyperedges)
     
-    def find_subgraph_isomorphisms(self, pattern: 'Graph') -> List[dict]:
+    def find_subgraph_isomorphisms(self, pattern: Union['Graph', MatchPlan],
+                                   around: Optional[Iterable[str]] = None,
+                                   method: str = "anchored",
+                                   workers: Optional[int] = None) -> List[dict]:
         """
         Finds all subgraph isomorphisms (pattern matches).
 
+        Every automorphic variant of a match is returned; use iter_matches
+        to stream matches lazily and without duplicates.
+
+        Args:
+            pattern: Graph to search for, or its compiled MatchPlan
+            around: Optional labels (nodes and hyperedges); only matches containing
+                at least one of them are guaranteed to be found, and only the
+                neighbourhood of these labels is searched
+            method: "anchored" to grow matches from hyperedges of the pattern's
+                rarest hypertag, or "vf2" to run networkx's GraphMatcher on the
+                whole graph. Patterns the anchored matcher can't handle
+                (disconnected or with isolated nodes) always use VF2.
+            workers: Optional number of worker processes for the anchored
+                search of the whole graph (see parallel.py); the result is
+                the same as without it. VF2 and patterns the anchored matcher
+                can't handle are searched in this process.
+
         Returns:
             List of dictionaries mapping pattern labels to graph labels
+
+        Raises:
+            ValueError: If both workers and around are given (a search around
+                a few labels is not split between processes)
+        """
+        if workers is not None and around is not None:
+            raise ValueError("workers can't be combined with around")
+        metrics = self.metrics["find_subgraph_isomorphisms"] if self.metrics is not None else None
+        if workers is not None and method == "anchored":
+            plan = pattern if isinstance(pattern, MatchPlan) else MatchPlan.compile(pattern)
+            if plan.supported:
+                from parallel import parallel_matches
+
+                with timer(metrics, "match"):
+                    matches = parallel_matches(self, plan, workers)
+                if metrics is not None:
+                    metrics.matches += len(matches)
+                return matches
+        matches = self.iter_matches(pattern, around=around, method=method, unique=False)
+        if metrics is not None:
+            matches = metrics.timed_matches(matches)
+        return list(matches)
+
+    def iter_matches(self, pattern: Union['Graph', MatchPlan],
+                     predicate: Optional[Callable[[HyperEdge, HyperEdge], bool]] = None,
+                     around: Optional[Iterable[str]] = None,
+                     method: str = "anchored",
+                     unique: bool = True) -> Iterator[dict]:
         """
-        def node_match(n1, n2):
-            if n1.get('is_hyper') != n2.get('is_hyper'):
-                return False
-            if n1.get('is_hyper'):
-                e1 = n1.get('hyperedge')
-                e2 = n2.get('hyperedge')
-                if e1 and e2:
-                    return e1.hypertag == e2.hypertag
-            return True
+        Lazily yields pattern matches, so callers can stop at the first useful one.
+
+        The graph must not be modified while the iterator is in use.
+
+        Args:
+            pattern: Graph to search for, or its compiled MatchPlan (a Graph
+                is compiled on every call, productions keep theirs cached)
+            predicate: Optional check called with (pattern hyperedge, graph hyperedge)
+                whenever the search pairs them; rejected hyperedges are pruned
+                before the rest of the match is built
+            around: Optional labels (nodes and hyperedges); only matches containing
+                at least one of them are guaranteed to be found
+            method: "anchored" or "vf2", see find_subgraph_isomorphisms
+            unique: If True, matches differing only by a pattern automorphism
+                (covering the same graph elements) are yielded once
 
+        Yields:
+            Dictionaries mapping graph labels to pattern labels
+        """
+        if method not in ("anchored", "vf2"):
+            raise ValueError(f"Unknown matching method: {method}")
+        plan = pattern if isinstance(pattern, MatchPlan) else MatchPlan.compile(pattern)
+        if method == "anchored" and plan.supported:
+            matcher = AnchoredMatcher(self, plan)
+            yield from matcher.iter_matches(around, predicate=predicate, unique=unique)
+            return
+
+        import networkx as nx
+
+        pattern = plan.pattern
+        host = self._graph
+        if around is not None and nx.is_connected(pattern._graph):
+            radius = nx.diameter(pattern._graph)
+            host = self._graph.subgraph(self.neighbourhood(around, radius))
         matcher = nx.algorithms.isomorphism.GraphMatcher(
-            self._graph,
+            host,
             pattern._graph,
-            node_match=node_match
+            node_match=vf2_node_match
         )
-        return list(matcher.subgraph_isomorphisms_iter())
-    
+        seen = set()
+        for match in matcher.subgraph_isomorphisms_iter():
+            pairs = [
+                (pattern._hyperedges[pattern_label], self._hyperedges[graph_label], pattern_label)
+                for graph_label, pattern_label in match.items()
+                if pattern_label in pattern._hyperedges
+            ]
+            if not all(plan.accepts(label, edge) for _, edge, label in pairs):
+                continue
+            if predicate is not None and not all(predicate(p, e) for p, e, _ in pairs):
+                continue
+            if unique:
+                key = frozenset(match)
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield match
+
+    def _incident(self, label: str) -> Iterable[str]:
+        """Returns labels of hyperedges incident to a node (or nodes of a hyperedge)."""
+        return self._store.incident(label)
+
+    def incident_hyperedges(self, label: str, tag: Optional[str] = None) -> HyperEdgeSet:
+        """
+        Returns the hyperedges incident to a node.
+
+        The lookup uses the incidence kept by the storage (per-vertex tables
+        or CSR arrays), so it costs O(degree) and never scans the graph. The
+        result is a HyperEdgeSet over the labels found (not a live view);
+        its `labels` can be used without creating HyperEdge objects, which
+        the array backend only builds on access.
+
+        Args:
+            label: Node label
+            tag: Optional hypertag; only hyperedges with it are returned
+
+        Raises:
+            ValueError: If the node doesn't exist
+        """
+        if label not in self._nodes:
+            raise ValueError(f"Node {label} does not exist in the graph")
+        labels = dict.fromkeys(self._store.incident_edges(label, tag)).keys()
+        return HyperEdgeSet(labels, self._hyperedges)
+
+    def adjacent_hyperedges(self, label: str, tag: Optional[str] = None,
+                            shared: int = 1) -> HyperEdgeSet:
+        """
+        Returns the hyperedges sharing vertices with a hyperedge.
+
+        With shared=1 these are all hyperedges touching it, with shared=2
+        those sharing a side with it, e.g. the quads across the sides of a
+        quad: graph.adjacent_hyperedges(q.label, "Q", shared=2). Like
+        incident_hyperedges, the result is a HyperEdgeSet over the labels
+        found, computed from the incidence of the hyperedge's vertices.
+
+        Args:
+            label: Hyperedge label
+            tag: Optional hypertag; only hyperedges with it are returned
+            shared: Minimum number of common vertices
+
+        Raises:
+            ValueError: If the hyperedge doesn't exist
+        """
+        if label not in self._hyperedges:
+            raise ValueError(f"Hyperedge {label} does not exist in the graph")
+        labels = dict.fromkeys(self._store.adjacent_edges(label, tag, shared)).keys()
+        return HyperEdgeSet(labels, self._hyperedges)
+
+    def neighbourhood(self, labels: Iterable[str], radius: int) -> Set[str]:
+        """
+        Returns labels of all nodes and hyperedges reachable from the given
+        labels in at most `radius` steps (a vertex-hyperedge incidence is one step).
+        """
+        seen = {label for label in labels if self._store.has(label)}
+        frontier = list(seen)
+        for _ in range(radius):
+            next_frontier = []
+            for label in frontier:
+                for neighbour in self._store.incident(label):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        next_frontier.append(neighbour)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return seen
+
     def remove_node(self, label: str) -> None:
         """Removes a node from the graph."""
-        if label in self._nodes:
-            del self._nodes[label]
-        if label in self._hyperedges:
-            del self._hyperedges[label]
-        if self._graph.has_node(label):
-            self._graph.remove_node(label)
+        if self._spatial is not None:
+            node = self._nodes.get(label)
+            if node is not None:
+                self._spatial.remove(label, node.x, node.y)
+        record = self._store.remove(label)
+        if record is None:
+            return
+        if self._journal is not None:
+            self._journal.append(("removed", label, record))
+        if self.log is not None:
+            self.log.append("remove", label)
+
+    def snapshot(self) -> Snapshot:
+        """
+        Marks the current state so that it can be restored with rollback.
+
+        Taking a snapshot is O(1): the first one starts a journal recording
+        how to undo every later change made through the Graph methods (add,
+        update, remove; apply and apply_all use them too). Recording goes on
+        until release is called.
+
+        Returns:
+            Snapshot to pass to rollback
+        """
+        if self._journal is None:
+            self._journal = []
+        return Snapshot(self._epoch, len(self._journal), self._generation)
+
+    def rollback(self, snapshot: Snapshot) -> None:
+        """
+        Undoes all changes made since the snapshot was taken.
+
+        Costs O(changes since the snapshot). The snapshot stays valid, as do
+        older ones; snapshots taken after it become invalid.
+
+        Raises:
+            ValueError: If the snapshot is no longer valid (taken after an
+                earlier rollback target, or before release)
+        """
+        journal = self._journal
+        if journal is None or snapshot.epoch != self._epoch or snapshot.position > len(journal):
+            raise ValueError("Invalid snapshot")
+        # The first rollback since the snapshot has the lowest target of all later ones.
+        later = bisect_right(self._cuts, snapshot.generation, key=lambda cut: cut[0])
+        if later < len(self._cuts) and self._cuts[later][1] < snapshot.position:
+            raise ValueError("Invalid snapshot")
+
+        self._journal = None
+        try:
+            with self.transaction("rollback"):
+                self._undo(journal, snapshot.position)
+        finally:
+            self._journal = journal
+            self._generation += 1
+            while self._cuts and self._cuts[-1][1] >= snapshot.position:
+                self._cuts.pop()
+            self._cuts.append((self._generation, snapshot.position))
+
+    def _undo(self, journal: List[tuple], position: int) -> None:
+        """Pops and undoes journal entries down to the given position."""
+        while len(journal) > position:
+            entry = journal.pop()
+            kind, label = entry[0], entry[1]
+            if kind == "node":
+                if entry[2] is None:
+                    self.remove_node(label)
+                else:
+                    self.add_node(entry[2])
+            elif kind == "edge":
+                self.remove_node(label)
+            elif kind == "attrs":
+                self.update_edge(label, entry[2], entry[3])
+            else:
+                self._store.restore(entry[2])
+                node = self._nodes.get(label)
+                if node is not None and self._spatial is not None:
+                    self._spatial.insert(label, node.x, node.y)
+                if self.log is not None:
+                    if node is not None:
+                        self.log.append("add_node", label, node=node)
+                    else:
+                        edge = self._hyperedges[label]
+                        self.log.append("add_edge", label, edge=edge, r=edge.r, b=edge.b)
+
+    def release(self) -> None:
+        """Stops recording changes; all snapshots become invalid."""
+        self._journal = None
+        self._epoch += 1
+        self._cuts.clear()
+
+    def attach_log(self, log: Optional[OperationLog] = None) -> OperationLog:
+        """
+        Starts appending every change of the graph to an operation log.
+
+        Args:
+            log: Log to append to (a new one by default)
+
+        Returns:
+            The attached log
+        """
+        self.log = log if log is not None else OperationLog()
+        return self.log
+
+    def detach_log(self) -> Optional[OperationLog]:
+        """Stops logging changes and returns the log that was attached."""
+        log, self.log = self.log, None
+        return log
+
+    def attach_metrics(self, metrics: Optional[Metrics] = None) -> Metrics:
+        """
+        Starts counting matches and rewrites and timing the phases of
+        apply, apply_all and find_subgraph_isomorphisms (see metrics.py).
+
+        Args:
+            metrics: Metrics to add to (new ones by default)
+
+        Returns:
+            The attached metrics
+        """
+        self.metrics = metrics if metrics is not None else Metrics()
+        return self.metrics
+
+    def detach_metrics(self) -> Optional[Metrics]:
+        """Stops collecting metrics and returns the ones that were attached."""
+        metrics, self.metrics = self.metrics, None
+        return metrics
+
+    def _production_metrics(self, production: 'Production') -> Optional[ProductionMetrics]:
+        """Metrics of a production, or None if no metrics are attached."""
+        if self.metrics is None:
+            return None
+        return self.metrics[type(production).__name__]
+
+    def _matches(self, production: 'Production', metrics: Optional[ProductionMetrics],
+                 around: Optional[Iterable[str]] = None) -> Iterator[dict]:
+        """
+        Matches of a production's left side, counted and timed if metrics are given.
+
+        Automorphic variants are only skipped for productions declared
+        symmetric; for the others every variant reaches filter_match, since
+        which one passes can depend on the left-side labels.
+        """
+        matches = self.iter_matches(production.plan, predicate=production.match_edge,
+                                    around=around, unique=production.symmetric)
+        if metrics is None:
+            return matches
+        return metrics.timed_matches(matches)
+
+    @contextmanager
+    def transaction(self, name: str):
+        """
+        Groups the changes made inside the block into one logged transaction.
+
+        Transactions only mark boundaries in the operation log, they don't
+        undo anything on errors (use snapshot / rollback for that); a block
+        left by an exception is closed with an "abort" marker.
+        """
+        if self.log is None:
+            yield
+            return
+        self.log.begin(name)
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.log.end(failed)
     
-    def apply(self, production: 'Production') -> int:
+    def apply(self, production: 'Production', incremental: bool = False,
+              workers: Optional[int] = None) -> int:
         """
         Applies a production to the graph.
-        
+
+        Args:
+            production: Production to apply
+            incremental: If True, the graph is searched once and after every
+                rewrite only the neighbourhood of the changed hyperedges is
+                searched again. Otherwise the whole graph is searched after
+                every rewrite.
+            workers: Optional number of worker processes. The whole graph is
+                searched in parallel, the matches are rewritten one by one
+                (skipping those touched by earlier rewrites) and the search
+                is repeated until nothing more can be applied.
+
         Returns:
             Number of times the production was applied
         """
-        left = production.get_left_side()
+        left = production.plan
+        metrics = self._production_metrics(production)
+        if workers is not None and left.supported:
+            return self._apply_parallel(production, left, workers, metrics)
+        if incremental:
+            return self._apply_incremental(production, left, metrics)
+
         applied_count = 0
-        
-        while True:
-            matches = self.find_subgraph_isomorphisms(left)
-            if not matches:
-                break
 
+        while True:
             match = None
             matched_graph = None
-            for candidate in matches:
-                valid = all(self._graph.has_node(graph_label) for graph_label in candidate.keys())
-                if not valid:
-                    continue
-
-                candidate_graph = Graph()
-                for graph_label, pattern_label in candidate.items():
-                    node_data = self._graph.nodes[graph_label]
-                    candidate_graph._graph.add_node(pattern_label, **node_data)
-                    if not node_data.get('is_hyper', False):
-                        candidate_graph._nodes[pattern_label] = node_data['node']
-                    else:
-                        candidate_graph._hyperedges[pattern_label] = node_data.get('hyperedge')
-
-                if production.filter_match(candidate_graph):
+            for candidate in self._matches(production, metrics):
+                matched_graph = self._accept_match(production, candidate, metrics)
+                if matched_graph is not None:
                     match = candidate
-                    matched_graph = candidate_graph
                     break
 
             if match is None:
                 break
 
-            right = production.get_right_side(matched_graph)
-
-            inv_match = {v: k for k, v in match.items()}
-            for label, data in left._graph.nodes(data=True):
-                if data.get('is_hyper', False):
-                    graph_label = inv_match[label]
-                    self.remove_node(graph_label)
-            
-            for node in right.nodes:
-                if node.label not in self._nodes:
-                    self.add_node(node)
-            
-            for edge in right.hyperedges:
-                self.add_edge(edge, check_nodes=False)
-            
+            self._rewrite(production, left, match, matched_graph, metrics)
             applied_count += 1
-        
+
         return applied_count
-    
+
+    def apply_all(self, production: 'Production', mode: str = "maximal_independent") -> int:
+        """
+        Applies a production in sweeps of non-conflicting matches.
+
+        In "maximal_independent" mode every sweep collects all valid matches
+        in a single pass, greedily selects a maximal set of matches none of
+        which uses an element another one deletes or updates, and rewrites
+        them as one batch: all right sides are built first, then all deleted
+        hyperedges are removed, the preserved ones updated and all right
+        sides added. Sweeps repeat until nothing matches.
+        Mode "sequential" is the same as apply.
+
+        Returns:
+            Number of times the production was applied
+        """
+        if mode == "sequential":
+            return self.apply(production)
+        if mode != "maximal_independent":
+            raise ValueError(f"Unknown apply mode: {mode}")
+
+        left = production.plan
+        preserved = production.preserved or frozenset()
+        metrics = self._production_metrics(production)
+        applied_count = 0
+
+        while True:
+            batch = []
+            claimed: Set[str] = set()
+            # Graph labels of the accepted matches: other variants of an accepted
+            # match are skipped even if the production claims none of its elements.
+            accepted: Set[frozenset] = set()
+            for candidate in self._matches(production, metrics):
+                if any(label in claimed for label in candidate) or frozenset(candidate) in accepted:
+                    continue
+                matched_graph = self._accept_match(production, candidate, metrics)
+                if matched_graph is None:
+                    continue
+                with timer(metrics, "right_side"):
+                    updates = self._updates(production, candidate, matched_graph)
+                claimed.update(g for g, p in candidate.items()
+                               if p in left.edges and p not in preserved)
+                claimed.update(updates)
+                accepted.add(frozenset(candidate))
+                batch.append((candidate, matched_graph, updates))
+
+            if not batch:
+                break
+
+            with self.transaction(type(production).__name__):
+                with timer(metrics, "right_side"):
+                    rights = [production.get_right_side(matched_graph)
+                              for _, matched_graph, _ in batch]
+                with timer(metrics, "remove"):
+                    removed = [edge for match, _, _ in batch
+                               for edge in self._remove_left(left, match, preserved)]
+                with timer(metrics, "update"):
+                    updated = [label for _, _, updates in batch
+                               for label in self._update_left(updates)]
+                with timer(metrics, "add"):
+                    added = [label for right in rights for label in self._add_right(right)]
+            applied_count += len(batch)
+            if metrics is not None:
+                self._count_rewrites(metrics, len(batch), removed, updated, added)
+
+        return applied_count
+
+    def _apply_incremental(self, production: 'Production', left: MatchPlan,
+                           metrics: Optional[ProductionMetrics] = None) -> int:
+        """Applies a production using a worklist of pending candidate matches."""
+        worklist = MatchWorklist(self._matches(production, metrics))
+        applied_count = 0
+
+        while worklist:
+            candidate = worklist.pop()
+            matched_graph = self._accept_match(production, candidate, metrics)
+            if matched_graph is None:
+                continue
+
+            removed, changed = self._rewrite(production, left, candidate, matched_graph, metrics)
+            applied_count += 1
+
+            worklist.invalidate([edge.label for edge in removed] + changed)
+
+            seeds = [node.label for edge in removed for node in edge.nodes] + changed
+            worklist.extend(self._matches(production, metrics, around=seeds))
+
+        return applied_count
+
+    def _apply_parallel(self, production: 'Production', left: MatchPlan, workers: int,
+                        metrics: Optional[ProductionMetrics] = None) -> int:
+        """Applies a production in sweeps over matches found by worker processes."""
+        from concurrent.futures import ProcessPoolExecutor
+        from parallel import parallel_matches
+
+        applied_count = 0
+        with ProcessPoolExecutor(workers) as pool:
+            while True:
+                with timer(metrics, "match"):
+                    matches = parallel_matches(self, left, workers, predicate=production.match_edge,
+                                               unique=production.symmetric, executor=pool)
+                if metrics is not None:
+                    metrics.matches += len(matches)
+                worklist = MatchWorklist(matches)
+                applied = 0
+                while worklist:
+                    candidate = worklist.pop()
+                    matched_graph = self._accept_match(production, candidate, metrics)
+                    if matched_graph is None:
+                        continue
+                    removed, changed = self._rewrite(production, left, candidate, matched_graph,
+                                                     metrics)
+                    worklist.invalidate([edge.label for edge in removed] + changed)
+                    applied += 1
+
+                if not applied:
+                    break
+                applied_count += applied
+
+        return applied_count
+
+    def _accept_match(self, production: 'Production', candidate: dict,
+                      metrics: Optional[ProductionMetrics] = None) -> Optional[MatchView]:
+        """
+        Checks a candidate match and wraps it in a view for the production.
+
+        Returns:
+            View of the matched subgraph (addressed by pattern labels), or
+            None if the candidate is stale or rejected by the production's filter
+        """
+        with timer(metrics, "build"):
+            has = self._store.has
+            valid = all(has(graph_label) for graph_label in candidate)
+        if not valid:
+            if metrics is not None:
+                metrics.stale += 1
+            return None
+
+        view = MatchView(self, candidate)
+        with timer(metrics, "filter"):
+            accepted = production.filter_match(view)
+        if accepted:
+            return view
+        if metrics is not None:
+            metrics.rejected += 1
+        return None
+
+    def _rewrite(self, production: 'Production', left: MatchPlan, match: dict,
+                 matched_graph: MatchView,
+                 metrics: Optional[ProductionMetrics] = None) -> Tuple[List[HyperEdge], List[str]]:
+        """
+        Replaces a matched left side with the production's right side.
+
+        Hyperedges the production preserves stay in place and only get the
+        attribute updates it asks for, the others are removed.
+
+        Returns:
+            Removed hyperedges and labels of added or updated nodes and hyperedges
+        """
+        with self.transaction(type(production).__name__):
+            with timer(metrics, "right_side"):
+                right = production.get_right_side(matched_graph)
+                updates = self._updates(production, match, matched_graph)
+            with timer(metrics, "remove"):
+                removed = self._remove_left(left, match, production.preserved or ())
+            with timer(metrics, "update"):
+                updated = self._update_left(updates)
+            with timer(metrics, "add"):
+                added = self._add_right(right)
+        if metrics is not None:
+            self._count_rewrites(metrics, 1, removed, updated, added)
+        return removed, updated + added
+
+    def _count_rewrites(self, metrics: ProductionMetrics, applied: int, removed: List[HyperEdge],
+                        updated: List[str], added: List[str]) -> None:
+        """Adds rewrites and the elements they changed to a production's metrics."""
+        metrics.applied += applied
+        metrics.edges_removed += len(removed)
+        metrics.edges_updated += len(updated)
+        nodes = sum(1 for label in added if label in self._nodes)
+        metrics.nodes_added += nodes
+        metrics.edges_added += len(added) - nodes
+
+    def _updates(self, production: 'Production', match: dict,
+                 matched_graph: MatchView) -> Dict[str, Dict[str, int]]:
+        """Attribute updates a production makes to a match, by graph label."""
+        if production.preserved is None:
+            return {}
+        inv_match = {v: k for k, v in match.items()}
+        updates = {}
+        for pattern_label, attributes in production.get_updates(matched_graph).items():
+            if pattern_label not in production.preserved:
+                raise ValueError(f"{type(production).__name__} updates {pattern_label}, "
+                                 f"which it does not preserve")
+            updates[inv_match[pattern_label]] = attributes
+        return updates
+
+    def _update_left(self, updates: Dict[str, Dict[str, int]]) -> List[str]:
+        """Applies attribute updates of preserved hyperedges and returns their labels."""
+        for label, attributes in updates.items():
+            self.update_edge(label, **attributes)
+        return list(updates)
+
+    def _remove_left(self, left: MatchPlan, match: dict, preserved=()) -> List[HyperEdge]:
+        """Removes the hyperedges of a matched left side (except preserved ones) and returns them."""
+        removed = []
+        inv_match = {v: k for k, v in match.items()}
+        for label in left.edges:
+            if label in preserved:
+                continue
+            graph_label = inv_match[label]
+            removed.append(self._hyperedges[graph_label])
+            self.remove_node(graph_label)
+        return removed
+
+    def _add_right(self, right: 'Graph') -> List[str]:
+        """Adds the nodes and hyperedges of a right side and returns their labels."""
+        added = []
+        merged = {}
+        for node in right.nodes:
+            if node.label in self._nodes:
+                continue
+            if self.merge_tolerance is not None:
+                existing = self.find_node_at(node.x, node.y, self.merge_tolerance)
+                if existing is not None:
+                    merged[node.label] = existing
+                    continue
+            self.add_node(node)
+            added.append(node.label)
+
+        for edge in right.hyperedges:
+            if merged and not edge.node_labels.isdisjoint(merged):
+                nodes = tuple(merged.get(n.label, n) for n in edge.nodes)
+                edge = HyperEdge(nodes, edge.hypertag, r=edge.r, b=edge.b)
+            self.add_edge(edge, check_nodes=False)
+            added.append(edge.label)
+
+        return added
+
     def __repr__(self):
         return f"Graph(nodes={len(self._nodes)}, hyperedges={len(self._hyperedges)})"
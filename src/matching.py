@@ -0,0 +1,609 @@
+"""
+Helpers for matching production patterns against a graph.
+"""
+
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass
+from itertools import permutations, product
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from edge import HyperEdge
+from node import Node
+
+if TYPE_CHECKING:
+    from graph import Graph
+
+
+class MatchWorklist:
+    """
+    Queue of pending candidate matches.
+
+    Candidates are mappings from graph labels to pattern labels, as returned
+    by Graph.find_subgraph_isomorphisms. Every candidate is indexed by the
+    graph labels it uses, so that after a rewrite all candidates touching
+    removed or re-added elements can be dropped without rescanning the queue.
+    """
+
+    def __init__(self, matches: Iterable[dict] = ()):
+        self._order: deque = deque()
+        self._pending: Dict[frozenset, dict] = {}
+        self._by_label: Dict[str, Set[frozenset]] = defaultdict(set)
+        self.extend(matches)
+
+    def push(self, match: dict) -> None:
+        """Adds a candidate match unless an identical one is already pending."""
+        key = frozenset(match.items())
+        if key in self._pending:
+            return
+        self._pending[key] = match
+        self._order.append(key)
+        for graph_label in match:
+            self._by_label[graph_label].add(key)
+
+    def extend(self, matches: Iterable[dict]) -> None:
+        """Adds several candidate matches."""
+        for match in matches:
+            self.push(match)
+
+    def pop(self) -> Optional[dict]:
+        """Removes and returns the oldest pending match (None if empty)."""
+        while self._order:
+            key = self._order.popleft()
+            match = self._pending.pop(key, None)
+            if match is not None:
+                self._unindex(key, match)
+                return match
+        return None
+
+    def invalidate(self, labels: Iterable[str]) -> None:
+        """Drops every pending match that uses any of the given graph labels."""
+        for label in labels:
+            for key in self._by_label.pop(label, ()):
+                match = self._pending.pop(key, None)
+                if match is not None:
+                    self._unindex(key, match)
+
+    def _unindex(self, key: frozenset, match: dict) -> None:
+        for graph_label in match:
+            keys = self._by_label.get(graph_label)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_label[graph_label]
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(list(self._pending.values()))
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+class MatchView:
+    """
+    Read-only view of a match in a graph, addressed by pattern labels.
+
+    Productions get a MatchView as the matched left side in filter_match,
+    get_right_side and get_updates. It looks the matched nodes and
+    hyperedges up in the graph when asked instead of copying them into a new
+    Graph, so rejecting a candidate costs no allocations. get_node and
+    get_hyperedge return the graph's own objects (with graph labels) and
+    reflect the current state of the graph.
+
+    Any other Graph attribute (for productions written against a Graph)
+    builds a copy of the matched subgraph once and is read from it.
+    """
+
+    __slots__ = ("_host", "_pairs", "_inverse", "_copy")
+
+    def __init__(self, graph, match: Mapping[str, str]):
+        """
+        Args:
+            graph: Graph the match was found in
+            match: Mapping from graph labels to pattern labels
+        """
+        self._host = graph
+        self._pairs = match
+        self._inverse: Optional[Dict[str, str]] = None
+        self._copy = None
+
+    @property
+    def match(self) -> Mapping[str, str]:
+        """Mapping from graph labels to pattern labels."""
+        return self._pairs
+
+    def graph_label(self, label: str) -> Optional[str]:
+        """Returns the graph label matched to a pattern label (None if not in the pattern)."""
+        if self._inverse is None:
+            self._inverse = {p: g for g, p in self._pairs.items()}
+        return self._inverse.get(label)
+
+    def get_node(self, label: str) -> Optional[Node]:
+        """Returns the graph node matched to a pattern node."""
+        graph_label = self.graph_label(label)
+        return None if graph_label is None else self._host.get_node(graph_label)
+
+    def get_hyperedge(self, label: str) -> Optional[HyperEdge]:
+        """Returns the graph hyperedge matched to a pattern hyperedge."""
+        graph_label = self.graph_label(label)
+        return None if graph_label is None else self._host.get_hyperedge(graph_label)
+
+    @property
+    def nodes(self) -> List[Node]:
+        """Matched graph nodes."""
+        nodes = self._host._nodes
+        return [nodes[g] for g in self._pairs if g in nodes]
+
+    @property
+    def hyperedges(self) -> List[HyperEdge]:
+        """Matched graph hyperedges."""
+        edges = self._host._hyperedges
+        return [edges[g] for g in self._pairs if g in edges]
+
+    def __contains__(self, label: str) -> bool:
+        return self.graph_label(label) is not None
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def to_graph(self):
+        """
+        Copies the matched subgraph into a Graph labelled with pattern labels.
+
+        Hyperedge vertices keep the graph's HyperEdge objects, like the
+        matched subgraphs productions used to get.
+        """
+        if self._copy is None:
+            from graph import Graph
+            from storage import centroid
+
+            copy = Graph()
+            nodes, edges = self._host._nodes, self._host._hyperedges
+            for graph_label, pattern_label in self._pairs.items():
+                edge = edges.get(graph_label)
+                if edge is None:
+                    copy._store.add_vertex(pattern_label, nodes[graph_label])
+                else:
+                    copy._store.add_vertex(pattern_label, centroid(edge), edge)
+            self._copy = copy
+        return self._copy
+
+    def __getattr__(self, name: str):
+        if name.startswith("__") or name in MatchView.__slots__:
+            raise AttributeError(name)
+        return getattr(self.to_graph(), name)
+
+    def __repr__(self):
+        return f"MatchView({dict(self._pairs)!r})"
+
+
+def vf2_node_match(n1: dict, n2: dict) -> bool:
+    """Node compatibility used with networkx's GraphMatcher on the bipartite encoding."""
+    if n1.get('is_hyper') != n2.get('is_hyper'):
+        return False
+    if n1.get('is_hyper'):
+        e1 = n1.get('hyperedge')
+        e2 = n2.get('hyperedge')
+        if e1 and e2:
+            return e1.hypertag == e2.hypertag
+    return True
+
+
+@dataclass(eq=False)
+class MatchPlan:
+    """
+    Precompiled description of a pattern.
+
+    Everything the matchers derive from a left side is computed once here:
+    the hypertag and node labels of every pattern hyperedge, a search order
+    and eccentricity for every possible anchor, per-tag degree constraints of
+    the pattern nodes, the attribute values hyperedges must have, and the
+    pattern's automorphism group.
+
+    A plan is shared by all instances of a production and by the matchers,
+    so neither the plan nor its pattern may be changed after compilation;
+    the fields are plain dicts and the pattern a Graph, nothing enforces
+    it. Plans compare and hash by identity.
+
+    Attributes:
+        pattern: The left side (must not be modified after compilation)
+        labels: Pattern labels in output order (nodes first)
+        edges: Pattern hyperedge label -> (hypertag, node labels)
+        node_edges: Pattern node label -> labels of its hyperedges
+        degrees: Pattern node label -> number of its hyperedges per hypertag
+        required: Pattern hyperedge label -> attribute values it requires
+        anchor_tag: Default anchor hypertag (rarest in the pattern)
+        orders: Anchor hyperedge label -> search order of all pattern hyperedges
+        eccentricities: Anchor hyperedge label -> max incidence distance to any element
+        automorphisms: All automorphisms of the pattern (label -> label)
+        symmetries: Anchor hyperedge label -> permutations of its node positions
+            induced by the non-trivial automorphisms that fix it
+        supported: False if the anchored matcher can't handle the pattern
+            (no hyperedges, isolated nodes or several components)
+    """
+    pattern: 'Graph'
+    labels: Tuple[str, ...]
+    edges: Mapping[str, Tuple[str, Tuple[str, ...]]]
+    node_edges: Mapping[str, FrozenSet[str]]
+    degrees: Mapping[str, Mapping[str, int]]
+    required: Mapping[str, Mapping[str, int]]
+    anchor_tag: Optional[str]
+    orders: Mapping[str, Tuple[str, ...]]
+    eccentricities: Mapping[str, int]
+    automorphisms: Tuple[Mapping[str, str], ...]
+    symmetries: Mapping[str, Tuple[Tuple[int, ...], ...]]
+    supported: bool
+
+    @classmethod
+    def compile(cls, pattern: 'Graph',
+                required_attributes: Optional[Mapping[str, Mapping[str, int]]] = None) -> 'MatchPlan':
+        """
+        Compiles a pattern.
+
+        Args:
+            pattern: Left side to compile
+            required_attributes: Attribute values hyperedges of a given hypertag
+                must have, e.g. {"Q": {"r": 0}}
+        """
+        required_attributes = required_attributes or {}
+        edges = {
+            label: (edge.hypertag, tuple(n.label for n in edge.nodes))
+            for label, edge in pattern._hyperedges.items()
+        }
+        node_edges: Dict[str, Set[str]] = defaultdict(set)
+        for label, (_, node_labels) in edges.items():
+            for node_label in node_labels:
+                node_edges[node_label].add(label)
+        degrees = {
+            node_label: dict(Counter(edges[label][0] for label in labels))
+            for node_label, labels in node_edges.items()
+        }
+        required = {
+            label: dict(required_attributes[tag])
+            for label, (tag, _) in edges.items() if required_attributes.get(tag)
+        }
+
+        orders = {label: tuple(_search_order(label, edges, node_edges)) for label in edges}
+        supported = (
+            bool(edges)
+            and all(label in node_edges for label in pattern._nodes)
+            and len(next(iter(orders.values()))) == len(edges)
+        )
+
+        tag_counts = Counter(tag for tag, _ in edges.values())
+        anchor_tag = None
+        if edges:
+            arity = {tag: len(nodes) for tag, nodes in edges.values()}
+            anchor_tag = min(tag_counts, key=lambda t: (tag_counts[t], -arity[t], t))
+
+        automorphisms = _automorphisms(list(pattern._nodes), edges)
+
+        symmetries = {}
+        for label, (_, nodes) in edges.items():
+            position = {n: i for i, n in enumerate(nodes)}
+            symmetries[label] = tuple(
+                tuple(position[sigma[n]] for n in nodes)
+                for sigma in automorphisms
+                if sigma[label] == label and any(sigma[n] != n for n in nodes)
+            )
+
+        return cls(
+            pattern=pattern,
+            labels=tuple(node.label for node in pattern.ordered_nodes),
+            edges=edges,
+            node_edges={n: frozenset(labels) for n, labels in node_edges.items()},
+            degrees=degrees,
+            required=required,
+            anchor_tag=anchor_tag,
+            orders=orders,
+            eccentricities={label: _eccentricity(label, edges, node_edges) for label in edges},
+            automorphisms=automorphisms,
+            symmetries=symmetries,
+            supported=supported,
+        )
+
+    def anchors(self, tag: str) -> List[str]:
+        """Pattern hyperedges with the given hypertag."""
+        return [label for label, (t, _) in self.edges.items() if t == tag]
+
+    def accepts(self, pattern_label: str, edge: 'HyperEdge') -> bool:
+        """Checks a graph hyperedge against the attributes its pattern hyperedge requires."""
+        for name, value in self.required.get(pattern_label, {}).items():
+            if getattr(edge, name) != value:
+                return False
+        return True
+
+
+def _automorphisms(nodes: List[str], edges: Mapping) -> Tuple[Dict[str, str], ...]:
+    """
+    All automorphisms of a pattern's incidence structure.
+
+    Equivalent to running networkx's GraphMatcher of the bipartite encoding
+    against itself with vf2_node_match, without importing networkx: node
+    permutations are found by backtracking over nodes with the same per-tag
+    degrees, and every one that maps each hyperedge onto a hyperedge of the
+    same hypertag (and node set) is extended to the hyperedges.
+    """
+    groups: Dict[Tuple[str, FrozenSet[str]], List[str]] = defaultdict(list)
+    node_edges: Dict[str, List[str]] = defaultdict(list)
+    for label, (tag, node_labels) in edges.items():
+        groups[tag, frozenset(node_labels)].append(label)
+        for node_label in node_labels:
+            node_edges[node_label].append(label)
+    signature = {
+        n: tuple(sorted(Counter(edges[label][0] for label in node_edges[n]).items()))
+        for n in nodes
+    }
+
+    node_maps = []
+    sigma: Dict[str, str] = {}
+    used: Set[str] = set()
+
+    def extend(i: int) -> None:
+        if i == len(nodes):
+            node_maps.append(dict(sigma))
+            return
+        n = nodes[i]
+        for image in nodes:
+            if image in used or signature[image] != signature[n]:
+                continue
+            sigma[n] = image
+            used.add(image)
+            if all(_maps_edge(edges[label], sigma, groups) for label in node_edges[n]):
+                extend(i + 1)
+            used.discard(image)
+            del sigma[n]
+
+    extend(0)
+
+    automorphisms = []
+    for node_map in node_maps:
+        choices = []
+        for (tag, members), labels in groups.items():
+            images = groups[tag, frozenset(node_map[n] for n in members)]
+            choices.append([dict(zip(labels, p)) for p in permutations(images)])
+        for edge_maps in product(*choices):
+            automorphism = dict(node_map)
+            for edge_map in edge_maps:
+                automorphism.update(edge_map)
+            automorphisms.append(automorphism)
+    return tuple(automorphisms)
+
+
+def _maps_edge(edge: Tuple[str, Tuple[str, ...]], sigma: Mapping[str, str],
+               groups: Mapping[Tuple[str, FrozenSet[str]], List[str]]) -> bool:
+    """False if the (so far partial) node mapping sends the hyperedge to no matching group."""
+    tag, node_labels = edge
+    if any(n not in sigma for n in node_labels):
+        return True
+    image = groups.get((tag, frozenset(sigma[n] for n in node_labels)))
+    return image is not None and len(image) == len(groups[tag, frozenset(node_labels)])
+
+
+def _search_order(anchor: str, edges: Mapping, node_edges: Mapping) -> List[str]:
+    """Orders pattern hyperedges so each one shares a node with an earlier one."""
+    order = [anchor]
+    seen = {anchor}
+    for label in order:
+        for node_label in edges[label][1]:
+            for neighbour in sorted(node_edges[node_label]):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    order.append(neighbour)
+    return order
+
+
+def _eccentricity(label: str, edges: Mapping, node_edges: Mapping) -> int:
+    """Largest number of incidence steps from a pattern hyperedge to any pattern element."""
+    distance = {label: 0}
+    frontier = [label]
+    while frontier:
+        next_frontier = []
+        for current in frontier:
+            neighbours = edges[current][1] if current in edges else node_edges[current]
+            for neighbour in neighbours:
+                if neighbour not in distance:
+                    distance[neighbour] = distance[current] + 1
+                    next_frontier.append(neighbour)
+        frontier = next_frontier
+    return max(distance.values())
+
+
+class AnchoredMatcher:
+    """
+    Pattern matcher working directly on the hypergraph structure.
+
+    The search starts from hyperedges of the pattern's rarest hypertag
+    (the anchor) and grows outward along vertex-hyperedge incidence, so its
+    cost depends on the number of anchor candidates, not on the graph size.
+    Matches are induced subgraph isomorphisms of the vertex-hyperedge
+    incidence graph, exactly like the ones found by networkx's GraphMatcher.
+    """
+
+    def __init__(self, graph: 'Graph', plan: MatchPlan, anchor: Optional[str] = None):
+        """
+        Args:
+            graph: Graph to search
+            plan: Compiled pattern
+            anchor: Optional pattern hyperedge to grow matches from (by default
+                one with the hypertag rarest in the graph)
+        """
+        self.graph = graph
+        self.plan = plan
+        self.supported = plan.supported
+        self.anchor = anchor
+
+    def _anchor(self) -> str:
+        """Picks the pattern hyperedge with the fewest candidate images in the graph."""
+        if self.anchor is not None:
+            return self.anchor
+        plan = self.plan
+        return min(plan.edges, key=lambda label: (len(self._indexed(label)),
+                                                  plan.edges[label][0] != plan.anchor_tag,
+                                                  plan.edges[label][0]))
+
+    def _indexed(self, label: str):
+        """
+        Graph hyperedges that can be images of a pattern hyperedge, as a live
+        view of the storage's index (by hypertag, and by r or b if the plan
+        requires a value).
+        """
+        tag = self.plan.edges[label][0]
+        required = self.plan.required.get(label, {})
+        return self.graph._store.index.members(tag, required.get("r"), required.get("b"))
+
+    def anchor_candidates(self, anchor: str) -> List[str]:
+        """Labels of the graph hyperedges an anchor can be mapped to."""
+        return list(self._indexed(anchor))
+
+    def iter_matches(self, around: Optional[Iterable[str]] = None,
+                     predicate: Optional[Callable[['HyperEdge', 'HyperEdge'], bool]] = None,
+                     unique: bool = False,
+                     candidates: Optional[Iterable[str]] = None) -> Iterator[dict]:
+        """
+        Lazily yields matches as dictionaries mapping graph labels to pattern labels.
+
+        The graph must not be modified while the iterator is in use.
+
+        Args:
+            around: Optional graph labels; only matches containing at least
+                one of them are guaranteed to be found. Anchor candidates are
+                limited to the neighbourhood of these labels.
+            predicate: Optional check called with (pattern hyperedge, graph hyperedge)
+                before a pairing is extended further
+            unique: If True, only one of the matches covering the same graph
+                elements (automorphic variants) is yielded
+            candidates: Optional graph hyperedges to use as anchor images
+                (overrides around)
+        """
+        plan = self.plan
+        anchor = self._anchor()
+        tag = plan.edges[anchor][0]
+        store = self.graph._store
+        if candidates is not None:
+            candidates = list(candidates)
+        elif around is None:
+            candidates = self.anchor_candidates(anchor)
+        else:
+            ball = self.graph.neighbourhood(around, plan.eccentricities[anchor])
+            candidates = [label for label in ball if store.edge_tag(label) == tag]
+
+        self._order = plan.orders[anchor]
+        self._predicate = predicate
+        # Variants obtained by automorphisms that fix the anchor differ in the
+        # order of the anchor's node images; with unique=True only the
+        # lexicographically smallest order is extended.
+        self._symmetries = plan.symmetries[anchor] if unique else ()
+        self._node_map: Dict[str, str] = {}
+        self._node_used: Dict[str, str] = {}
+        self._edge_map: Dict[str, str] = {}
+        self._edge_used: Dict[str, str] = {}
+        self._edge_nodes: Dict[str, Set[str]] = {}
+        self._tag_counts: Dict[str, Counter] = {}
+
+        # With a single anchor in the pattern every match has exactly one
+        # anchor image, so duplicates can only come from the same candidate.
+        single_anchor = len(plan.anchors(tag)) == 1
+        seen: Set[frozenset] = set()
+        for candidate in candidates:
+            if single_anchor:
+                seen.clear()
+            for match in self._extend(0, [candidate]):
+                if unique:
+                    key = frozenset(match)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield match
+
+    def _extend(self, depth: int, candidates: Iterable[str]) -> Iterator[dict]:
+        plan = self.plan
+        if depth == len(self._order):
+            yield {self._image(label): label for label in plan.labels}
+            return
+
+        pattern_label = self._order[depth]
+        tag, pattern_nodes = plan.edges[pattern_label]
+        free = [n for n in pattern_nodes if n not in self._node_map]
+        required = plan.required.get(pattern_label)
+
+        store = self.graph._store
+        for graph_label in candidates:
+            if graph_label in self._edge_used or store.edge_tag(graph_label) != tag:
+                continue
+            if required is not None and not all(
+                    store.edge_attr(graph_label, name) == value for name, value in required.items()):
+                continue
+            if self._predicate is not None and not self._predicate(
+                    plan.pattern._hyperedges[pattern_label], self.graph._hyperedges[graph_label]):
+                continue
+            graph_nodes = store.edge_node_labels(graph_label)
+            if not self._edge_fits(pattern_nodes, graph_nodes):
+                continue
+
+            available = [n for n in graph_nodes if n not in self._node_used]
+            self._edge_map[pattern_label] = graph_label
+            self._edge_used[graph_label] = pattern_label
+            self._edge_nodes[graph_label] = set(graph_nodes)
+            for images in permutations(available, len(free)):
+                if depth == 0 and self._symmetries and not self._canonical(images):
+                    continue
+                if not all(self._node_fits(n, x) for n, x in zip(free, images)):
+                    continue
+                for n, x in zip(free, images):
+                    self._node_map[n] = x
+                    self._node_used[x] = n
+                yield from self._extend(depth + 1, self._next_candidates(depth + 1))
+                for n, x in zip(free, images):
+                    del self._node_map[n]
+                    del self._node_used[x]
+            del self._edge_map[pattern_label]
+            del self._edge_used[graph_label]
+            del self._edge_nodes[graph_label]
+
+    def _canonical(self, images: Tuple[str, ...]) -> bool:
+        """Checks that no automorphism fixing the anchor gives a smaller image order."""
+        for permutation in self._symmetries:
+            if tuple(images[i] for i in permutation) < images:
+                return False
+        return True
+
+    def _next_candidates(self, depth: int) -> Iterable[str]:
+        """Graph hyperedges with the right hypertag incident to the image of an already matched node."""
+        if depth == len(self._order):
+            return ()
+        tag, pattern_nodes = self.plan.edges[self._order[depth]]
+        bound = next(n for n in pattern_nodes if n in self._node_map)
+        return self.graph._store.incident_edges(self._node_map[bound], tag)
+
+    def _edge_fits(self, pattern_nodes: Tuple[str, ...], graph_nodes: List[str]) -> bool:
+        """Checks a hyperedge pairing against the nodes matched so far."""
+        if len(graph_nodes) < len(pattern_nodes):
+            return False
+        for n in pattern_nodes:
+            if n in self._node_map and self._node_map[n] not in graph_nodes:
+                return False
+        for x in graph_nodes:
+            if x in self._node_used and self._node_used[x] not in pattern_nodes:
+                return False
+        return True
+
+    def _node_fits(self, pattern_node: str, graph_node: str) -> bool:
+        """Checks a node pairing against the hyperedges matched so far and the node degrees."""
+        for graph_edge, pattern_edge in self._edge_used.items():
+            if graph_node in self._edge_nodes[graph_edge] and \
+                    pattern_node not in self.plan.edges[pattern_edge][1]:
+                return False
+        counts = self._tag_counts.get(graph_node)
+        if counts is None:
+            store = self.graph._store
+            counts = Counter(store.edge_tag(e) for e in store.incident(graph_node))
+            self._tag_counts[graph_node] = counts
+        for tag, degree in self.plan.degrees[pattern_node].items():
+            if counts[tag] < degree:
+                return False
+        return True
+
+    def _image(self, pattern_label: str) -> str:
+        if pattern_label in self._node_map:
+            return self._node_map[pattern_label]
+        return self._edge_map[pattern_label]
@@ -0,0 +1,145 @@
+"""
+Reading and writing quad meshes in the Wavefront OBJ text format.
+
+Only the parts of OBJ describing a planar quad mesh are used: vertices
+("v x y [z]", z is ignored) and quad faces ("f a b c d", with optional
+"/texture/normal" suffixes and negative relative indices). Other lines
+are skipped.
+"""
+
+from array import array
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+from edge import edge_label
+from graph import Graph
+from storage import ArrayStorage
+
+PathLike = Union[str, Path]
+
+
+def read_obj(path: PathLike, backend: str = "array", prefix: str = "v", **graph_args) -> Graph:
+    """
+    Streams a quad mesh from an OBJ file into a graph.
+
+    Every vertex becomes a node labelled with `prefix` and its 0-based
+    position in the file, every face a Q hyperedge (r=0) and every side of
+    a face an E hyperedge, with b=1 if the side belongs to one face only
+    (boundary) and b=0 otherwise. The file is parsed line by line into flat
+    arrays and the graph is built in one batch, without creating Node or
+    HyperEdge objects.
+
+    Args:
+        path: OBJ file
+        backend: Storage backend of the graph
+        prefix: Prefix of node labels
+        **graph_args: Other Graph arguments (cell_size, merge_tolerance)
+
+    Returns:
+        Graph with the mesh
+
+    Raises:
+        ValueError: If a vertex has no y coordinate, or a face is not a quad,
+            uses the index 0, refers to a missing vertex, repeats a vertex
+            or is listed twice
+    """
+    xy = array("d")
+    faces = array("q")
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if line.startswith("v "):
+                parts = line.split()
+                if len(parts) < 3:
+                    raise ValueError(f"{path}:{number}: a vertex needs x and y coordinates")
+                xy.append(float(parts[1]))
+                xy.append(float(parts[2]))
+            elif line.startswith("f "):
+                parts = line.split()[1:]
+                if len(parts) != 4:
+                    raise ValueError(f"{path}:{number}: only quad faces are supported")
+                # Negative indices count back from the last vertex read so far.
+                count = len(xy) // 2
+                for part in parts:
+                    k = int(part.split("/", 1)[0])
+                    if k == 0:
+                        raise ValueError(f"{path}:{number}: vertex indices start at 1")
+                    faces.append(k - 1 if k > 0 else count + k)
+
+    n = len(xy) // 2
+    quads = np.frombuffer(faces, dtype=np.int64).reshape(-1, 4)
+    if quads.size and (quads.min() < 0 or quads.max() >= n):
+        raise ValueError(f"{path}: face refers to a missing vertex")
+    corners = np.sort(quads, axis=1)
+    if np.any(corners[:, 1:] == corners[:, :-1]):
+        raise ValueError(f"{path}: face repeats a vertex")
+    corners = corners[np.lexsort(corners.T[::-1])]
+    if np.any(np.all(corners[1:] == corners[:-1], axis=1)):
+        raise ValueError(f"{path}: face listed twice")
+
+    # Sides are identified by the key lower * n + upper of their vertex numbers.
+    first, second = quads.ravel(), np.roll(quads, -1, axis=1).ravel()
+    keys, uses = np.unique(np.minimum(first, second) * n + np.maximum(first, second),
+                           return_counts=True)
+    sides = np.stack(np.divmod(keys, n), axis=1)
+
+    labels = [f"{prefix}{i}" for i in range(n)]
+    edge_labels = [edge_label("E", (labels[a], labels[b])) for a, b in sides.tolist()]
+    edge_labels.extend(edge_label("Q", [labels[i] for i in quad]) for quad in quads.tolist())
+
+    n_sides, n_quads = len(sides), len(quads)
+    store = ArrayStorage.from_arrays(
+        labels,
+        np.frombuffer(xy, dtype=np.float64).reshape(n, 2),
+        ["E", "Q"],
+        np.repeat([0, 1], [n_sides, n_quads]),
+        np.concatenate(([0], np.cumsum(np.repeat([2, 4], [n_sides, n_quads])))),
+        np.concatenate((sides.ravel(), quads.ravel())),
+        edge_labels,
+        b=np.concatenate((uses == 1, np.ones(n_quads, dtype=bool))),
+    )
+    return Graph._from_storage(store, backend, **graph_args)
+
+
+def write_obj(graph: Graph, path: PathLike, hypertag: str = "Q") -> None:
+    """
+    Streams the nodes and quad hyperedges of a graph to an OBJ file.
+
+    Nodes are written in graph order (z = 0) and every hyperedge with the
+    given hypertag becomes a face with its vertices in hyperedge order.
+    Labels and the r/b attributes are not stored; read_obj recomputes E
+    hyperedges and their b flags from the faces. Coordinates and faces are
+    taken from the storage as arrays, without creating Node objects.
+
+    Args:
+        graph: Graph to write
+        path: Destination file
+        hypertag: Hypertag of the hyperedges written as faces
+
+    Raises:
+        ValueError: If a face refers to a removed node
+    """
+    store = graph._store
+    offsets, vertices = store.tag_incidence(hypertag)
+    if np.any(vertices < 0):
+        face = int(np.searchsorted(offsets, np.argmax(vertices < 0), side="right")) - 1
+        raise ValueError(f"{store.tag_members(hypertag)[face]} refers to a removed node")
+    sizes = np.diff(offsets)
+    with open(path, "w") as f:
+        for xy in _chunks(store.node_xy()):
+            f.writelines(f"v {x!r} {y!r} 0\n" for x, y in xy.tolist())
+        if len(sizes) and np.all(sizes == sizes[0]):
+            line = "f" + " %d" * int(sizes[0]) + "\n"
+            for faces in _chunks((vertices + 1).reshape(len(sizes), -1)):
+                f.writelines(line % tuple(face) for face in faces.tolist())
+        else:
+            numbers = (vertices + 1).tolist()
+            f.writelines("f " + " ".join(map(str, numbers[start:end])) + "\n"
+                         for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()))
+
+
+def _chunks(rows: np.ndarray, size: int = 4096):
+    """Yields blocks of rows, so that only a block at a time is converted to Python objects."""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
@@ -0,0 +1,125 @@
+"""
+Opt-in timing counters for applying productions.
+
+A Graph with attached Metrics (see Graph.attach_metrics) records, for every
+production (by class name), how many matches the search enumerated, how
+many of them were stale or rejected by filter_match, how many rewrites were
+applied, how many hyperedges they removed and updated and how many nodes
+and hyperedges they added, together with the wall time of every phase:
+
+    match       enumerating matches (the search itself)
+    build       checking that a match is still valid
+    filter      Production.filter_match
+    right_side  Production.get_right_side and get_updates
+    remove      removing the replaced hyperedges
+    update      updating preserved hyperedges
+    add         adding the right side
+
+find_subgraph_isomorphisms is recorded under its own name ("match" only).
+Without attached metrics the graph only checks for None, so the counters
+cost nothing when they are not used.
+"""
+
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+Hook = Callable[[str, str, float], None]
+
+PHASES = ("match", "build", "filter", "right_side", "remove", "update", "add")
+
+_NO_TIMER = nullcontext()
+
+
+@dataclass
+class ProductionMetrics:
+    """Counters and phase times of a single production."""
+    name: str
+    matches: int = 0
+    stale: int = 0
+    rejected: int = 0
+    applied: int = 0
+    edges_removed: int = 0
+    edges_updated: int = 0
+    nodes_added: int = 0
+    edges_added: int = 0
+    times: Dict[str, float] = field(default_factory=dict)
+    hook: Optional[Hook] = field(default=None, repr=False, compare=False)
+
+    @property
+    def time(self) -> float:
+        """Total wall time of all phases."""
+        return sum(self.times.values())
+
+    def record(self, phase: str, seconds: float) -> None:
+        """Adds time to a phase and calls the hook, if any."""
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+        if self.hook is not None:
+            self.hook(self.name, phase, seconds)
+
+    @contextmanager
+    def timer(self, phase: str):
+        """Records the wall time of the block as the given phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def timed_matches(self, matches: Iterable[T]) -> Iterator[T]:
+        """Passes matches through, counting them and timing the search as "match"."""
+        iterator = iter(matches)
+        while True:
+            start = time.perf_counter()
+            try:
+                match = next(iterator)
+            except StopIteration:
+                self.record("match", time.perf_counter() - start)
+                return
+            self.record("match", time.perf_counter() - start)
+            self.matches += 1
+            yield match
+
+
+def timer(metrics: Optional[ProductionMetrics], phase: str) -> ContextManager:
+    """Returns metrics.timer(phase), or a no-op context manager if metrics is None."""
+    if metrics is None:
+        return _NO_TIMER
+    return metrics.timer(phase)
+
+
+class Metrics:
+    """Metrics of all productions applied to a graph."""
+
+    def __init__(self, hook: Optional[Hook] = None):
+        """
+        Args:
+            hook: Optional callback called as hook(production name, phase,
+                seconds) after every timed phase
+        """
+        self.hook = hook
+        self.productions: Dict[str, ProductionMetrics] = {}
+
+    def __getitem__(self, name: str) -> ProductionMetrics:
+        """Returns the metrics of a production (by class name), creating them if needed."""
+        metrics = self.productions.get(name)
+        if metrics is None:
+            metrics = self.productions[name] = ProductionMetrics(name, hook=self.hook)
+        return metrics
+
+    def reset(self) -> None:
+        """Clears all counters."""
+        self.productions.clear()
+
+    def report(self) -> str:
+        """Formats the counters and phase times as a table."""
+        lines = [f"{'production':<28} {'matches':>8} {'rejected':>8} {'applied':>8} "
+                 + " ".join(f"{phase:>10}" for phase in PHASES) + f" {'total':>10}"]
+        for name, m in self.productions.items():
+            lines.append(f"{name:<28} {m.matches:>8} {m.rejected:>8} {m.applied:>8} "
+                         + " ".join(f"{m.times.get(phase, 0.0):10.4f}" for phase in PHASES)
+                         + f" {m.time:10.4f}")
+        return "\n".join(lines)
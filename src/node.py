@@ -1,8 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, Any
 
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     """
     Represents a vertex in the graph.
@@ -10,16 +10,20 @@ class Node:
     Attributes:
         x: X coordinate of the vertex
         y: Y coordinate of the vertex
-        label: Vertex label (unique identifier)
+        label: Vertex label (unique identifier, must not change after creation)
         hyperref: Reference to hyperedge (if this node represents a hyperedge)
     """
     x: float
     y: float
     label: str
     hyperref: Optional[Any] = None
+    _hash: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._hash = hash(self.label)
 
     def __hash__(self):
-        return hash(self.label)
+        return self._hash
 
     def __eq__(self, other):
         if isinstance(other, Node):
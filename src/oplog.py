@@ -0,0 +1,132 @@
+"""
+Append-only log of graph changes.
+
+A Graph with an attached OperationLog (see Graph.attach_log) appends an
+Operation for every node or hyperedge addition, attribute update and
+removal. Rewrites done by apply / apply_all are wrapped in transactions,
+marked in the log by "begin" and "commit" operations. Consumers can
+subscribe to the log to be notified of every operation, read the
+operations added since a position, or replay the log onto another graph.
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+from edge import HyperEdge
+from node import Node
+
+if TYPE_CHECKING:
+    from graph import Graph
+
+
+@dataclass(frozen=True)
+class Operation:
+    """
+    A single change of a graph.
+
+    Attributes:
+        kind: "add_node", "add_edge", "update_edge", "remove", or a transaction
+            marker: "begin", "commit" or "abort"
+        label: Label of the changed element (the transaction name for markers)
+        node: Added node ("add_node")
+        edge: Added hyperedge ("add_edge"); use r and b for its attributes
+            at the time of the operation
+        r: New r value ("add_edge", "update_edge"; None if unchanged)
+        b: New b value ("add_edge", "update_edge"; None if unchanged)
+        transaction: Number of the enclosing transaction, if any
+    """
+    kind: str
+    label: str
+    node: Optional[Node] = None
+    edge: Optional[HyperEdge] = None
+    r: Optional[int] = None
+    b: Optional[int] = None
+    transaction: Optional[int] = None
+
+
+Subscriber = Callable[[Operation], None]
+
+
+class OperationLog:
+    """Append-only list of operations with transaction markers and subscribers."""
+
+    def __init__(self):
+        self.operations: List[Operation] = []
+        self._subscribers: List[Subscriber] = []
+        self._transactions = 0
+        self._current: Optional[int] = None
+        self._name = ""
+        self._depth = 0
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def since(self, position: int) -> List[Operation]:
+        """Returns the operations appended after the given position (see len)."""
+        return self.operations[position:]
+
+    def subscribe(self, callback: Subscriber) -> None:
+        """Calls callback with every operation appended from now on."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Subscriber) -> None:
+        """Stops notifying a subscriber."""
+        self._subscribers.remove(callback)
+
+    def append(self, kind: str, label: str, node: Optional[Node] = None,
+               edge: Optional[HyperEdge] = None, r: Optional[int] = None,
+               b: Optional[int] = None) -> None:
+        """Appends an operation (inside the current transaction, if any)."""
+        operation = Operation(kind, label, node, edge, r, b, self._current)
+        self.operations.append(operation)
+        for callback in self._subscribers:
+            callback(operation)
+
+    def begin(self, name: str) -> None:
+        """Opens a transaction; nested transactions are merged into the outermost one."""
+        self._depth += 1
+        if self._depth == 1:
+            self._current = self._transactions
+            self._transactions += 1
+            self._name = name
+            self.append("begin", name)
+
+    def end(self, failed: bool = False) -> None:
+        """Closes the innermost transaction ("abort" is logged if the outermost one failed)."""
+        if self._depth == 0:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            self.append("abort" if failed else "commit", self._name)
+            self._current = None
+
+    def replay(self, graph: 'Graph', start: int = 0, end: Optional[int] = None) -> None:
+        """
+        Applies logged operations to another graph.
+
+        Transaction markers open and close transactions on the target graph,
+        so a log attached to it gets the same boundaries.
+
+        Args:
+            graph: Target graph (normally in the state the logged graph had
+                at position start)
+            start: Position of the first operation to replay
+            end: Position after the last operation to replay (default: all)
+        """
+        for operation in self.operations[start:end]:
+            kind = operation.kind
+            if kind == "add_node":
+                graph.add_node(operation.node)
+            elif kind == "add_edge":
+                edge = operation.edge
+                graph.add_edge(HyperEdge(edge.nodes, edge.hypertag, r=operation.r, b=operation.b),
+                               check_nodes=False)
+            elif kind == "update_edge":
+                graph.update_edge(operation.label, r=operation.r, b=operation.b)
+            elif kind == "remove":
+                graph.remove_node(operation.label)
+            elif kind == "begin":
+                if graph.log is not None:
+                    graph.log.begin(operation.label)
+            elif graph.log is not None:
+                graph.log.end(failed=kind == "abort")
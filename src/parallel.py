@@ -0,0 +1,166 @@
+"""
+Parallel pattern matching over spatial partitions of a graph.
+
+Anchor candidates (graph hyperedges the anchored search starts from) are
+split into spatially compact groups. Every group is shipped to a worker
+process together with its halo: all hyperedges within the anchor's
+eccentricity plus one step (so matched nodes keep their full incidence for
+the degree checks) and their nodes. Each worker runs the anchored matcher
+from its own candidates only, so a match is found by the worker owning its
+anchor image and the halos never produce duplicates. Results are merged in
+the serial candidate order.
+"""
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Tuple
+
+from edge import HyperEdge
+from matching import AnchoredMatcher, MatchPlan
+from node import Node
+from storage import centroid
+
+if TYPE_CHECKING:
+    from graph import Graph
+
+PackedNode = Tuple[str, float, float]
+PackedEdge = Tuple[str, Tuple[str, ...], int, int]
+
+
+def partition(graph: 'Graph', candidates: List[str], parts: int) -> List[List[str]]:
+    """
+    Splits hyperedges into spatially compact groups of similar size.
+
+    The hyperedges are sorted by their centroid along the longer side of
+    their bounding box and cut into `parts` strips.
+
+    Args:
+        graph: Graph containing the hyperedges
+        candidates: Hyperedge labels
+        parts: Number of groups
+
+    Returns:
+        Non-empty groups of labels
+    """
+    if not candidates:
+        return []
+    centers = {label: centroid(graph._hyperedges[label]) for label in candidates}
+    xs = [c.x for c in centers.values()]
+    ys = [c.y for c in centers.values()]
+    if max(xs) - min(xs) >= max(ys) - min(ys):
+        ordered = sorted(candidates, key=lambda label: (centers[label].x, centers[label].y))
+    else:
+        ordered = sorted(candidates, key=lambda label: (centers[label].y, centers[label].x))
+    parts = max(1, min(parts, len(ordered)))
+    size, extra = divmod(len(ordered), parts)
+    groups, start = [], 0
+    for i in range(parts):
+        end = start + size + (i < extra)
+        groups.append(ordered[start:end])
+        start = end
+    return groups
+
+
+def pack_halo(graph: 'Graph', anchors: Iterable[str],
+              radius: int) -> Tuple[List[PackedNode], List[PackedEdge]]:
+    """
+    Extracts the part of the graph a search from the given anchors can see.
+
+    Args:
+        graph: Graph to extract from
+        anchors: Anchor candidate hyperedges
+        radius: Eccentricity of the pattern anchor
+
+    Returns:
+        Nodes as (label, x, y) and hyperedges as (tag, node labels, r, b)
+    """
+    edges = []
+    nodes = {}
+    for label in graph.neighbourhood(anchors, radius + 1):
+        edge = graph._hyperedges.get(label)
+        if edge is None:
+            continue
+        edges.append((edge.hypertag, tuple(n.label for n in edge.nodes), edge.r, edge.b))
+        for n in edge.nodes:
+            nodes[n.label] = (n.label, n.x, n.y)
+    return list(nodes.values()), edges
+
+
+def _match_partition(plan: MatchPlan, anchor: str, nodes: List[PackedNode],
+                     edges: List[PackedEdge], candidates: List[str],
+                     predicate: Optional[Callable[[HyperEdge, HyperEdge], bool]],
+                     unique: bool) -> List[List[dict]]:
+    """Worker: rebuilds a partition and returns the matches of every candidate."""
+    from graph import Graph
+
+    graph = Graph()
+    for label, x, y in nodes:
+        graph.add_node(Node(x, y, label))
+    for tag, labels, r, b in edges:
+        edge_nodes = tuple(graph._nodes[label] for label in labels)
+        graph.add_edge(HyperEdge(edge_nodes, tag, r=r, b=b), check_nodes=False)
+
+    matcher = AnchoredMatcher(graph, plan, anchor)
+    return [
+        list(matcher.iter_matches(predicate=predicate, unique=unique, candidates=[candidate]))
+        for candidate in candidates
+    ]
+
+
+def parallel_matches(graph: 'Graph', plan: MatchPlan, workers: int,
+                     predicate: Optional[Callable[[HyperEdge, HyperEdge], bool]] = None,
+                     unique: bool = False, executor: Optional[Executor] = None) -> List[dict]:
+    """
+    Finds all matches of a plan using a pool of worker processes.
+
+    Returns the same matches as AnchoredMatcher.iter_matches on the whole
+    graph, in the same candidate order.
+
+    Args:
+        graph: Graph to search
+        plan: Compiled pattern (must be supported by the anchored matcher)
+        workers: Number of worker processes (ignored if executor is given)
+        predicate: Optional pairing check, see Graph.iter_matches; it is sent
+            to the workers, so it must be picklable (e.g. a bound method of a
+            production, not a lambda)
+        unique: If True, automorphic variants are yielded once
+        executor: Optional executor to reuse between calls
+
+    Returns:
+        List of dictionaries mapping graph labels to pattern labels
+    """
+    if not plan.supported:
+        raise ValueError("Parallel matching needs a pattern supported by the anchored matcher")
+    matcher = AnchoredMatcher(graph, plan)
+    anchor = matcher._anchor()
+    candidates = matcher.anchor_candidates(anchor)
+    radius = plan.eccentricities[anchor]
+    groups = partition(graph, candidates, 2 * workers)
+
+    pool = executor if executor is not None else ProcessPoolExecutor(workers)
+    try:
+        futures = [
+            pool.submit(_match_partition, plan, anchor, *pack_halo(graph, group, radius),
+                        group, predicate, unique)
+            for group in groups
+        ]
+        found = {}
+        for group, future in zip(groups, futures):
+            found.update(zip(group, future.result()))
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+    # Only patterns with several anchor-tag hyperedges can reach the same
+    # match from different candidates; drop those variants like the serial
+    # search does.
+    matches = []
+    seen = set()
+    for candidate in candidates:
+        for match in found[candidate]:
+            if unique:
+                key = frozenset(match)
+                if key in seen:
+                    continue
+                seen.add(key)
+            matches.append(match)
+    return matches
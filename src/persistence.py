@@ -0,0 +1,117 @@
+"""
+Binary graph files.
+
+A file holds the columns of an array storage (see ArrayStorage.columns):
+
+    magic (8 bytes) | header length (uint64) | JSON header | padding | arrays
+
+The header lists the hypertags and, for every array, its dtype, shape and
+offset from the start of the array section. Arrays are aligned to 64 bytes
+and stored in native byte order, so a loaded file can be memory-mapped and
+used by the array backend without copying or parsing.
+"""
+
+import json
+import struct
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+from storage import ArrayStorage
+
+MAGIC = b"HGRAPH01"
+ALIGNMENT = 64
+
+PathLike = Union[str, Path]
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _to_array_storage(store) -> ArrayStorage:
+    """
+    Converts a storage of another backend in two bulk inserts.
+
+    Vertices that were removed while hyperedges still refer to them are
+    added and removed again, so they are saved like the array backend
+    saves them (dead, but kept for their hyperedges).
+    """
+    converted = ArrayStorage()
+    converted.add_nodes(list(store.nodes), store.node_xy())
+    dangling = {n.label: n for edge in store.hyperedges.values() for n in edge.nodes
+                if n.label not in store.nodes}
+    if dangling:
+        converted.add_nodes(list(dangling),
+                            np.array([(n.x, n.y) for n in dangling.values()], dtype=np.float64))
+    converted.add_edges(store.hyperedges.values())
+    for label in dangling:
+        converted.remove(label)
+    return converted
+
+
+def write_storage(store, path: PathLike) -> None:
+    """
+    Writes a storage backend to a file.
+
+    Args:
+        store: Storage of any backend (other backends are converted first)
+        path: Destination file
+    """
+    if not isinstance(store, ArrayStorage):
+        store = _to_array_storage(store)
+
+    tags, columns = store.columns()
+    arrays = {}
+    offset = 0
+    for name, array in columns.items():
+        array = np.ascontiguousarray(array)
+        columns[name] = array
+        arrays[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({"version": 1, "tags": tags, "arrays": arrays}).encode()
+
+    start = _aligned(len(MAGIC) + 8 + len(header))
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, array in columns.items():
+            f.seek(start + arrays[name]["offset"])
+            f.write(array.tobytes())
+
+
+def read_storage(path: PathLike, mmap: bool = True) -> ArrayStorage:
+    """
+    Reads a file written by write_storage into an array storage.
+
+    Args:
+        path: File to read
+        mmap: If True, the arrays are memory-mapped copy-on-write: the file is
+            paged in lazily and changes to the graph are never written back.
+            Otherwise the whole file is read into memory.
+
+    Returns:
+        Array storage over the file's columns
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a graph file: {path}")
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+
+    start = _aligned(len(MAGIC) + 8 + length)
+    if mmap:
+        data = np.memmap(path, dtype=np.uint8, mode="c")
+    else:
+        data = np.fromfile(path, dtype=np.uint8)
+
+    columns = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        begin = start + spec["offset"]
+        chunk = data[begin:begin + count * dtype.itemsize]
+        columns[name] = chunk.view(dtype).reshape(spec["shape"])
+    return ArrayStorage.from_columns(header["tags"], columns)
@@ -25,6 +25,7 @@ Example:
 
 from edge import HyperEdge
 from graph import Graph
+from matching import MatchView
 from node import Node
 from productions.production import Production
 
@@ -37,6 +38,16 @@ class P0(Production):
     Changes r attribute of Q hyperedge from 0 to 1.
     """
 
+    required_attributes = {"Q": {"r": 0}}
+    produces = frozenset({"Q"})
+    # Only the Q hyperedge, which every automorphism fixes, is inspected and changed.
+    symmetric = True
+    preserved = frozenset({
+        "n1", "n2", "n3", "n4",
+        "E_n1_n2", "E_n2_n3", "E_n3_n4", "E_n1_n4",
+        "Q_n1_n2_n3_n4",
+    })
+
     def get_left_side(self) -> Graph:
         """
         Creates the left side of the production.
@@ -66,34 +77,33 @@ class P0(Production):
 
         return g
 
-    def get_right_side(self, left: Graph) -> Graph:
+    def get_right_side(self, left: MatchView) -> Graph:
         """
         Creates the right side of the production.
 
+        The whole left side is preserved, so nothing is inserted; the change
+        of Q is made in place by get_updates.
+
         Args:
-            left: Matched subgraph (with current coordinates)
+            left: View of the matched left side (with current coordinates)
 
         Returns:
-            Graph with same structure but Q hyperedge changed to r=1
+            Empty graph
         """
-        g = Graph()
+        return Graph()
 
-        nodes = []
-        for node in left.ordered_nodes:
-            if node.hyperref is None:
-                nodes.append(node)
-
-        for edge in left.hyperedges:
-            if edge.hypertag == "E":
-                g.add_edge(HyperEdge(edge.nodes, "E", r=edge.r), check_nodes=False)
+    def get_updates(self, left: MatchView) -> dict:
+        """
+        Sets r=1 on the matched Q hyperedge.
 
-        g.add_edge(HyperEdge(tuple(nodes), "Q", r=1), check_nodes=False)
+        Args:
+            left: View of the matched left side (with current coordinates)
 
-        return g
+        Returns:
+            Attribute changes by left-side label
+        """
+        return {"Q_n1_n2_n3_n4": {"r": 1}}
 
-    def filter_match(self, matched_graph: Graph) -> bool:
+    def filter_match(self, matched_graph: MatchView) -> bool:
         """Only match Q hyperedges with r=0."""
-        for edge in matched_graph.hyperedges:
-            if edge.hypertag == "Q" and edge.r != 0:
-                return False
-        return True
+        return matched_graph.get_hyperedge("Q_n1_n2_n3_n4").r == 0
@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
+from typing import Dict, FrozenSet, Optional
+from edge import HyperEdge
 from graph import Graph
+from matching import MatchPlan, MatchView
 
 
 class Production(ABC):
@@ -7,21 +10,80 @@ class Production(ABC):
     Abstract base class for graph grammar productions.
     
     Each production defines a left side (pattern to match)
-    and a right side (transformation result).
+    and a right side (transformation result). A production that only
+    changes attributes or keeps parts of the left side can declare them in
+    `preserved` and return the attribute changes from get_updates; those
+    elements are then updated in place instead of being re-inserted.
+
+    The left side is compiled once per class into a MatchPlan (see
+    compile), so it must not depend on the state of an instance. Matches
+    are passed to filter_match, get_right_side and get_updates as a
+    MatchView, addressed by left-side labels; it also answers the rest of
+    the Graph API by copying the match into a Graph on first use.
     """
     
     _registry: list = []
+    _instances: dict = {}
+
+    required_attributes: Dict[str, Dict[str, int]] = {}
+    """Attribute values left-side hyperedges must have, by hypertag (e.g. {"Q": {"r": 0}})."""
+
+    produces: Optional[FrozenSet[str]] = None
+    """Hypertags the right side adds or changes (None if unknown, i.e. any)."""
+
+    preserved: Optional[FrozenSet[str]] = None
+    """
+    Left-side labels the rewrite keeps in place (see get_updates). None means
+    all matched hyperedges are removed and the right side is inserted.
+    """
+
+    symmetric: bool = False
+    """
+    True if match_edge, filter_match, get_right_side and get_updates give the
+    same result for every automorphic variant of a match (the same graph
+    elements under permuted left-side labels). Only then does the matcher
+    enumerate a single variant per set of matched elements; otherwise every
+    variant is offered to the production's filter.
+    """
     
     @classmethod
     def register(cls, production_cls):
-        """Decorator for registering productions."""
+        """Decorator for registering productions (also compiles their match plan)."""
         cls._registry.append(production_cls)
+        production_cls.compile()
         return production_cls
     
     @classmethod
     def get_all_productions(cls):
-        """Returns all registered productions."""
-        return [p() for p in cls._registry]
+        """Returns all registered productions (one shared instance per class)."""
+        for p in cls._registry:
+            if p not in cls._instances:
+                cls._instances[p] = p()
+        return [cls._instances[p] for p in cls._registry]
+
+    @classmethod
+    def compile(cls) -> MatchPlan:
+        """
+        Returns the match plan of this production class.
+
+        The plan is built from get_left_side and required_attributes on the
+        first call and cached on the class, so it is shared by all instances
+        and all graphs.
+        """
+        plan = cls.__dict__.get("_plan")
+        if plan is None:
+            plan = MatchPlan.compile(cls().get_left_side(), cls.required_attributes)
+            unknown = set(cls.preserved or ()) - set(plan.labels)
+            if unknown:
+                raise ValueError(f"{cls.__name__} preserves labels missing from its left side: "
+                                 f"{', '.join(sorted(unknown))}")
+            cls._plan = plan
+        return plan
+
+    @property
+    def plan(self) -> MatchPlan:
+        """Cached match plan of the production's left side."""
+        return type(self).compile()
     
     @abstractmethod
     def get_left_side(self) -> Graph:
@@ -34,27 +96,62 @@ class Production(ABC):
         pass
     
     @abstractmethod
-    def get_right_side(self, left: Graph) -> Graph:
+    def get_right_side(self, left: MatchView) -> Graph:
         """
         Returns the right side of the production (transformation result).
 
         Args:
-            left: Matched subgraph from the left side (with current values)
+            left: View of the matched left side (with current values)
 
         Returns:
             Graph representing the transformation result
         """
         pass
 
-    def filter_match(self, matched_graph: Graph) -> bool:
+    def get_updates(self, left: MatchView) -> Dict[str, Dict[str, int]]:
+        """
+        Attribute changes of preserved left-side hyperedges.
+
+        Only used if the production declares `preserved`. The preserved
+        hyperedges are updated in place, the other matched hyperedges are
+        removed and get_right_side only has to return what is inserted.
+
+        Args:
+            left: View of the matched left side (with current values)
+
+        Returns:
+            New attribute values by left-side label (e.g. {"Q_n1_n2_n3_n4": {"r": 1}})
+        """
+        return {}
+
+    def match_edge(self, pattern_edge: HyperEdge, edge: HyperEdge) -> bool:
+        """
+        Attribute check for a single hyperedge, applied during the search.
+
+        Called whenever the matcher pairs a left-side hyperedge with a graph
+        hyperedge of the same hypertag, so candidates that can never pass
+        are pruned before a full match is built.
+
+        Args:
+            pattern_edge: Hyperedge from the left side
+            edge: Graph hyperedge it is paired with
+
+        Returns:
+            True if the pairing may be part of a match, False to reject it
+        """
+        return True
+
+    def filter_match(self, matched_graph: MatchView) -> bool:
         """
         Additional filter for matched subgraphs.
 
         Override this method to add custom filtering logic
-        beyond structural isomorphism.
+        beyond structural isomorphism. It runs for every candidate, so
+        prefer the MatchView lookups (get_hyperedge, get_node, hyperedges,
+        nodes) over other Graph methods, which copy the match.
 
         Args:
-            matched_graph: The matched subgraph
+            matched_graph: View of the matched left side
 
         Returns:
             True if the match should be accepted, False to reject
@@ -0,0 +1,84 @@
+"""
+Spatial index over node coordinates.
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+
+class GridIndex:
+    """
+    Uniform grid over 2D points.
+
+    Points are bucketed into square cells of side `cell_size`, so a lookup
+    around a position only inspects the few cells it overlaps. Insertion and
+    removal are O(1).
+    """
+
+    def __init__(self, cell_size: float = 1.0):
+        if cell_size <= 0:
+            raise ValueError("Cell size must be positive")
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], Dict[str, Tuple[float, float]]] = {}
+        self._size = 0
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, label: str, x: float, y: float) -> None:
+        """
+        Adds a point.
+
+        Inserting a label again into the same cell only updates its position;
+        a point in another cell must be removed first.
+        """
+        points = self._cells.setdefault(self._cell(x, y), {})
+        if label not in points:
+            self._size += 1
+        points[label] = (x, y)
+
+    def remove(self, label: str, x: float, y: float) -> None:
+        """Removes a point previously inserted at (x, y)."""
+        cell = self._cell(x, y)
+        points = self._cells.get(cell)
+        if points is None or label not in points:
+            return
+        del points[label]
+        self._size -= 1
+        if not points:
+            del self._cells[cell]
+
+    def nearest(self, x: float, y: float, tol: float) -> Optional[str]:
+        """Returns the label of the point closest to (x, y) within distance tol."""
+        best, best_dist = None, tol
+        for label, (px, py) in self._candidates(x - tol, y - tol, x + tol, y + tol):
+            dist = math.hypot(px - x, py - y)
+            if dist <= best_dist:
+                best, best_dist = label, dist
+        return best
+
+    def in_range(self, xmin: float, ymin: float, xmax: float, ymax: float) -> List[str]:
+        """Returns labels of all points inside the box (borders included)."""
+        return [
+            label for label, (px, py) in self._candidates(xmin, ymin, xmax, ymax)
+            if xmin <= px <= xmax and ymin <= py <= ymax
+        ]
+
+    def _candidates(self, xmin: float, ymin: float, xmax: float, ymax: float):
+        """Yields (label, point) for all points in cells overlapping the box."""
+        cx0, cy0 = self._cell(xmin, ymin)
+        cx1, cy1 = self._cell(xmax, ymax)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            # The box spans more cells than are occupied, scan occupied cells instead.
+            for (cx, cy), points in self._cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield from points.items()
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                points = self._cells.get((cx, cy))
+                if points:
+                    yield from points.items()
+
+    def __len__(self) -> int:
+        return self._size
@@ -0,0 +1,1009 @@
+"""
+Storage backends for the Graph class.
+
+A backend keeps the vertices and hyperedges of a graph and answers the
+structural queries used by Graph and the matchers (incidence, hypertag
+membership). Two backends are available:
+
+- "networkx": every hyperedge is a special vertex of a networkx graph,
+  connected to all vertices it connects (the original encoding).
+- "array": integer IDs, NumPy coordinate and attribute arrays and a
+  CSR-style incidence structure; Node and HyperEdge objects are created
+  only when they are requested.
+"""
+
+from collections.abc import KeysView, Mapping, Set
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from node import Node
+from edge import HyperEdge
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+
+def _centroids(edges: Iterable[HyperEdge]) -> np.ndarray:
+    """Centroids of several hyperedges as an (edges, 2) array, computed in one pass."""
+    edges = list(edges)
+    sizes = np.fromiter((len(edge.nodes) for edge in edges), dtype=np.int64, count=len(edges))
+    coords = np.fromiter((c for edge in edges for n in edge.nodes for c in (n.x, n.y)),
+                         dtype=np.float64, count=2 * int(sizes.sum())).reshape(-1, 2)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    return np.add.reduceat(coords, starts, axis=0) / sizes[:, None]
+
+
+def centroid(edge: HyperEdge) -> Node:
+    """Creates the special node representing a hyperedge (placed at its centroid)."""
+    center_x = sum(n.x for n in edge.nodes) / len(edge.nodes)
+    center_y = sum(n.y for n in edge.nodes) / len(edge.nodes)
+    return Node(center_x, center_y, edge.label, hyperref=edge)
+
+
+def _adjacent(store, label: str, tag: Optional[str], shared: int) -> List[str]:
+    """Hyperedges (with a hypertag) sharing at least `shared` vertices with a hyperedge."""
+    counts: Dict[str, int] = {}
+    for node_label in store.incident(label):
+        for other in store.incident_edges(node_label, tag):
+            if other != label:
+                counts[other] = counts.get(other, 0) + 1
+    return [other for other, count in counts.items() if count >= shared]
+
+
+class EdgeIndex:
+    """
+    Hyperedge labels by hypertag, by (hypertag, r) and by (hypertag, b).
+
+    Each of the three tables is built from the storage on its first query
+    and then kept up to date by the storage, so a graph pays (in memory and
+    on every change) only for the lookups that are actually used. Members
+    are kept as dict keys, so that queries can return live, read-only
+    KeysViews in insertion order.
+    """
+
+    def __init__(self, rows: Callable[[], Iterable[Tuple[str, str, int, int]]]):
+        """
+        Args:
+            rows: Returns (label, hypertag, r, b) of every live hyperedge
+        """
+        self._rows = rows
+        self._tables: List[Optional[Dict[tuple, Dict[str, None]]]] = [None, None, None]
+
+    @staticmethod
+    def _keys(tag: str, r: int, b: int) -> Tuple[tuple, tuple, tuple]:
+        return (tag,), (tag, r), (tag, b)
+
+    @property
+    def active(self) -> bool:
+        """True once a table was built (until then changes need not be reported)."""
+        return any(table is not None for table in self._tables)
+
+    def _table(self, kind: int) -> Dict[tuple, Dict[str, None]]:
+        table = self._tables[kind]
+        if table is None:
+            table = {}
+            for label, tag, r, b in self._rows():
+                table.setdefault(self._keys(tag, r, b)[kind], {})[label] = None
+            self._tables[kind] = table
+        return table
+
+    def add(self, label: str, tag: str, r: int, b: int) -> None:
+        for table, key in zip(self._tables, self._keys(tag, r, b)):
+            if table is not None:
+                table.setdefault(key, {})[label] = None
+
+    def discard(self, label: str, tag: str, r: int, b: int) -> None:
+        for table, key in zip(self._tables, self._keys(tag, r, b)):
+            if table is not None and key in table:
+                table[key].pop(label, None)
+
+    def members(self, tag: str, r: Optional[int] = None, b: Optional[int] = None) -> KeysView:
+        """
+        Labels of the hyperedges with a hypertag (and r and/or b values).
+
+        The result is a live view, except when both r and b are given: then
+        the smaller of the two tables is filtered into a new set of keys.
+        """
+        if r is not None and b is not None:
+            small, large = sorted((self.members(tag, r=r), self.members(tag, b=b)), key=len)
+            return {label: None for label in small if label in large}.keys()
+        kind, key = (1, (tag, r)) if r is not None else (2, (tag, b)) if b is not None else (0, (tag,))
+        table = self._table(kind)
+        members = table.get(key)
+        if members is None:
+            # Registered empty, so that the view sees hyperedges added later.
+            members = table[key] = {}
+        return members.keys()
+
+    def tags(self) -> List[str]:
+        """Hypertags with at least one hyperedge."""
+        return [key[0] for key, members in self._table(0).items() if members]
+
+
+class HyperEdgeSet(Set):
+    """
+    Read-only set of hyperedges over a view of their labels.
+
+    Iterating yields HyperEdge objects; `labels` is the underlying view of
+    labels. Membership accepts a HyperEdge or a label. Sets over EdgeIndex
+    queries are live: like a dict view, they follow changes of the graph
+    and must not be iterated while the graph changes.
+    """
+
+    __slots__ = ("labels", "_hyperedges")
+
+    def __init__(self, labels: KeysView, hyperedges: Mapping[str, HyperEdge]):
+        self.labels = labels
+        self._hyperedges = hyperedges
+
+    def __iter__(self) -> Iterator[HyperEdge]:
+        hyperedges = self._hyperedges
+        return (hyperedges[label] for label in self.labels)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __contains__(self, item) -> bool:
+        return (item.label if isinstance(item, HyperEdge) else item) in self.labels
+
+    def __repr__(self):
+        return f"HyperEdgeSet({list(self.labels)!r})"
+
+
+class NetworkxStorage:
+    """
+    Bipartite networkx encoding of a hypergraph.
+
+    Since networkx doesn't support hyperedges natively,
+    each hyperedge is converted to a special node connected
+    to all vertices that the hyperedge connects.
+
+    Incidence queries don't go through networkx: every vertex keeps its
+    own table of incident hyperedge labels and their hypertags. The
+    networkx graph itself (used by VF2 and drawing) is built from these
+    tables on first access and only then kept up to date, so graphs that
+    are never drawn or matched with VF2 don't import networkx at all.
+    """
+
+    name = "networkx"
+
+    def __init__(self):
+        self.nodes: Dict[str, Node] = {}
+        self.hyperedges: Dict[str, HyperEdge] = {}
+        self.index = EdgeIndex(self._index_rows)
+        self._node_edges: Dict[str, Dict[str, str]] = {}
+        self._vertices: Dict[str, Node] = {}
+        self._graph: Optional['nx.Graph'] = None
+
+    @property
+    def graph(self) -> 'nx.Graph':
+        """The networkx graph, built on first access."""
+        if self._graph is None:
+            import networkx as nx
+
+            graph = nx.Graph()
+            for label, node in self._vertices.items():
+                edge = self.hyperedges.get(label)
+                if edge is None:
+                    graph.add_node(label, node=node, is_hyper=False)
+                else:
+                    graph.add_node(label, node=node, is_hyper=True, hyperedge=edge)
+            graph.add_edges_from((label, edge) for label, edges in self._node_edges.items()
+                                 for edge in edges)
+            self._graph = graph
+        return self._graph
+
+    def add_vertex(self, label: str, node: Node, edge: Optional[HyperEdge] = None) -> None:
+        """Adds a vertex (or the vertex of a hyperedge) without connecting it."""
+        self._vertices[label] = node
+        if edge is None:
+            self.nodes[label] = node
+            self._node_edges.setdefault(label, {})
+            if self._graph is not None:
+                self._graph.add_node(label, node=node, is_hyper=False)
+        else:
+            self.hyperedges[label] = edge
+            edge._stores += 1
+            self.index.add(label, edge.hypertag, edge.r, edge.b)
+            if self._graph is not None:
+                self._graph.add_node(label, node=node, is_hyper=True, hyperedge=edge)
+
+    def add_node(self, node: Node) -> None:
+        self.add_vertex(node.label, node)
+
+    def add_edge(self, edge: HyperEdge) -> None:
+        hyper_label = edge.label
+        if hyper_label in self.hyperedges:
+            self.update_edge(hyper_label, edge.r, edge.b)
+            return
+        edge = edge._copy()
+        self.add_vertex(hyper_label, centroid(edge), edge)
+        for node in edge.nodes:
+            self._node_edges.setdefault(node.label, {})[hyper_label] = edge.hypertag
+        if self._graph is not None:
+            self._graph.add_edges_from((hyper_label, node.label) for node in edge.nodes)
+
+    def add_nodes(self, labels: Sequence[str], xy: np.ndarray) -> None:
+        nodes = [Node(x, y, label) for label, (x, y) in zip(labels, xy.tolist())]
+        self.nodes.update((node.label, node) for node in nodes)
+        self._vertices.update((node.label, node) for node in nodes)
+        for node in nodes:
+            self._node_edges.setdefault(node.label, {})
+        if self._graph is not None:
+            self._graph.add_nodes_from((node.label, {"node": node, "is_hyper": False})
+                                       for node in nodes)
+
+    def add_edges(self, edges: Iterable[HyperEdge]) -> None:
+        new: Dict[str, HyperEdge] = {}
+        for edge in edges:
+            if edge.label in self.hyperedges:
+                self.update_edge(edge.label, edge.r, edge.b)
+            elif edge.label in new:
+                new[edge.label]._write(edge.r, edge.b)
+            else:
+                new[edge.label] = edge._copy()
+        if not new:
+            return
+
+        centers = _centroids(new.values()).tolist()
+        self.hyperedges.update(new)
+        for edge in new.values():
+            edge._stores += 1
+        if self.index.active:
+            for label, edge in new.items():
+                self.index.add(label, edge.hypertag, edge.r, edge.b)
+        self._vertices.update((label, Node(x, y, label, hyperref=edge))
+                              for (label, edge), (x, y) in zip(new.items(), centers))
+        node_edges = self._node_edges
+        for label, edge in new.items():
+            for node in edge.nodes:
+                node_edges.setdefault(node.label, {})[label] = edge.hypertag
+        if self._graph is not None:
+            vertices = self._vertices
+            self._graph.add_nodes_from(
+                (label, {"node": vertices[label], "is_hyper": True, "hyperedge": edge})
+                for label, edge in new.items())
+            self._graph.add_edges_from(
+                (label, node.label) for label, edge in new.items() for node in edge.nodes)
+
+    def remove(self, label: str) -> Optional[tuple]:
+        """Removes a vertex or hyperedge and returns what restore needs to undo it."""
+        if label not in self._vertices:
+            return None
+        record = (label, self._vertices.pop(label), self.hyperedges.get(label), self.incident(label))
+        if label in self.nodes:
+            del self.nodes[label]
+            del self._node_edges[label]
+        if label in self.hyperedges:
+            edge = self.hyperedges.pop(label)
+            edge._stores -= 1
+            self.index.discard(label, edge.hypertag, edge.r, edge.b)
+            for node_label in record[3]:
+                del self._node_edges[node_label][label]
+        if self._graph is not None:
+            self._graph.remove_node(label)
+        return record
+
+    def restore(self, record: tuple) -> None:
+        """Undoes a remove (the elements added since must already be removed)."""
+        label, node, edge, neighbours = record
+        neighbours = [n for n in neighbours if n in self._vertices]
+        if edge is not None:
+            self.add_vertex(label, node, edge)
+            for n in neighbours:
+                self._node_edges[n][label] = edge.hypertag
+        else:
+            self.add_vertex(label, node)
+            self._node_edges[label].update((n, self.hyperedges[n].hypertag) for n in neighbours)
+        if self._graph is not None:
+            self._graph.add_edges_from((label, n) for n in neighbours)
+
+    def update_edge(self, label: str, r: Optional[int], b: Optional[int]) -> None:
+        edge = self.hyperedges[label]
+        self.index.discard(label, edge.hypertag, edge.r, edge.b)
+        edge._write(r, b)
+        self.index.add(label, edge.hypertag, edge.r, edge.b)
+
+    def _index_rows(self) -> Iterator[Tuple[str, str, int, int]]:
+        return ((label, e.hypertag, e.r, e.b) for label, e in self.hyperedges.items())
+
+    def has(self, label: str) -> bool:
+        return label in self._vertices
+
+    def incident(self, label: str) -> List[str]:
+        """Labels of hyperedges incident to a node (or of nodes of a hyperedge)."""
+        edges = self._node_edges.get(label)
+        if edges is not None:
+            return list(edges)
+        edge = self.hyperedges.get(label)
+        if edge is None:
+            raise KeyError(label)
+        node_edges = self._node_edges
+        return [n.label for n in edge.nodes if label in node_edges.get(n.label, ())]
+
+    def incident_edges(self, label: str, tag: Optional[str] = None) -> List[str]:
+        """Labels of the hyperedges (with a hypertag) incident to a node."""
+        edges = self._node_edges[label]
+        if tag is None:
+            return list(edges)
+        return [edge for edge, edge_tag in edges.items() if edge_tag == tag]
+
+    def adjacent_edges(self, label: str, tag: Optional[str] = None, shared: int = 1) -> List[str]:
+        """Labels of the hyperedges (with a hypertag) sharing at least `shared` vertices with one."""
+        return _adjacent(self, label, tag, shared)
+
+    def edge_tag(self, label: str) -> Optional[str]:
+        edge = self.hyperedges.get(label)
+        return edge.hypertag if edge is not None else None
+
+    def edge_node_labels(self, label: str) -> List[str]:
+        return [n.label for n in self.hyperedges[label].nodes]
+
+    def edge_attr(self, label: str, name: str) -> int:
+        return getattr(self.hyperedges[label], name)
+
+    def tag_members(self, tag: str) -> List[str]:
+        return list(self.index.members(tag))
+
+    def tag_count(self, tag: str) -> int:
+        return len(self.index.members(tag))
+
+    def tags(self) -> List[str]:
+        return self.index.tags()
+
+    def node_xy(self) -> np.ndarray:
+        """Coordinates of all vertices as an (n, 2) array, in the order of `nodes`."""
+        return np.array([(n.x, n.y) for n in self.nodes.values()], dtype=np.float64).reshape(-1, 2)
+
+    def tag_geometry(self, tag: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vertex coordinates of all hyperedges with a hypertag (used for drawing).
+
+        Returns:
+            CSR offsets, (k, 2) coordinates of the vertices in hyperedge order
+            and the r values of the hyperedges (listed as by tag_members)
+        """
+        edges = [self.hyperedges[label] for label in self.index.members(tag)]
+        offsets = np.zeros(len(edges) + 1, dtype=np.int64)
+        np.cumsum([len(edge.nodes) for edge in edges], out=offsets[1:])
+        xy = np.array([(n.x, n.y) for edge in edges for n in edge.nodes], dtype=np.float64)
+        return offsets, xy.reshape(-1, 2), np.array([edge.r for edge in edges], dtype=np.int8)
+
+    def tag_incidence(self, tag: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vertices of all hyperedges with a hypertag (used for export).
+
+        Returns:
+            CSR offsets and the positions of the vertices in `nodes` (-1 for
+            removed vertices), in hyperedge order (listed as by tag_members)
+        """
+        edges = [self.hyperedges[label] for label in self.index.members(tag)]
+        offsets = np.zeros(len(edges) + 1, dtype=np.int64)
+        np.cumsum([len(edge.nodes) for edge in edges], out=offsets[1:])
+        position = dict(zip(self.nodes, range(len(self.nodes))))
+        vertices = (position.get(n.label, -1) for edge in edges for n in edge.nodes)
+        return offsets, np.fromiter(vertices, dtype=np.int64, count=offsets[-1])
+
+    def ordered_nodes(self) -> List[Node]:
+        return list(self._vertices.values())
+
+    def to_networkx(self) -> 'nx.Graph':
+        return self.graph
+
+
+class _NodeView(Mapping):
+    """Read-only label -> Node mapping over an ArrayStorage."""
+
+    def __init__(self, storage: 'ArrayStorage'):
+        self._storage = storage
+
+    def __getitem__(self, label: str) -> Node:
+        node = self._storage.node(label)
+        if node is None:
+            raise KeyError(label)
+        return node
+
+    def __contains__(self, label) -> bool:
+        return self._storage.node_id(label) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        storage = self._storage
+        for i in np.flatnonzero(storage._node_alive[:storage._n_nodes]).tolist():
+            yield storage._node_labels[i]
+
+    def __len__(self) -> int:
+        return self._storage._alive_nodes
+
+
+class _HyperEdgeView(Mapping):
+    """Read-only label -> HyperEdge mapping over an ArrayStorage."""
+
+    def __init__(self, storage: 'ArrayStorage'):
+        self._storage = storage
+
+    def __getitem__(self, label: str) -> HyperEdge:
+        edge = self._storage.hyperedge(label)
+        if edge is None:
+            raise KeyError(label)
+        return edge
+
+    def __contains__(self, label) -> bool:
+        return self._storage.edge_id(label) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        storage = self._storage
+        for i in np.flatnonzero(storage._edge_alive[:storage._n_edges]).tolist():
+            yield storage._edge_labels[i]
+
+    def __len__(self) -> int:
+        return self._storage._alive_edges
+
+
+class ArrayStorage:
+    """
+    Compact array-backed hypergraph.
+
+    Vertices and hyperedges get consecutive integer IDs. Coordinates live in
+    one float array, hyperedge tags are small integer codes and the r and b
+    attributes are int8 columns. The vertices of hyperedge i are
+    indices[offsets[i]:offsets[i + 1]] (CSR layout). The reverse incidence
+    (hyperedges of a vertex) is kept as a CSR snapshot plus a small list of
+    hyperedges added since, and is rebuilt with NumPy when that list grows.
+
+    Removed elements are only marked dead, IDs are never reused.
+    """
+
+    name = "array"
+
+    def __init__(self, capacity: int = 64):
+        self._node_labels: List[str] = []
+        self._node_ids: Dict[str, int] = {}
+        self._xy = np.empty((capacity, 2), dtype=np.float64)
+        self._node_alive = np.zeros(capacity, dtype=bool)
+        self._n_nodes = 0
+        self._alive_nodes = 0
+
+        self._tags: List[str] = []
+        self._tag_codes: Dict[str, int] = {}
+        self._edge_labels: List[str] = []
+        self._edge_ids: Dict[str, int] = {}
+        self._edge_tag = np.empty(capacity, dtype=np.int16)
+        self._edge_r = np.empty(capacity, dtype=np.int8)
+        self._edge_b = np.empty(capacity, dtype=np.int8)
+        self._edge_alive = np.zeros(capacity, dtype=bool)
+        self._offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self._indices = np.empty(capacity * 4, dtype=np.int32)
+        self._n_edges = 0
+        self._alive_edges = 0
+
+        self._rev_offsets = np.zeros(1, dtype=np.int64)
+        self._rev_indices = np.empty(0, dtype=np.int32)
+        self._rev_extra: Dict[int, List[int]] = {}
+        self._rev_extra_size = 0
+
+        self.index = EdgeIndex(self._index_rows)
+        self.nodes = _NodeView(self)
+        self.hyperedges = _HyperEdgeView(self)
+
+    @staticmethod
+    def _grown(array: np.ndarray, size: int) -> np.ndarray:
+        """Returns the array, or a copy at least twice as long if it's too short."""
+        if size <= len(array):
+            return array
+        new = np.empty((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+        new[:len(array)] = array
+        if new.dtype == bool:
+            new[len(array):] = False
+        return new
+
+    def node_id(self, label: str) -> Optional[int]:
+        i = self._node_ids.get(label)
+        return i if i is not None and self._node_alive[i] else None
+
+    def edge_id(self, label: str) -> Optional[int]:
+        i = self._edge_ids.get(label)
+        return i if i is not None and self._edge_alive[i] else None
+
+    def add_node(self, node: Node) -> None:
+        i = self.node_id(node.label)
+        if i is None:
+            i = self._n_nodes
+            self._n_nodes += 1
+            self._xy = self._grown(self._xy, self._n_nodes)
+            self._node_alive = self._grown(self._node_alive, self._n_nodes)
+            self._node_labels.append(node.label)
+            self._node_ids[node.label] = i
+            self._node_alive[i] = True
+            self._alive_nodes += 1
+        self._xy[i] = (node.x, node.y)
+
+    def add_edge(self, edge: HyperEdge) -> None:
+        label = edge.label
+        if self.edge_id(label) is not None:
+            self.update_edge(label, edge.r, edge.b)
+            return
+
+        code = self._tag_codes.get(edge.hypertag)
+        if code is None:
+            code = self._tag_codes[edge.hypertag] = len(self._tags)
+            self._tags.append(edge.hypertag)
+
+        i = self._n_edges
+        self._n_edges += 1
+        for name in ("_edge_tag", "_edge_r", "_edge_b", "_edge_alive"):
+            setattr(self, name, self._grown(getattr(self, name), self._n_edges))
+        self._offsets = self._grown(self._offsets, self._n_edges + 1)
+
+        start = self._offsets[i]
+        end = start + len(edge.nodes)
+        self._indices = self._grown(self._indices, end)
+        members = [self._node_ids[n.label] for n in edge.nodes]
+        self._indices[start:end] = members
+        self._offsets[i + 1] = end
+
+        self._edge_tag[i] = code
+        self._edge_r[i] = edge.r
+        self._edge_b[i] = edge.b
+        self._edge_alive[i] = True
+        self._edge_labels.append(label)
+        self._edge_ids[label] = i
+        self._alive_edges += 1
+        self.index.add(label, edge.hypertag, edge.r, edge.b)
+
+        for n in members:
+            self._rev_extra.setdefault(n, []).append(i)
+        self._rev_extra_size += len(members)
+
+    def add_nodes(self, labels: Sequence[str], xy: np.ndarray) -> None:
+        ids = np.empty(len(labels), dtype=np.int64)
+        first = self._n_nodes
+        for k, label in enumerate(labels):
+            i = self._node_ids.get(label)
+            if i is None:
+                i = self._node_ids[label] = self._n_nodes
+                self._node_labels.append(label)
+                self._n_nodes += 1
+            ids[k] = i
+        self._xy = self._grown(self._xy, self._n_nodes)
+        self._node_alive = self._grown(self._node_alive, self._n_nodes)
+        self._node_alive[first:self._n_nodes] = True
+        self._alive_nodes += self._n_nodes - first
+        self._xy[ids] = xy
+
+    def add_edges(self, edges: Iterable[HyperEdge]) -> None:
+        new: Dict[str, HyperEdge] = {}
+        for edge in edges:
+            if self.edge_id(edge.label) is not None:
+                self.update_edge(edge.label, edge.r, edge.b)
+            else:
+                new[edge.label] = edge
+        if not new:
+            return
+
+        for edge in new.values():
+            if edge.hypertag not in self._tag_codes:
+                self._tag_codes[edge.hypertag] = len(self._tags)
+                self._tags.append(edge.hypertag)
+
+        first, count = self._n_edges, len(new)
+        self._n_edges += count
+        for name in ("_edge_tag", "_edge_r", "_edge_b", "_edge_alive"):
+            setattr(self, name, self._grown(getattr(self, name), self._n_edges))
+        self._offsets = self._grown(self._offsets, self._n_edges + 1)
+
+        edges = list(new.values())
+        sizes = np.fromiter((len(edge.nodes) for edge in edges), dtype=np.int64, count=count)
+        start = self._offsets[first]
+        self._offsets[first + 1:self._n_edges + 1] = start + np.cumsum(sizes)
+        end = self._offsets[self._n_edges]
+        ids = self._node_ids
+        self._indices = self._grown(self._indices, end)
+        self._indices[start:end] = np.fromiter(
+            (ids[n.label] for edge in edges for n in edge.nodes), dtype=np.int32, count=end - start)
+
+        codes = self._tag_codes
+        self._edge_tag[first:self._n_edges] = [codes[edge.hypertag] for edge in edges]
+        self._edge_r[first:self._n_edges] = [edge.r for edge in edges]
+        self._edge_b[first:self._n_edges] = [edge.b for edge in edges]
+        self._edge_alive[first:self._n_edges] = True
+        self._edge_labels.extend(new)
+        self._edge_ids.update(zip(new, range(first, self._n_edges)))
+        self._alive_edges += count
+        if self.index.active:
+            for label, edge in new.items():
+                self.index.add(label, edge.hypertag, edge.r, edge.b)
+
+        members = self._indices[start:end]
+        if self._rev_extra_size + len(members) > max(1024, len(self._rev_indices) // 4):
+            self._rebuild_reverse()
+        else:
+            edge_of = np.repeat(np.arange(first, self._n_edges), sizes)
+            for n, i in zip(members.tolist(), edge_of.tolist()):
+                self._rev_extra.setdefault(n, []).append(i)
+            self._rev_extra_size += len(members)
+
+    def remove(self, label: str) -> Optional[tuple]:
+        """Removes a vertex or hyperedge and returns what restore needs to undo it."""
+        i = self.node_id(label)
+        if i is not None:
+            self._node_alive[i] = False
+            self._alive_nodes -= 1
+            del self._node_ids[label]
+            return False, label, i
+        i = self.edge_id(label)
+        if i is not None:
+            self._edge_alive[i] = False
+            self._alive_edges -= 1
+            del self._edge_ids[label]
+            self.index.discard(label, *self._edge_row(i))
+            return True, label, i
+        return None
+
+    def restore(self, record: tuple) -> None:
+        """Undoes a remove (the elements added since must already be removed)."""
+        is_edge, label, i = record
+        if not is_edge:
+            self._node_alive[i] = True
+            self._alive_nodes += 1
+            self._node_ids[label] = i
+            return
+        self._edge_alive[i] = True
+        self._alive_edges += 1
+        self._edge_ids[label] = i
+        self.index.add(label, *self._edge_row(i))
+        # A rebuild of the reverse incidence drops dead hyperedges, add it back if needed.
+        members = self._members(i)
+        n = members[0]
+        known = self._rev_extra.get(n, [])
+        if n + 1 < len(self._rev_offsets):
+            known = known + self._rev_indices[self._rev_offsets[n]:self._rev_offsets[n + 1]].tolist()
+        if i not in known:
+            for n in members:
+                self._rev_extra.setdefault(n, []).append(i)
+            self._rev_extra_size += len(members)
+
+    def update_edge(self, label: str, r: Optional[int], b: Optional[int]) -> None:
+        i = self._edge_ids[label]
+        self.index.discard(label, *self._edge_row(i))
+        if r is not None:
+            self._edge_r[i] = r
+        if b is not None:
+            self._edge_b[i] = b
+        self.index.add(label, *self._edge_row(i))
+
+    def _edge_row(self, i: int) -> Tuple[str, int, int]:
+        """Hypertag, r and b of hyperedge i."""
+        return self._tags[self._edge_tag[i]], int(self._edge_r[i]), int(self._edge_b[i])
+
+    def _index_rows(self) -> Iterator[Tuple[str, str, int, int]]:
+        n = self._n_edges
+        ids = np.flatnonzero(self._edge_alive[:n])
+        labels, tags = self._edge_labels, self._tags
+        for i, code, r, b in zip(ids.tolist(), self._edge_tag[ids].tolist(),
+                                 self._edge_r[ids].tolist(), self._edge_b[ids].tolist()):
+            yield labels[i], tags[code], r, b
+
+    def has(self, label: str) -> bool:
+        return self.node_id(label) is not None or self.edge_id(label) is not None
+
+    def _members(self, i: int) -> List[int]:
+        return self._indices[self._offsets[i]:self._offsets[i + 1]].tolist()
+
+    def _rebuild_reverse(self) -> None:
+        """Rebuilds the vertex -> hyperedges CSR snapshot from the live hyperedges."""
+        n = self._n_edges
+        self._rev_offsets, self._rev_indices = _reverse_csr(
+            self._offsets[:n + 1], self._indices, self._edge_alive[:n], self._n_nodes)
+        self._rev_extra = {}
+        self._rev_extra_size = 0
+
+    def _incident_ids(self, n: int) -> List[int]:
+        if self._rev_extra_size > max(1024, len(self._rev_indices) // 4):
+            self._rebuild_reverse()
+        result = []
+        if n + 1 < len(self._rev_offsets):
+            result = self._rev_indices[self._rev_offsets[n]:self._rev_offsets[n + 1]].tolist()
+        result.extend(self._rev_extra.get(n, ()))
+        alive = self._edge_alive
+        return [e for e in result if alive[e]]
+
+    def incident(self, label: str) -> List[str]:
+        """Labels of hyperedges incident to a node (or of nodes of a hyperedge)."""
+        n = self.node_id(label)
+        if n is not None:
+            return [self._edge_labels[e] for e in self._incident_ids(n)]
+        i = self.edge_id(label)
+        if i is None:
+            raise KeyError(label)
+        alive = self._node_alive
+        return [self._node_labels[n] for n in self._members(i) if alive[n]]
+
+    def incident_edges(self, label: str, tag: Optional[str] = None) -> List[str]:
+        """Labels of the hyperedges (with a hypertag) incident to a node."""
+        n = self.node_id(label)
+        if n is None:
+            raise KeyError(label)
+        edges = self._incident_ids(n)
+        if tag is not None:
+            code = self._tag_codes.get(tag)
+            edges = [e for e, t in zip(edges, self._edge_tag[edges].tolist()) if t == code]
+        labels = self._edge_labels
+        return [labels[e] for e in edges]
+
+    def adjacent_edges(self, label: str, tag: Optional[str] = None, shared: int = 1) -> List[str]:
+        """Labels of the hyperedges (with a hypertag) sharing at least `shared` vertices with one."""
+        i = self.edge_id(label)
+        if i is None:
+            raise KeyError(label)
+        alive = self._node_alive
+        edges = [e for n in self._members(i) if alive[n] for e in self._incident_ids(n) if e != i]
+        if tag is not None:
+            code = self._tag_codes.get(tag)
+            edges = [e for e, t in zip(edges, self._edge_tag[edges].tolist()) if t == code]
+        counts: Dict[int, int] = {}
+        for e in edges:
+            counts[e] = counts.get(e, 0) + 1
+        return [self._edge_labels[e] for e, count in counts.items() if count >= shared]
+
+    def edge_tag(self, label: str) -> Optional[str]:
+        i = self.edge_id(label)
+        return self._tags[self._edge_tag[i]] if i is not None else None
+
+    def edge_node_labels(self, label: str) -> List[str]:
+        return [self._node_labels[n] for n in self._members(self._edge_ids[label])]
+
+    def edge_attr(self, label: str, name: str) -> int:
+        column = self._edge_r if name == "r" else self._edge_b
+        return int(column[self._edge_ids[label]])
+
+    def tag_members(self, tag: str) -> List[str]:
+        return list(self.index.members(tag))
+
+    def tag_count(self, tag: str) -> int:
+        return len(self.index.members(tag))
+
+    def tags(self) -> List[str]:
+        return self.index.tags()
+
+    def node_xy(self) -> np.ndarray:
+        return self._xy[:self._n_nodes][self._node_alive[:self._n_nodes]]
+
+    def _gather(self, edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """CSR offsets and vertex IDs of the given hyperedges, renumbered from 0."""
+        starts = self._offsets[edges]
+        counts = self._offsets[edges + 1] - starts
+        offsets = np.zeros(len(edges) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        members = self._indices[np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])]
+        return offsets, members
+
+    def _tag_edges(self, tag: str) -> np.ndarray:
+        """IDs of the hyperedges with a hypertag, listed as by tag_members."""
+        members = self.index.members(tag)
+        return np.fromiter(map(self._edge_ids.__getitem__, members), dtype=np.int64,
+                           count=len(members))
+
+    def tag_geometry(self, tag: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        edges = self._tag_edges(tag)
+        offsets, members = self._gather(edges)
+        return offsets, self._xy[members], self._edge_r[edges]
+
+    def tag_incidence(self, tag: str) -> Tuple[np.ndarray, np.ndarray]:
+        offsets, members = self._gather(self._tag_edges(tag))
+        alive = self._node_alive[:self._n_nodes]
+        position = np.cumsum(alive) - 1
+        position[~alive] = -1
+        return offsets, position[members]
+
+    def _make_node(self, n: int) -> Node:
+        x, y = self._xy[n].tolist()
+        return Node(x, y, self._node_labels[n])
+
+    def node(self, label: str) -> Optional[Node]:
+        n = self.node_id(label)
+        return self._make_node(n) if n is not None else None
+
+    def _make_edge(self, i: int) -> HyperEdge:
+        nodes = tuple(self._make_node(n) for n in self._members(i))
+        edge = HyperEdge(nodes, self._tags[self._edge_tag[i]],
+                         r=int(self._edge_r[i]), b=int(self._edge_b[i]))
+        edge._stores = 1
+        return edge
+
+    def hyperedge(self, label: str) -> Optional[HyperEdge]:
+        i = self.edge_id(label)
+        return self._make_edge(i) if i is not None else None
+
+    def ordered_nodes(self) -> List[Node]:
+        result = [self.nodes[label] for label in self.nodes]
+        result.extend(centroid(self.hyperedges[label]) for label in self.hyperedges)
+        return result
+
+    def columns(self) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """
+        Returns the storage as compact arrays (used by persistence.py).
+
+        Removed hyperedges are dropped and the remaining elements are
+        renumbered consecutively. Removed vertices are dropped too, unless a
+        live hyperedge still refers to them.
+
+        Returns:
+            Hypertags (indexed by the codes in "edge_tag") and the columns
+        """
+        n = self._n_nodes
+        edges = np.flatnonzero(self._edge_alive[:self._n_edges])
+        offsets, members = self._gather(edges)
+
+        keep = self._node_alive[:n].copy()
+        keep[members] = True
+        nodes = np.flatnonzero(keep)
+        remap = np.full(n, -1, dtype=np.int32)
+        remap[nodes] = np.arange(len(nodes), dtype=np.int32)
+        indices = remap[members]
+        rev_offsets, rev_indices = _reverse_csr(
+            offsets, indices, np.ones(len(edges), dtype=bool), len(nodes))
+
+        return list(self._tags), {
+            "xy": self._xy[nodes],
+            "node_alive": self._node_alive[nodes],
+            "node_labels": _pack_labels([self._node_labels[i] for i in nodes.tolist()]),
+            "edge_tag": self._edge_tag[edges],
+            "edge_r": self._edge_r[edges],
+            "edge_b": self._edge_b[edges],
+            "edge_labels": _pack_labels([self._edge_labels[i] for i in edges.tolist()]),
+            "offsets": offsets,
+            "indices": indices,
+            "rev_offsets": rev_offsets,
+            "rev_indices": rev_indices,
+        }
+
+    @classmethod
+    def from_columns(cls, tags: List[str], columns: Mapping) -> 'ArrayStorage':
+        """
+        Creates a storage over arrays returned by columns().
+
+        The arrays are used as they are (they may be memory-mapped). Labels
+        are decoded and indexed only when they are first needed.
+        """
+        store = cls(capacity=0)
+        store._tags = list(tags)
+        store._tag_codes = {tag: code for code, tag in enumerate(tags)}
+
+        store._xy = columns["xy"]
+        store._node_alive = columns["node_alive"]
+        store._n_nodes = len(store._xy)
+        store._alive_nodes = int(np.count_nonzero(store._node_alive))
+
+        store._edge_tag = columns["edge_tag"]
+        store._edge_r = columns["edge_r"]
+        store._edge_b = columns["edge_b"]
+        store._n_edges = store._alive_edges = len(store._edge_tag)
+        store._edge_alive = np.ones(store._n_edges, dtype=bool)
+        store._offsets = columns["offsets"]
+        store._indices = columns["indices"]
+        store._rev_offsets = columns["rev_offsets"]
+        store._rev_indices = columns["rev_indices"]
+
+        store._packed_labels = (columns["node_labels"], columns["edge_labels"])
+        for name in _LAZY_LABELS:
+            delattr(store, name)
+        return store
+
+    @classmethod
+    def from_arrays(cls, node_labels: List[str], xy: np.ndarray, tags: List[str],
+                    edge_tag: np.ndarray, offsets: np.ndarray, indices: np.ndarray,
+                    edge_labels: List[str], r: Optional[np.ndarray] = None,
+                    b: Optional[np.ndarray] = None) -> 'ArrayStorage':
+        """
+        Creates a storage from plain arrays, without per-element checks.
+
+        Args:
+            node_labels: Vertex labels
+            xy: Vertex coordinates, shape (vertices, 2)
+            tags: Hypertags indexed by the codes in edge_tag
+            edge_tag: Hypertag code of every hyperedge
+            offsets: CSR offsets, the vertices of hyperedge i are
+                indices[offsets[i]:offsets[i + 1]]
+            indices: Vertex numbers (positions in node_labels)
+            edge_labels: Canonical hyperedge labels (see edge.edge_label)
+            r: Optional r column (zeros by default)
+            b: Optional b column (ones by default)
+        """
+        n, m = len(node_labels), len(edge_labels)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int32)
+        rev_offsets, rev_indices = _reverse_csr(offsets, indices, np.ones(m, dtype=bool), n)
+        return cls.from_columns(tags, {
+            "xy": np.asarray(xy, dtype=np.float64).reshape(n, 2),
+            "node_alive": np.ones(n, dtype=bool),
+            "node_labels": _pack_labels(node_labels),
+            "edge_tag": np.asarray(edge_tag, dtype=np.int16),
+            "edge_r": np.zeros(m, dtype=np.int8) if r is None else np.asarray(r, dtype=np.int8),
+            "edge_b": np.ones(m, dtype=np.int8) if b is None else np.asarray(b, dtype=np.int8),
+            "edge_labels": _pack_labels(edge_labels),
+            "offsets": offsets,
+            "indices": indices,
+            "rev_offsets": rev_offsets,
+            "rev_indices": rev_indices,
+        })
+
+    def __getattr__(self, name: str):
+        # Only called for missing attributes: the labels of a storage created
+        # by from_columns are decoded on first use.
+        if name in _LAZY_LABELS and "_packed_labels" in self.__dict__:
+            self._decode_labels()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def _decode_labels(self) -> None:
+        node_labels, edge_labels = self.__dict__.pop("_packed_labels")
+        self._node_labels = _unpack_labels(node_labels, self._n_nodes)
+        alive = self._node_alive[:self._n_nodes]
+        if alive.all():
+            self._node_ids = dict(zip(self._node_labels, range(self._n_nodes)))
+        else:
+            # A removed vertex kept for its hyperedges may share the label of
+            # a live one, so only live vertices are indexed.
+            ids = np.flatnonzero(alive).tolist()
+            self._node_ids = dict(zip([self._node_labels[i] for i in ids], ids))
+        self._edge_labels = _unpack_labels(edge_labels, self._n_edges)
+        self._edge_ids = dict(zip(self._edge_labels, range(self._n_edges)))
+
+    def to_networkx(self) -> 'nx.Graph':
+        """Builds the bipartite networkx encoding (used by VF2 and drawing)."""
+        import networkx as nx
+
+        graph = nx.Graph()
+        for label in self.nodes:
+            graph.add_node(label, node=self.nodes[label], is_hyper=False)
+        for label in self.hyperedges:
+            edge = self.hyperedges[label]
+            graph.add_node(label, node=centroid(edge), is_hyper=True, hyperedge=edge)
+            for node_label in self.incident(label):
+                graph.add_edge(label, node_label)
+        return graph
+
+
+_LAZY_LABELS = ("_node_labels", "_node_ids", "_edge_labels", "_edge_ids")
+
+
+def _reverse_csr(offsets: np.ndarray, indices: np.ndarray, alive: np.ndarray,
+                 n_nodes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Builds the vertex -> hyperedges CSR arrays from the hyperedge -> vertices ones."""
+    edge_of = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+    members = indices[:offsets[-1]]
+    keep = alive[edge_of]
+    edge_of, members = edge_of[keep], members[keep]
+
+    order = np.argsort(members, kind="stable")
+    counts = np.bincount(members, minlength=n_nodes)
+    return np.concatenate(([0], np.cumsum(counts))), edge_of[order]
+
+
+def _pack_labels(labels: List[str]) -> np.ndarray:
+    """Encodes labels as one NUL-separated UTF-8 byte array."""
+    joined = "\0".join(labels)
+    if joined.count("\0") != max(len(labels) - 1, 0):
+        raise ValueError("Labels must not contain NUL characters")
+    return np.frombuffer(joined.encode(), dtype=np.uint8)
+
+
+def _unpack_labels(packed: np.ndarray, count: int) -> List[str]:
+    """Inverse of _pack_labels."""
+    if count == 0:
+        return []
+    return packed.tobytes().decode().split("\0")
+
+
+BACKENDS = {
+    NetworkxStorage.name: NetworkxStorage,
+    ArrayStorage.name: ArrayStorage,
+}
+
+
+def create_storage(backend: str):
+    """Creates an empty storage backend by name ("networkx" or "array")."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown graph backend: {backend}")
+    return BACKENDS[backend]()
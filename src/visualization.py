@@ -1,22 +1,167 @@
 """
 Module for graph visualization.
+
+Two renderers are available. The "networkx" one draws the bipartite
+encoding with nx.draw: every vertex and hyperedge is a labelled circle,
+which is readable for small graphs only. The "fast" one draws the mesh
+itself: hyperedges with two vertices (E) as one LineCollection, larger
+hyperedges (Q) as one PolyCollection coloured by r, vertices as points,
+and labels only while the drawing is small. Its cost is linear in the
+number of elements, with the geometry gathered by the storage backend in
+bulk.
+
+matplotlib (and networkx, for the "networkx" renderer) is imported on the
+first drawing, so importing this module costs no more than importing graph.
 """
 
-import matplotlib
-matplotlib.use('Agg')  
-import matplotlib.pyplot as plt
-import networkx as nx
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
 from graph import Graph
 
+BBox = Tuple[float, float, float, float]
+
+LABEL_THRESHOLD = 200
+"""Drawings with more visible elements are rendered without labels ("auto" mode: with "fast")."""
+
+R_COLORS = np.array(["#dbe9f6", "#f4a261"])
+"""Face colours of polygon hyperedges with r=0 and r=1."""
 
-def draw(graph: Graph, filename: str) -> None:
+
+def draw(graph: Graph, filename: str, mode: str = "auto", bbox: Optional[BBox] = None,
+         label_threshold: int = LABEL_THRESHOLD) -> None:
     """
     Draws the graph and saves it to a file.
     
     Args:
         graph: Graph to draw
         filename: Path to output file (e.g., "draw/test1.png")
+        mode: "networkx", "fast", or "auto" (networkx for graphs with at
+            most label_threshold nodes and hyperedges, fast otherwise)
+        bbox: Optional viewport (xmin, ymin, xmax, ymax); only elements
+            overlapping it are drawn
+        label_threshold: Maximum number of visible elements drawn with labels
     """
+    if mode == "auto":
+        count = graph.count_nodes()
+        mode = "networkx" if count.normal + count.hyper <= label_threshold else "fast"
+    if mode == "networkx":
+        _draw_networkx(graph, filename, bbox)
+    elif mode == "fast":
+        _draw_fast(graph, filename, bbox, label_threshold)
+    else:
+        raise ValueError(f"Unknown drawing mode: {mode}")
+    print(f"Saved graph to: {filename}")
+
+
+@lru_cache(maxsize=None)
+def _pyplot():
+    """Imports matplotlib.pyplot with the non-interactive Agg backend (once)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _inside(x: float, y: float, bbox: Optional[BBox]) -> bool:
+    return bbox is None or (bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3])
+
+
+def _overlaps(lo: np.ndarray, hi: np.ndarray, bbox: BBox) -> np.ndarray:
+    """Mask of bounding boxes (lower and upper corners, (n, 2) each) overlapping a viewport."""
+    xmin, ymin, xmax, ymax = bbox
+    return (hi[:, 0] >= xmin) & (lo[:, 0] <= xmax) & (hi[:, 1] >= ymin) & (lo[:, 1] <= ymax)
+
+
+def _shapes(offsets: np.ndarray, xy: np.ndarray, bbox: Optional[BBox]):
+    """
+    Splits CSR vertex coordinates into one vertex array per hyperedge.
+
+    Returns:
+        Shapes (an (n, k, 2) array if all hyperedges have k vertices, a
+        list of arrays otherwise) and the mask of the hyperedges kept
+    """
+    sizes = np.diff(offsets)
+    keep = np.ones(len(sizes), dtype=bool)
+    if bbox is not None and len(sizes):
+        starts = offsets[:-1]
+        keep = _overlaps(np.minimum.reduceat(xy, starts), np.maximum.reduceat(xy, starts), bbox)
+    if len(sizes) and np.all(sizes == sizes[0]):
+        return xy.reshape(len(sizes), int(sizes[0]), 2)[keep], keep
+    shapes = np.split(xy, offsets[1:-1])
+    return [shape for shape, kept in zip(shapes, keep.tolist()) if kept], keep
+
+
+def _draw_fast(graph: Graph, filename: str, bbox: Optional[BBox], label_threshold: int) -> None:
+    """Draws the mesh with one matplotlib collection per hypertag."""
+    from matplotlib.collections import LineCollection, PolyCollection
+
+    plt = _pyplot()
+    store = graph._store
+    fig, ax = plt.subplots(figsize=(10, 10))
+
+    visible = 0
+    for tag in sorted(store.tags()):
+        offsets, xy, r = store.tag_geometry(tag)
+        shapes, keep = _shapes(offsets, xy, bbox)
+        visible += len(shapes)
+        if not len(shapes):
+            continue
+        if len(shapes[0]) == 2 and all(len(shape) == 2 for shape in shapes):
+            ax.add_collection(LineCollection(shapes, colors="gray", linewidths=0.8, zorder=2))
+        else:
+            colors = R_COLORS[np.clip(r[keep], 0, len(R_COLORS) - 1)]
+            ax.add_collection(PolyCollection(shapes, facecolors=colors, edgecolors="none",
+                                             zorder=1))
+
+    points = store.node_xy()
+    if bbox is not None:
+        points = points[_overlaps(points, points, bbox)]
+    visible += len(points)
+    ax.scatter(points[:, 0], points[:, 1], s=12 if len(points) <= label_threshold else 1,
+               c="steelblue", zorder=3)
+
+    if visible <= label_threshold:
+        if bbox is None:
+            nodes, edges = graph.nodes, graph.hyperedges
+        else:
+            # Labels of elements with a vertex in the viewport, found with
+            # the spatial index instead of a scan of the whole graph.
+            nodes = graph.nodes_in_range(*bbox)
+            edges = {label for node in nodes for label in graph._incident(node.label)}
+            edges = [graph.get_hyperedge(label) for label in edges]
+        for node in nodes:
+            ax.annotate(node.label, (node.x, node.y), fontsize=7, zorder=4)
+        for edge in edges:
+            x = sum(n.x for n in edge.nodes) / len(edge.nodes)
+            y = sum(n.y for n in edge.nodes) / len(edge.nodes)
+            if _inside(x, y, bbox):
+                ax.annotate(f"{edge.hypertag}:{edge.r}", (x, y), fontsize=7, color="darkred",
+                            ha="center", zorder=4)
+
+    ax.set_aspect("equal")
+    if bbox is not None:
+        ax.set_xlim(bbox[0], bbox[2])
+        ax.set_ylim(bbox[1], bbox[3])
+    else:
+        ax.autoscale_view()
+    ax.set_title(f"Graph: {len(graph._nodes)} nodes, {len(graph._hyperedges)} hyperedges")
+    fig.savefig(filename, dpi=100)
+    plt.close(fig)
+
+
+def _draw_networkx(graph: Graph, filename: str, bbox: Optional[BBox] = None) -> None:
+    """Draws the bipartite encoding with nx.draw (vertices and hyperedges as circles)."""
+    import networkx as nx
+
+    plt = _pyplot()
+    nx_graph = graph._graph
+    if bbox is not None:
+        nx_graph = nx_graph.subgraph([
+            label for label, data in nx_graph.nodes(data=True)
+            if _inside(data['node'].x, data['node'].y, bbox)
+        ])
     fig, ax = plt.subplots(figsize=(10, 10))
     
     pos = {}
@@ -24,7 +169,7 @@ def draw(graph: Graph, filename: str) -> None:
     node_sizes = []
     labels = {}
     
-    for label, data in graph._graph.nodes(data=True):
+    for label, data in nx_graph.nodes(data=True):
         node = data['node']
         pos[label] = (node.x, node.y)
         
@@ -41,7 +186,7 @@ def draw(graph: Graph, filename: str) -> None:
             labels[label] = label
     
     nx.draw(
-        graph._graph,
+        nx_graph,
         pos=pos,
         ax=ax,
         with_labels=True,
@@ -64,5 +209,3 @@ def draw(graph: Graph, filename: str) -> None:
     plt.tight_layout()
     plt.savefig(filename, dpi=150)
     plt.close()
-    
-    print(f"Saved graph to: {filename}")
@@ -0,0 +1,34 @@
+import pytest
+
+from node import Node
+from edge import HyperEdge
+from graph import Graph
+
+
+def _make_grid(cols: int, rows: int, r: int = 0, **graph_args) -> Graph:
+    """Builds a cols x rows grid of quads (shared E edges between neighbours)."""
+    g = Graph(**graph_args)
+    nodes = {}
+    for j in range(rows + 1):
+        for i in range(cols + 1):
+            nodes[i, j] = Node(i, j, f"v{i}_{j}")
+            g.add_node(nodes[i, j])
+
+    for j in range(rows + 1):
+        for i in range(cols):
+            g.add_edge(HyperEdge((nodes[i, j], nodes[i + 1, j]), "E"))
+    for j in range(rows):
+        for i in range(cols + 1):
+            g.add_edge(HyperEdge((nodes[i, j], nodes[i, j + 1]), "E"))
+
+    for j in range(rows):
+        for i in range(cols):
+            quad = (nodes[i, j], nodes[i + 1, j], nodes[i + 1, j + 1], nodes[i, j + 1])
+            g.add_edge(HyperEdge(quad, "Q", r=r))
+    return g
+
+
+@pytest.fixture
+def make_grid():
+    """Factory building a cols x rows grid of quads with shared E edges."""
+    return _make_grid
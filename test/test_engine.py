@@ -0,0 +1,88 @@
+import pytest
+
+from node import Node
+from edge import HyperEdge
+from graph import Graph
+from engine import RuleEngine
+from productions.p0 import P0
+from productions.production import Production
+
+
+class Finish(Production):
+    """Test production: moves a marked Q hyperedge (r=1) to r=2."""
+
+    required_attributes = {"Q": {"r": 1}}
+    produces = frozenset({"Q"})
+
+    def get_left_side(self) -> Graph:
+        g = Graph()
+        nodes = (Node(0, 0, "n1"), Node(1, 0, "n2"), Node(1, 1, "n3"), Node(0, 1, "n4"))
+        g.add_edge(HyperEdge(nodes, "Q"), check_nodes=False)
+        return g
+
+    def get_right_side(self, left: Graph) -> Graph:
+        q = left.get_hyperedge("Q_n1_n2_n3_n4")
+        g = Graph()
+        g.add_edge(HyperEdge(q.nodes, "Q", r=2), check_nodes=False)
+        return g
+
+
+class NeedsX(Production):
+    """Test production consuming a hypertag that never appears."""
+
+    def get_left_side(self) -> Graph:
+        g = Graph()
+        g.add_edge(HyperEdge((Node(0, 0, "n1"), Node(1, 0, "n2")), "X"), check_nodes=False)
+        return g
+
+    def get_right_side(self, left: Graph) -> Graph:
+        raise AssertionError("NeedsX must never fire")
+
+
+class TestRuleEngine:
+    """Running production schedules to a fixpoint."""
+
+    @pytest.mark.parametrize("mode", RuleEngine.MODES)
+    def test_fixpoint(self, make_grid, mode):
+        g = make_grid(3, 2)
+        report = RuleEngine([Finish(), P0()], mode=mode).run(g)
+
+        assert report.fixpoint
+        assert report.rules["P0"].applications == 6
+        assert report.rules["Finish"].applications == 6
+        assert report.applications == 12
+        assert all(e.r == 2 for e in g.hyperedges if e.hypertag == "Q")
+
+    def test_dirty_tracking(self, make_grid):
+        report = RuleEngine([Finish(), P0()]).run(make_grid(2, 2))
+
+        # Finish is retried only after P0 produced Q, P0 only after Finish did.
+        assert report.rules["Finish"].attempts == 2
+        assert report.rules["P0"].attempts == 2
+        assert report.rounds == 3
+
+    def test_round_budget(self, make_grid):
+        g = make_grid(2, 2)
+        report = RuleEngine([Finish(), P0()], max_rounds=1).run(g)
+
+        assert not report.fixpoint
+        assert report.rules["Finish"].applications == 0
+        assert all(e.r == 1 for e in g.hyperedges if e.hypertag == "Q")
+
+    def test_priority(self, make_grid):
+        report = RuleEngine([P0(), Finish()], priority=True).run(make_grid(2, 2))
+
+        assert report.fixpoint
+        assert report.rules["P0"].attempts == 2
+        assert report.rules["Finish"].applications == 4
+
+    def test_skips_missing_tags(self, make_grid):
+        report = RuleEngine([NeedsX(), P0()]).run(make_grid(1, 1))
+
+        assert report.rules["NeedsX"].skipped == 1
+        assert report.rules["NeedsX"].attempts == 0
+        assert report.rules["P0"].applications == 1
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            RuleEngine([P0()], mode="foo")
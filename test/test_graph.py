@@ -0,0 +1,902 @@
+import pytest
+
+from node import Node
+from edge import HyperEdge
+from graph import Graph
+from matching import AnchoredMatcher, MatchView
+from metrics import Metrics
+from productions.p0 import P0
+from productions.production import Production
+
+
+class TestIncrementalApply:
+    """Incremental matching must give the same result as full rescans."""
+
+    @pytest.mark.parametrize("cols, rows", [(1, 1), (3, 2), (4, 4)])
+    def test_same_as_full_rescan(self, make_grid, cols, rows):
+        full = make_grid(cols, rows)
+        incremental = make_grid(cols, rows)
+
+        applied_full = full.apply(P0())
+        applied_incremental = incremental.apply(P0(), incremental=True)
+
+        assert applied_full == applied_incremental == cols * rows
+        assert full.count_nodes() == incremental.count_nodes()
+        q_edges = [e for e in incremental.hyperedges if e.hypertag == "Q"]
+        assert len(q_edges) == cols * rows
+        assert all(e.r == 1 for e in q_edges)
+
+    def test_no_match(self, make_grid):
+        g = make_grid(2, 2, r=1)
+        assert g.apply(P0(), incremental=True) == 0
+
+    def test_neighbourhood(self, make_grid):
+        g = make_grid(2, 1)
+        assert g.neighbourhood(["v0_0"], 0) == {"v0_0"}
+        assert g.neighbourhood(["v0_0"], 1) == {
+            "v0_0", "E_v0_0_v1_0", "E_v0_0_v0_1", "Q_v0_0_v0_1_v1_0_v1_1"
+        }
+
+
+class TestApplyAll:
+    """Batch application of non-overlapping matches."""
+
+    @pytest.mark.parametrize("cols, rows", [(1, 1), (3, 2), (5, 5)])
+    def test_same_as_apply(self, make_grid, cols, rows):
+        sequential = make_grid(cols, rows)
+        batched = make_grid(cols, rows)
+
+        assert batched.apply_all(P0()) == sequential.apply(P0()) == cols * rows
+        assert batched.count_nodes() == sequential.count_nodes()
+        q_edges = [e for e in batched.hyperedges if e.hypertag == "Q"]
+        assert all(e.r == 1 for e in q_edges)
+
+    def test_sequential_mode(self, make_grid):
+        assert make_grid(2, 2).apply_all(P0(), mode="sequential") == 4
+
+    def test_unknown_mode(self, make_grid):
+        with pytest.raises(ValueError):
+            make_grid(1, 1).apply_all(P0(), mode="foo")
+
+
+class TestArrayBackend:
+    """The array backend must behave like the networkx one."""
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            Graph(backend="foo")
+
+    def test_basic_operations(self, make_grid):
+        g = make_grid(2, 1, backend="array")
+        assert g.backend == "array"
+
+        cnt = g.count_nodes()
+        assert cnt.normal == 6
+        assert cnt.hyper == 9
+
+        q = g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1")
+        assert q.hypertag == "Q"
+        assert [n.label for n in q.nodes] == ["v0_0", "v1_0", "v1_1", "v0_1"]
+        assert g.get_node("v1_1").x == 1
+
+        g.remove_node("Q_v0_0_v0_1_v1_0_v1_1")
+        assert g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1") is None
+        assert g.count_nodes().hyper == 8
+        assert sorted(g._incident("v1_0")) == ["E_v0_0_v1_0", "E_v1_0_v1_1", "E_v1_0_v2_0",
+                                               "Q_v1_0_v1_1_v2_0_v2_1"]
+
+    @pytest.mark.parametrize("method", ["anchored", "vf2"])
+    def test_same_matches(self, make_grid, method):
+        left = P0().get_left_side()
+        expected = make_grid(3, 2).find_subgraph_isomorphisms(left, method=method)
+        found = make_grid(3, 2, backend="array").find_subgraph_isomorphisms(left, method=method)
+        assert {frozenset(m.items()) for m in found} == {frozenset(m.items()) for m in expected}
+
+    @pytest.mark.parametrize("apply", [
+        lambda g: g.apply(P0()),
+        lambda g: g.apply(P0(), incremental=True),
+        lambda g: g.apply_all(P0()),
+    ])
+    def test_apply(self, make_grid, apply):
+        g = make_grid(12, 12, backend="array")
+
+        assert apply(g) == 144
+        assert g.count_nodes() == make_grid(12, 12).count_nodes()
+        assert all(e.r == 1 for e in g.hyperedges if e.hypertag == "Q")
+
+
+class TestUpdateEdge:
+    """Attribute updates through the graph."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_update_edge(self, make_grid, backend):
+        g = make_grid(1, 1, backend=backend)
+        g.update_edge("Q_v0_0_v0_1_v1_0_v1_1", r=1)
+        g.update_edge("E_v0_0_v1_0", b=0)
+
+        assert g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1").r == 1
+        assert g.get_hyperedge("E_v0_0_v1_0").b == 0
+        assert g.get_hyperedge("E_v0_0_v1_0").r == 0
+        assert g.apply(P0()) == 0
+
+    def test_update_missing_edge(self, make_grid):
+        with pytest.raises(ValueError):
+            make_grid(1, 1).update_edge("Q_missing", r=1)
+
+
+class TestHyperEdgeIndex:
+    """Hyperedge lookups by hypertag and attribute values."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_queries(self, make_grid, backend):
+        g = make_grid(2, 2, backend=backend)
+        g.update_edge("Q_v0_0_v0_1_v1_0_v1_1", r=1)
+
+        def scan(tag, **attrs):
+            return {e.label for e in g.hyperedges
+                    if e.hypertag == tag and all(getattr(e, k) == v for k, v in attrs.items())}
+
+        for tag, attrs in [("Q", {}), ("Q", {"r": 0}), ("Q", {"r": 1}), ("E", {"b": 1}),
+                           ("E", {"r": 0, "b": 1}), ("T", {})]:
+            found = g.hyperedges_with(tag, **attrs)
+            assert set(found.labels) == scan(tag, **attrs)
+            assert {e.label for e in found} == scan(tag, **attrs)
+            assert g.count_hyperedges(tag, **attrs) == len(found) == len(scan(tag, **attrs))
+
+        q = g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1")
+        assert q in g.hyperedges_with("Q", r=1) and q.label in g.hyperedges_with("Q")
+        assert q not in g.hyperedges_with("Q", r=0)
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_views_follow_changes(self, make_grid, backend):
+        g = make_grid(3, 3, backend=backend)
+        unrefined = g.hyperedges_with("Q", r=0)
+        boundary = g.hyperedges_with("E", b=0)
+        assert len(unrefined) == 9 and len(boundary) == 0
+
+        s = g.snapshot()
+        g.apply(P0())
+        assert len(unrefined) == 0 and len(g.hyperedges_with("Q", r=1)) == 9
+        g.update_edge("E_v0_0_v1_0", b=0)
+        assert set(boundary.labels) == {"E_v0_0_v1_0"}
+        g.remove_node("E_v0_0_v1_0")
+        assert len(boundary) == 0
+        g.rollback(s)
+        assert len(unrefined) == 9 and len(boundary) == 0
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_tag_queries_use_index(self, make_grid, backend):
+        """Tag members, counts and geometry come from the index, in the same order."""
+        g = make_grid(2, 2, backend=backend)
+        store = g._store
+        assert g.count_hyperedges("Q") == 4
+        store.index._rows = None  # building the table again would fail now
+        g.update_edge("Q_v0_0_v0_1_v1_0_v1_1", r=1)
+        g.remove_node("Q_v1_0_v1_1_v2_0_v2_1")
+
+        labels = store.tag_members("Q")
+        assert store.tag_count("Q") == len(labels) == 3
+        offsets, xy, r = store.tag_geometry("Q")
+        assert r.tolist() == [g.get_hyperedge(label).r for label in labels]
+        assert xy[offsets[-2]:].tolist() == \
+            [[n.x, n.y] for n in g.get_hyperedge(labels[-1]).nodes]
+        assert sorted(store.tags()) == ["E", "Q"]
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_stored_attributes_are_read_only(self, make_grid, backend):
+        """Direct writes would bypass the index, so only Graph.update_edge may change r and b."""
+        g = make_grid(2, 2, r=1, backend=backend)
+        q = g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1")
+        with pytest.raises(AttributeError, match="update_edge"):
+            q.r = 0
+        with pytest.raises(AttributeError):
+            q.update(b=0)
+        assert len(g.hyperedges_with("Q", r=0)) == 0
+
+        g.update_edge(q.label, r=0)
+        assert set(g.hyperedges_with("Q", r=0).labels) == {q.label}
+        assert g.apply(P0()) == 1
+
+        removed = g.get_hyperedge("E_v0_0_v1_0")
+        g.remove_node(removed.label)
+        if backend == "networkx":
+            removed.r = 1
+
+    def test_edge_in_two_graphs(self, make_grid):
+        """Removing a hyperedge from one graph must not unlock it for another one."""
+        g = make_grid(1, 1)
+        q = g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1")
+        match = next(iter(g.iter_matches(P0().plan)))
+        MatchView(g, match).to_graph().remove_node(match[q.label])
+        with pytest.raises(AttributeError):
+            q.r = 5
+
+        h = make_grid(1, 1)
+        h.remove_node(q.label)
+        h.add_edge(q)
+        g.remove_node(q.label)
+        q.r = 5
+        assert h.get_hyperedge(q.label).r == 0
+        assert set(h.hyperedges_with("Q", r=0).labels) == {q.label}
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_matcher_uses_required_values(self, make_grid, backend):
+        g = make_grid(3, 3, backend=backend)
+        g.update_edge("Q_v0_0_v0_1_v1_0_v1_1", r=1)
+        matcher = AnchoredMatcher(g, P0().plan)
+        anchor = matcher._anchor()
+        assert anchor == "Q_n1_n2_n3_n4"
+        assert len(matcher.anchor_candidates(anchor)) == 8
+        assert g.apply(P0()) == 8
+
+
+class TestIncidence:
+    """Incident and adjacent hyperedge queries."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_queries(self, make_grid, backend):
+        g = make_grid(2, 2, backend=backend)
+        assert len(g.incident_hyperedges("v1_1")) == 8
+        assert {e.hypertag for e in g.incident_hyperedges("v1_1", "Q")} == {"Q"}
+        assert len(g.incident_hyperedges("v1_1", "Q")) == 4
+        assert len(g.incident_hyperedges("v0_0", "E")) == 2
+        assert len(g.incident_hyperedges("v0_0", "T")) == 0
+
+        corner = "Q_v0_0_v0_1_v1_0_v1_1"
+        across = {e.label for e in g.adjacent_hyperedges(corner, "Q", shared=2)}
+        assert across == {"Q_v0_1_v0_2_v1_1_v1_2", "Q_v1_0_v1_1_v2_0_v2_1"}
+        assert len(g.adjacent_hyperedges(corner, "Q")) == 3
+        assert len(g.adjacent_hyperedges(corner, "E", shared=2)) == 4
+        assert "E_v0_0_v1_0" in g.adjacent_hyperedges(corner, "E", shared=2)
+
+        with pytest.raises(ValueError):
+            g.incident_hyperedges("missing")
+        with pytest.raises(ValueError):
+            g.adjacent_hyperedges("v0_0")
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_follows_changes(self, make_grid, backend):
+        g = make_grid(3, 3, backend=backend)
+
+        def incidence():
+            return {n.label: sorted(g.incident_hyperedges(n.label).labels)
+                    for n in g.nodes}
+
+        before = incidence()
+        s = g.snapshot()
+        g.apply(AddMidpoint())
+        assert incidence() == {n.label: sorted(g._graph.neighbors(n.label)) for n in g.nodes}
+        g.remove_node("v1_1")
+        assert "v1_1" not in incidence()
+        g.rollback(s)
+        assert incidence() == before
+
+
+class TestCanonicalKeys:
+    """Hyperedges are stored under an orientation-independent key."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_reversed_edge_upserts(self, make_grid, backend):
+        g = make_grid(1, 1, backend=backend)
+        n1, n2 = g.get_node("v0_0"), g.get_node("v1_0")
+
+        g.add_edge(HyperEdge((n2, n1), "E", b=0))
+
+        assert g.count_nodes().hyper == 5
+        assert g.get_hyperedge("E_v0_0_v1_0").b == 0
+
+    def test_repeated_apply_keeps_size(self, make_grid):
+        g = make_grid(3, 3)
+        before = g.count_nodes()
+        g.apply(P0())
+        assert g.count_nodes() == before
+
+
+class AddMidpoint(Production):
+    """Test production: splits a Q hyperedge's bottom side by adding a midpoint."""
+
+    def get_left_side(self) -> Graph:
+        g = Graph()
+        n1, n2 = Node(0, 0, "n1"), Node(1, 0, "n2")
+        n3, n4 = Node(1, 1, "n3"), Node(0, 1, "n4")
+        g.add_edge(HyperEdge((n1, n2, n3, n4), "Q"), check_nodes=False)
+        return g
+
+    def get_right_side(self, left: Graph) -> Graph:
+        q = left.get_hyperedge("Q_n1_n2_n3_n4")
+        a, b = sorted(q.nodes, key=lambda n: (n.y, n.x))[:2]
+        mid = Node((a.x + b.x) / 2, (a.y + b.y) / 2, f"m_{q.label}")
+        g = Graph()
+        g.add_edge(HyperEdge(q.nodes, "Q", r=1), check_nodes=False)
+        g.add_edge(HyperEdge((a, mid), "E"), check_nodes=False)
+        return g
+
+    def match_edge(self, pattern_edge: HyperEdge, edge: HyperEdge) -> bool:
+        return edge.r == 0
+
+
+class TestSpatialIndex:
+    """Geometric node lookups."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_find_node_at(self, make_grid, backend):
+        g = make_grid(3, 3, backend=backend)
+
+        assert g.find_node_at(2, 1).label == "v2_1"
+        assert g.find_node_at(2.05, 1, tol=0.1).label == "v2_1"
+        assert g.find_node_at(2.5, 1.5, tol=0.1) is None
+
+        g.remove_node("v2_1")
+        assert g.find_node_at(2, 1) is None
+
+        g.add_node(Node(2.5, 1.5, "c"))
+        assert g.find_node_at(2.5, 1.5).label == "c"
+        g.add_node(Node(7, 7, "c"))
+        assert g.find_node_at(2.5, 1.5) is None
+        assert g.find_node_at(7, 7).label == "c"
+
+    def test_nodes_in_range(self, make_grid):
+        g = make_grid(3, 3, backend="array")
+        labels = {n.label for n in g.nodes_in_range(0.5, 0.5, 2, 1)}
+        assert labels == {"v1_1", "v2_1"}
+        assert len(g.nodes_in_range(-100, -100, 100, 100)) == 16
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_repeated_label_in_batch(self, make_grid, backend):
+        g = make_grid(3, 3, backend=backend)
+        assert g.find_node_at(0, 0).label == "v0_0"
+        g._spatial.insert("v0_0", 0, 0)
+        assert len(g._spatial) == 16
+        snapshot = g.snapshot()
+
+        g.add_nodes([Node(10, 10, "c"), Node(20, 20, "c")], labels=["c"], xy=[(30, 30)])
+        assert len(g._spatial) == 17
+        assert g.find_node_at(10, 10) is None and g.find_node_at(20, 20) is None
+        assert g.find_node_at(30, 30).label == "c"
+        assert (g.get_node("c").x, g.get_node("c").y) == (30, 30)
+
+        g.rollback(snapshot)
+        assert len(g._spatial) == g.count_nodes().normal == 16
+        assert g.find_node_at(30, 30) is None
+
+    def test_merge_coincident_nodes(self, make_grid):
+        g = make_grid(1, 1, merge_tolerance=1e-6)
+        g.add_node(Node(0.5, 0, "existing"))
+
+        assert g.apply(AddMidpoint()) == 1
+        assert g.get_node("m_Q_v0_0_v0_1_v1_0_v1_1") is None
+        assert g.get_hyperedge("E_existing_v0_0") is not None
+
+
+class TestPersistence:
+    """Saving and loading graphs in the binary format."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    @pytest.mark.parametrize("mmap", [True, False])
+    def test_round_trip(self, make_grid, tmp_path, backend, mmap):
+        g = make_grid(3, 2, backend=backend)
+        g.update_edge("Q_v0_0_v0_1_v1_0_v1_1", r=1)
+        g.update_edge("E_v0_0_v1_0", b=0)
+        g.save(tmp_path / "grid.bin")
+
+        loaded = Graph.load(tmp_path / "grid.bin", mmap=mmap)
+
+        assert loaded.backend == "array"
+        assert loaded.count_nodes() == g.count_nodes()
+        assert {n.label: (n.x, n.y) for n in loaded.nodes} == {n.label: (n.x, n.y) for n in g.nodes}
+        assert {e.label: (e.r, e.b) for e in loaded.hyperedges} == \
+            {e.label: (e.r, e.b) for e in g.hyperedges}
+        assert [n.label for n in loaded.get_hyperedge("Q_v1_0_v1_1_v2_0_v2_1").nodes] == \
+            ["v1_0", "v2_0", "v2_1", "v1_1"]
+        assert sorted(loaded._incident("v1_1")) == sorted(g._incident("v1_1"))
+
+    def test_removed_elements_dropped(self, make_grid, tmp_path):
+        g = make_grid(2, 1, backend="array")
+        g.remove_node("Q_v0_0_v0_1_v1_0_v1_1")
+        g.remove_node("E_v0_0_v1_0")
+        g.save(tmp_path / "grid.bin")
+
+        loaded = Graph.load(tmp_path / "grid.bin")
+
+        assert loaded.count_nodes() == g.count_nodes()
+        assert loaded.get_hyperedge("E_v0_0_v1_0") is None
+        assert sorted(loaded._incident("v1_0")) == ["E_v1_0_v1_1", "E_v1_0_v2_0",
+                                                    "Q_v1_0_v1_1_v2_0_v2_1"]
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    @pytest.mark.parametrize("readd", [False, True])
+    def test_removed_node_with_edges(self, make_grid, tmp_path, backend, readd):
+        """A removed node still referenced by hyperedges is saved dead, next to a re-added one."""
+        g = make_grid(2, 1, backend=backend)
+        node = g.get_node("v0_0")
+        g.remove_node("v0_0")
+        if readd:
+            g.add_node(node)
+        g.save(tmp_path / "grid.bin")
+
+        loaded = Graph.load(tmp_path / "grid.bin")
+
+        assert loaded.count_nodes() == g.count_nodes()
+        assert (loaded.get_node("v0_0") is not None) == readd
+        assert {e.label for e in loaded.hyperedges} == {e.label for e in g.hyperedges}
+        assert [n.label for n in loaded.get_hyperedge("E_v0_0_v1_0").nodes] == ["v0_0", "v1_0"]
+
+    def test_loaded_graph_is_writable(self, make_grid, tmp_path):
+        path = tmp_path / "grid.bin"
+        make_grid(3, 3).save(path)
+
+        loaded = Graph.load(path)
+        assert loaded.apply(P0()) == 9
+        assert all(e.r == 1 for e in loaded.hyperedges if e.hypertag == "Q")
+
+        # Changes are never written back to the file.
+        assert all(e.r == 0 for e in Graph.load(path).hyperedges if e.hypertag == "Q")
+
+    def test_load_into_networkx(self, make_grid, tmp_path):
+        make_grid(2, 2).save(tmp_path / "grid.bin")
+        loaded = Graph.load(tmp_path / "grid.bin", backend="networkx")
+
+        assert loaded.backend == "networkx"
+        assert loaded.count_nodes() == make_grid(2, 2).count_nodes()
+        assert loaded.apply(P0()) == 4
+
+    def test_not_a_graph_file(self, tmp_path):
+        path = tmp_path / "foo.bin"
+        path.write_bytes(b"not a graph")
+        with pytest.raises(ValueError):
+            Graph.load(path)
+
+
+def grid_elements(cols, rows):
+    """Nodes and hyperedges of the make_grid fixture's grid, as lists."""
+    nodes = {(i, j): Node(i, j, f"v{i}_{j}") for j in range(rows + 1) for i in range(cols + 1)}
+    edges = [HyperEdge((nodes[i, j], nodes[i + 1, j]), "E")
+             for j in range(rows + 1) for i in range(cols)]
+    edges += [HyperEdge((nodes[i, j], nodes[i, j + 1]), "E")
+              for j in range(rows) for i in range(cols + 1)]
+    edges += [HyperEdge((nodes[i, j], nodes[i + 1, j], nodes[i + 1, j + 1], nodes[i, j + 1]), "Q")
+              for j in range(rows) for i in range(cols)]
+    return list(nodes.values()), edges
+
+
+class TestBulkInsertion:
+    """Graph.add_nodes / Graph.add_edges."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_same_as_single_inserts(self, make_grid, backend):
+        nodes, edges = grid_elements(3, 2)
+        g = Graph(backend=backend)
+        g.add_nodes(nodes)
+        g.add_edges(edges)
+
+        expected = make_grid(3, 2, backend=backend)
+        assert g.count_nodes() == expected.count_nodes()
+        assert sorted(g._incident("v1_1")) == sorted(expected._incident("v1_1"))
+        assert g.get_hyperedge("Q_v1_0_v1_1_v2_0_v2_1").nodes == \
+            expected.get_hyperedge("Q_v1_0_v1_1_v2_0_v2_1").nodes
+        assert g.apply(P0()) == 6
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_arrays(self, backend):
+        g = Graph(backend=backend)
+        g.add_nodes(labels=["a", "b", "c"], xy=[[0, 0], [1, 0], [0.5, 1]])
+        g.add_nodes([Node(2, 2, "c")])
+
+        assert g.count_nodes().normal == 3
+        assert (g.get_node("c").x, g.get_node("c").y) == (2, 2)
+        assert g.find_node_at(1, 0).label == "b"
+
+        with pytest.raises(ValueError):
+            g.add_nodes(labels=["d"], xy=[[0, 0], [1, 1]])
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_missing_nodes_reported_for_batch(self, backend):
+        g = Graph(backend=backend)
+        n1, n2, n3, n4 = Node(0, 0, "n1"), Node(1, 0, "n2"), Node(1, 1, "n3"), Node(0, 1, "n4")
+        g.add_nodes([n1, n2])
+        edges = [HyperEdge((n1, n2), "E"), HyperEdge((n2, n3), "E"), HyperEdge((n3, n4), "E")]
+
+        with pytest.raises(ValueError, match="n3, n4 do not exist.*2 hyperedges: E_n2_n3, E_n3_n4"):
+            g.add_edges(edges)
+        assert g.count_nodes().hyper == 0
+
+        g.add_edges(edges, check_nodes=False)
+        assert (g.count_nodes().normal, g.count_nodes().hyper) == (4, 3)
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_upsert(self, make_grid, backend):
+        g = make_grid(1, 1, backend=backend)
+        n1, n2 = g.get_node("v0_0"), g.get_node("v1_0")
+        g.add_edges([HyperEdge((n2, n1), "E", b=0), HyperEdge((n1, n2), "E", r=1, b=0),
+                     HyperEdge((n1, g.get_node("v1_1")), "E"), HyperEdge((g.get_node("v1_1"), n1), "E", b=0)])
+
+        assert g.count_nodes().hyper == 6
+        assert (g.get_hyperedge("E_v0_0_v1_0").r, g.get_hyperedge("E_v0_0_v1_0").b) == (1, 0)
+        assert g.get_hyperedge("E_v0_0_v1_1").b == 0
+        assert sorted(g._incident("v1_1")) == ["E_v0_0_v1_1", "E_v0_1_v1_1", "E_v1_0_v1_1",
+                                               "Q_v0_0_v0_1_v1_0_v1_1"]
+
+
+def graph_state(g):
+    """Comparable description of a graph's elements, attributes and incidence."""
+    nodes = {n.label: (n.x, n.y) for n in g.nodes}
+    edges = {e.label: (e.r, e.b, tuple(n.label for n in e.nodes)) for e in g.hyperedges}
+    incidence = {label: sorted(g._incident(label)) for label in nodes}
+    return nodes, edges, incidence
+
+
+class TestSnapshots:
+    """Undoing changes with snapshot / rollback."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    @pytest.mark.parametrize("apply", [
+        lambda g: g.apply(P0()),
+        lambda g: g.apply_all(P0()),
+        lambda g: g.apply(AddMidpoint()),
+    ])
+    def test_rollback_apply(self, make_grid, backend, apply):
+        g = make_grid(3, 3, backend=backend)
+        before = graph_state(g)
+
+        s = g.snapshot()
+        assert apply(g) == 9
+        assert graph_state(g) != before
+        g.rollback(s)
+
+        assert graph_state(g) == before
+        assert g.count_nodes() == make_grid(3, 3).count_nodes()
+        assert apply(g) == 9
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_nested(self, make_grid, backend):
+        g = make_grid(2, 2, backend=backend)
+        s0 = g.snapshot()
+        g.update_edge("E_v0_0_v1_0", b=0)
+        state1 = graph_state(g)
+
+        s1 = g.snapshot()
+        g.remove_node("v1_1")
+        g.add_node(Node(5, 5, "extra"))
+        g.rollback(s1)
+        assert graph_state(g) == state1
+
+        g.add_edges([HyperEdge((g.get_node("v0_0"), g.get_node("v1_1")), "E")])
+        g.rollback(s1)
+        assert graph_state(g) == state1
+
+        s2 = g.snapshot()
+        g.rollback(s0)
+        assert g.get_hyperedge("E_v0_0_v1_0").b == 1
+        with pytest.raises(ValueError):
+            g.rollback(s2)
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_rewritten_history(self, make_grid, backend):
+        """A snapshot newer than a rollback target is invalid even if the journal grew back."""
+        g = make_grid(1, 1, backend=backend)
+        s0 = g.snapshot()
+        g.add_node(Node(5, 5, "a"))
+        g.add_node(Node(6, 6, "b"))
+        s1 = g.snapshot()
+        g.rollback(s0)
+        g.add_node(Node(7, 7, "c"))
+        g.add_node(Node(8, 8, "d"))
+        s2 = g.snapshot()
+
+        with pytest.raises(ValueError):
+            g.rollback(s1)
+        assert g.get_node("c") is not None and g.get_node("a") is None
+        g.rollback(s2)
+        g.rollback(s0)
+        assert g.get_node("c") is None
+
+    def test_release(self, make_grid):
+        g = make_grid(1, 1)
+        s = g.snapshot()
+        g.release()
+        g.apply(P0())
+        with pytest.raises(ValueError):
+            g.rollback(s)
+
+    def test_spatial_index(self, make_grid):
+        g = make_grid(2, 2, backend="array")
+        g.find_node_at(0, 0)
+        s = g.snapshot()
+        g.add_node(Node(9, 9, "v0_0"))
+        g.remove_node("v1_1")
+        g.rollback(s)
+
+        assert g.find_node_at(0, 0).label == "v0_0"
+        assert g.find_node_at(9, 9) is None
+        assert g.find_node_at(1, 1).label == "v1_1"
+
+    def test_rollback_after_reverse_rebuild(self, make_grid):
+        g = make_grid(20, 20, backend="array")
+        before = graph_state(g)
+        s = g.snapshot()
+        # Enough rewrites to make the array backend rebuild its reverse incidence.
+        g.apply(P0())
+        g.rollback(s)
+        assert graph_state(g) == before
+
+
+class TestOperationLog:
+    """Logging, subscribing to and replaying graph changes."""
+
+    def test_transactions(self, make_grid):
+        g = make_grid(2, 2)
+        log = g.attach_log()
+        g.apply(P0())
+
+        kinds = [op.kind for op in log.operations]
+        assert kinds.count("begin") == kinds.count("commit") == 4
+        assert log.operations[0].kind == "begin" and log.operations[0].label == "P0"
+        assert all(op.transaction == 0 for op in log.operations[:kinds.index("commit") + 1])
+        assert {op.transaction for op in log.operations} == {0, 1, 2, 3}
+        assert {op.kind for op in log.operations} == {"begin", "commit", "update_edge"}
+
+    @pytest.mark.parametrize("source, target", [
+        ("networkx", "networkx"), ("array", "networkx"), ("networkx", "array"),
+    ])
+    @pytest.mark.parametrize("apply", [
+        lambda g: g.apply(P0()),
+        lambda g: g.apply_all(P0()),
+        lambda g: g.apply(AddMidpoint()),
+    ])
+    def test_replay(self, make_grid, source, target, apply):
+        g = make_grid(3, 2, backend=source)
+        copy = make_grid(3, 2, backend=target)
+        log = g.attach_log()
+        apply(g)
+        g.update_edge("E_v0_0_v1_0", b=0)
+
+        copy_log = copy.attach_log()
+        log.replay(copy)
+
+        assert graph_state(copy) == graph_state(g)
+        assert [op.kind for op in copy_log.operations] == [op.kind for op in log.operations]
+
+    def test_replay_rollback(self, make_grid):
+        g = make_grid(2, 2)
+        copy = make_grid(2, 2)
+        log = g.attach_log()
+        s = g.snapshot()
+        g.apply(P0())
+        g.rollback(s)
+        g.remove_node("E_v0_0_v1_0")
+
+        log.replay(copy)
+        assert graph_state(copy) == graph_state(g)
+        assert [op.label for op in log.operations if op.kind == "begin"][-1] == "rollback"
+
+    def test_subscribe(self, make_grid):
+        g = make_grid(1, 1)
+        seen = []
+        log = g.attach_log()
+        log.subscribe(seen.append)
+        g.add_nodes(labels=["a"], xy=[[5, 5]])
+        position = len(log)
+        g.update_edge("Q_v0_0_v0_1_v1_0_v1_1", r=1)
+        log.unsubscribe(seen.append)
+        g.remove_node("a")
+
+        assert [(op.kind, op.label) for op in seen] == [
+            ("add_node", "a"), ("update_edge", "Q_v0_0_v0_1_v1_0_v1_1")]
+        assert [op.kind for op in log.since(position)] == ["update_edge", "remove"]
+        assert g.detach_log() is log
+
+    def test_abort(self, make_grid):
+        g = make_grid(1, 1)
+        log = g.attach_log()
+        with pytest.raises(RuntimeError):
+            with g.transaction("outer"):
+                with g.transaction("inner"):
+                    g.remove_node("E_v0_0_v1_0")
+                    raise RuntimeError
+        assert [(op.kind, op.label) for op in log.operations] == [
+            ("begin", "outer"), ("remove", "E_v0_0_v1_0"), ("abort", "outer")]
+
+
+class MarkAndSplit(AddMidpoint):
+    """Test production: like AddMidpoint, but keeps the Q hyperedge and updates it in place."""
+
+    preserved = frozenset({"n1", "n2", "n3", "n4", "Q_n1_n2_n3_n4"})
+
+    def get_right_side(self, left: Graph) -> Graph:
+        q = left.get_hyperedge("Q_n1_n2_n3_n4")
+        a, b = sorted(q.nodes, key=lambda n: (n.y, n.x))[:2]
+        mid = Node((a.x + b.x) / 2, (a.y + b.y) / 2, f"m_{q.label}")
+        g = Graph()
+        g.add_edge(HyperEdge((a, mid), "E"), check_nodes=False)
+        return g
+
+    def get_updates(self, left: Graph) -> dict:
+        return {"Q_n1_n2_n3_n4": {"r": 1}}
+
+
+class MarkCorner(Production):
+    """Test production: two E hyperedges sharing a node, the first one gets r=1."""
+
+    required_attributes = {"E": {"r": 0}}
+    preserved = frozenset({"n1", "n2", "n3", "E_n1_n2", "E_n2_n3"})
+
+    def get_left_side(self) -> Graph:
+        g = Graph()
+        n1, n2, n3 = Node(0, 0, "n1"), Node(1, 0, "n2"), Node(1, 1, "n3")
+        g.add_edge(HyperEdge((n1, n2), "E"), check_nodes=False)
+        g.add_edge(HyperEdge((n2, n3), "E"), check_nodes=False)
+        return g
+
+    def get_right_side(self, left: Graph) -> Graph:
+        return Graph()
+
+    def get_updates(self, left: Graph) -> dict:
+        return {"E_n1_n2": {"r": 1}}
+
+
+class TestPreservedElements:
+    """Productions updating preserved elements in place."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_p0_is_attribute_write(self, make_grid, backend):
+        g = make_grid(2, 2, backend=backend)
+        g.update_edge("E_v0_0_v1_0", b=0)
+        edge = g.get_hyperedge("E_v1_0_v1_1")
+        log = g.attach_log()
+
+        assert g.apply(P0()) == 4
+
+        assert [op.kind for op in log.operations if op.kind not in ("begin", "commit")] == \
+            ["update_edge"] * 4
+        assert g.get_hyperedge("E_v0_0_v1_0").b == 0
+        if backend == "networkx":
+            assert g.get_hyperedge("E_v1_0_v1_1") is edge
+
+    @pytest.mark.parametrize("apply", [
+        lambda g: g.apply(MarkAndSplit()),
+        lambda g: g.apply(MarkAndSplit(), incremental=True),
+        lambda g: g.apply_all(MarkAndSplit()),
+    ])
+    def test_update_and_insert(self, make_grid, apply):
+        g = make_grid(2, 1)
+        q = g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1")
+
+        assert apply(g) == 2
+
+        assert g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1") is q
+        assert q.r == 1
+        assert g.get_hyperedge("E_m_Q_v0_0_v0_1_v1_0_v1_1_v0_0") is not None
+        assert g.count_nodes().hyper == 7 + 2 + 2
+
+    @pytest.mark.parametrize("bulk", [False, True])
+    def test_graphs_dont_share_edges(self, bulk):
+        """Graphs built from the same elements get their own hyperedges to update."""
+        nodes = [Node(x, y, f"v{x}_{y}") for x, y in ((0, 0), (1, 0), (1, 1), (0, 1))]
+        edges = [HyperEdge(tuple(nodes), "Q")]
+        edges += [HyperEdge((nodes[i], nodes[i - 1]), "E") for i in range(4)]
+        graphs = [Graph(), Graph()]
+        for g in graphs:
+            if bulk:
+                g.add_nodes(nodes)
+                g.add_edges(edges)
+            else:
+                for node in nodes:
+                    g.add_node(node)
+                for edge in edges:
+                    g.add_edge(edge)
+
+        assert graphs[0].apply(P0()) == 1
+        assert graphs[1].get_hyperedge(edges[0].label).r == 0
+        assert graphs[1].apply(P0()) == 1
+        assert edges[0].r == 0
+        edges[0].r = 1
+
+    def test_apply_all_conflicts(self, make_grid):
+        g = make_grid(2, 2)
+        applied = g.apply_all(MarkCorner())
+
+        # Every application updated a different E hyperedge.
+        assert applied == sum(1 for e in g.hyperedges if e.hypertag == "E" and e.r == 1)
+        assert list(g.iter_matches(MarkCorner().plan)) == []
+
+    def test_update_not_preserved(self, make_grid):
+        class Broken(MarkCorner):
+            def get_updates(self, left):
+                return {"n1": {"r": 1}, "E_n0_n1": {"r": 1}}
+
+        class Unknown(MarkCorner):
+            preserved = frozenset({"E_n1_n2", "foo"})
+
+        with pytest.raises(ValueError):
+            make_grid(1, 1).apply(Broken())
+        with pytest.raises(ValueError, match="foo"):
+            Unknown.compile()
+
+
+class MarkFromBoundary(P0):
+    """Test production: P0 whose filter depends on a left-side label (E_n1_n2 on the boundary)."""
+
+    symmetric = False
+
+    def filter_match(self, matched_graph: Graph) -> bool:
+        return matched_graph.get_hyperedge("E_n1_n2").b == 1
+
+
+class TestSymmetricProductions:
+    """Automorphic variants of a match must reach filter_match unless the production is symmetric."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    @pytest.mark.parametrize("apply", [
+        lambda g: g.apply(MarkFromBoundary()),
+        lambda g: g.apply(MarkFromBoundary(), incremental=True),
+        lambda g: g.apply_all(MarkFromBoundary()),
+    ])
+    def test_label_dependent_filter(self, make_grid, backend, apply):
+        g = make_grid(1, 1, backend=backend)
+        for label in ("E_v0_1_v1_1", "E_v0_0_v0_1", "E_v1_0_v1_1"):
+            g.update_edge(label, b=0)
+        variants = g.find_subgraph_isomorphisms(P0().plan)
+        assert len(variants) == 8
+
+        assert apply(g) == 1
+        assert g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1").r == 1
+
+
+class LeftColumnOnly(AddMidpoint):
+    """Test production: AddMidpoint restricted to quads touching x=0."""
+
+    def filter_match(self, matched_graph: Graph) -> bool:
+        q = matched_graph.get_hyperedge("Q_n1_n2_n3_n4")
+        return min(n.x for n in q.nodes) == 0
+
+
+class TestMetrics:
+    """Graph.attach_metrics counters and phase times."""
+
+    @pytest.mark.parametrize("apply", [
+        lambda g: g.apply(AddMidpoint()),
+        lambda g: g.apply(AddMidpoint(), incremental=True),
+        lambda g: g.apply_all(AddMidpoint()),
+    ])
+    def test_counters(self, make_grid, apply):
+        g = make_grid(2, 1)
+        metrics = g.attach_metrics()
+        apply(g)
+
+        m = metrics["AddMidpoint"]
+        assert (m.applied, m.edges_removed, m.edges_updated) == (2, 2, 0)
+        assert (m.nodes_added, m.edges_added) == (2, 4)
+        assert m.matches >= 2
+        assert set(m.times) == {"match", "build", "filter", "right_side", "remove", "update", "add"}
+        assert m.time == pytest.approx(sum(m.times.values()))
+
+    def test_rejected_and_updated(self, make_grid):
+        g = make_grid(3, 1)
+        metrics = g.attach_metrics()
+        g.apply(LeftColumnOnly())
+        g.apply(P0())
+
+        assert metrics["LeftColumnOnly"].applied == 1
+        assert metrics["LeftColumnOnly"].rejected > 0
+        assert metrics["P0"].applied == metrics["P0"].edges_updated == 2
+        assert metrics["P0"].edges_removed == metrics["P0"].edges_added == 0
+        assert "LeftColumnOnly" in metrics.report()
+
+    def test_hook_and_find(self, make_grid):
+        calls = []
+        g = make_grid(2, 2)
+        g.attach_metrics(Metrics(hook=lambda *call: calls.append(call)))
+
+        matches = g.find_subgraph_isomorphisms(P0().plan)
+        g.apply(P0())
+
+        assert g.metrics["find_subgraph_isomorphisms"].matches == len(matches)
+        assert ("P0", "update") in {(name, phase) for name, phase, _ in calls}
+        assert all(seconds >= 0 for _, _, seconds in calls)
+
+    def test_detached(self, make_grid):
+        g = make_grid(2, 2)
+        metrics = g.attach_metrics()
+        assert g.detach_metrics() is metrics
+        g.apply(P0())
+        assert metrics.productions == {}
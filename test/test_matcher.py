@@ -0,0 +1,283 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import networkx as nx
+import pytest
+
+from node import Node
+from edge import HyperEdge
+from graph import Graph
+from matching import MatchPlan, MatchView, vf2_node_match
+from parallel import parallel_matches, partition
+from productions.p0 import P0
+from productions.production import Production
+
+
+def as_set(matches):
+    return {frozenset(m.items()) for m in matches}
+
+
+class TestAnchoredMatcher:
+    """The anchored matcher must find exactly the matches VF2 finds."""
+
+    @pytest.mark.parametrize("cols, rows", [(1, 1), (2, 3)])
+    def test_same_as_vf2_on_grid(self, make_grid, cols, rows):
+        g = make_grid(cols, rows)
+        left = P0().get_left_side()
+
+        anchored = g.find_subgraph_isomorphisms(left)
+        vf2 = g.find_subgraph_isomorphisms(left, method="vf2")
+
+        assert len(anchored) == len(vf2) == 8 * cols * rows
+        assert as_set(anchored) == as_set(vf2)
+
+    def test_wrong_tag_not_matched(self):
+        g = Graph()
+        n1, n2, n3, n4 = Node(0, 0, "n1"), Node(2, 0, "n2"), Node(2, 2, "n3"), Node(0, 2, "n4")
+        for n in (n1, n2, n3, n4):
+            g.add_node(n)
+        g.add_edge(HyperEdge((n1, n2), "F"))
+        g.add_edge(HyperEdge((n2, n3), "E"))
+        g.add_edge(HyperEdge((n3, n4), "E"))
+        g.add_edge(HyperEdge((n4, n1), "E"))
+        g.add_edge(HyperEdge((n1, n2, n3, n4), "Q"))
+
+        assert g.find_subgraph_isomorphisms(P0().get_left_side()) == []
+
+    @pytest.mark.parametrize("extra", [("v0_0", "v1_1"), ("v0_0", "v1_0", "v1_1")])
+    def test_extra_edges_same_as_vf2(self, make_grid, extra):
+        """Extra E edges between matched nodes are handled like VF2 does."""
+        g = make_grid(1, 1)
+        g.add_edge(HyperEdge(tuple(g.get_node(label) for label in extra), "E"))
+        left = P0().get_left_side()
+
+        assert as_set(g.find_subgraph_isomorphisms(left)) == \
+            as_set(g.find_subgraph_isomorphisms(left, method="vf2"))
+
+    def test_mapping_format(self, make_grid):
+        g = make_grid(1, 1)
+        match = g.find_subgraph_isomorphisms(P0().get_left_side())[0]
+        assert sorted(match.values()) == sorted(P0().get_left_side()._graph.nodes)
+        assert set(match) <= {n.label for n in g.nodes} | {e.label for e in g.hyperedges}
+
+    def test_unknown_method(self, make_grid):
+        with pytest.raises(ValueError):
+            make_grid(1, 1).find_subgraph_isomorphisms(P0().get_left_side(), method="foo")
+
+
+class TestIterMatches:
+    """Lazy, deduplicated match streaming."""
+
+    def test_unique_matches(self, make_grid):
+        g = make_grid(2, 2)
+        matches = list(g.iter_matches(P0().get_left_side()))
+        assert len(matches) == 4
+        assert len({frozenset(m) for m in matches}) == 4
+
+    @pytest.mark.parametrize("method", ["anchored", "vf2"])
+    def test_predicate(self, make_grid, method):
+        g = make_grid(2, 1)
+        g.update_edge("Q_v0_0_v0_1_v1_0_v1_1", r=1)
+
+        def unrefined(pattern_edge, edge):
+            return pattern_edge.hypertag != "Q" or edge.r == 0
+
+        matches = list(g.iter_matches(P0().get_left_side(), predicate=unrefined, method=method))
+
+        assert len(matches) == 1
+        assert "Q_v1_0_v1_1_v2_0_v2_1" in matches[0]
+
+    @pytest.mark.parametrize("method", ["anchored", "vf2"])
+    def test_required_attributes(self, make_grid, method):
+        g = make_grid(2, 1)
+        g.update_edge("Q_v0_0_v0_1_v1_0_v1_1", r=1)
+
+        matches = list(g.iter_matches(P0().plan, method=method))
+
+        assert len(matches) == 1
+        assert "Q_v1_0_v1_1_v2_0_v2_1" in matches[0]
+
+    def test_lazy(self, make_grid):
+        g = make_grid(3, 3)
+        it = g.iter_matches(P0().get_left_side())
+        first = next(it)
+        assert len(first) == 9
+
+
+class TestMatchPlan:
+    """Compiled production plans."""
+
+    def test_cached_per_class(self):
+        assert P0().plan is P0().plan
+        assert P0.compile() is P0().plan
+
+    def test_hashable(self):
+        plan = P0().plan
+        other = MatchPlan.compile(P0().get_left_side())
+        assert len({plan, plan, other}) == 2
+
+    def test_p0_plan(self):
+        plan = P0().plan
+        assert plan.anchor_tag == "Q"
+        assert plan.required == {"Q_n1_n2_n3_n4": {"r": 0}}
+        assert len(plan.automorphisms) == 8
+        assert len(plan.symmetries["Q_n1_n2_n3_n4"]) == 7
+        assert plan.degrees["n1"] == {"E": 2, "Q": 1}
+        assert plan.orders["Q_n1_n2_n3_n4"][0] == "Q_n1_n2_n3_n4"
+
+    @pytest.mark.parametrize("pattern", ["p0", "corner", "path"])
+    def test_automorphisms_same_as_vf2(self, pattern):
+        if pattern == "p0":
+            g = P0().get_left_side()
+        elif pattern == "corner":
+            g = corner_pattern()
+        else:
+            a, b, c, d = (Node(i, 0, f"n{i}") for i in range(4))
+            g = Graph()
+            for node in (a, b, c, d):
+                g.add_node(node)
+            for pair in ((a, b), (b, c), (c, d)):
+                g.add_edge(HyperEdge(pair, "E"))
+            g.add_edge(HyperEdge((a, d), "Q"))
+        matcher = nx.algorithms.isomorphism.GraphMatcher(g._graph, g._graph,
+                                                         node_match=vf2_node_match)
+        expected = {frozenset(m.items()) for m in matcher.isomorphisms_iter()}
+        assert as_set(MatchPlan.compile(g).automorphisms) == expected
+
+    def test_imports_are_lazy(self):
+        """Importing the engine and the drawing modules loads neither networkx nor matplotlib."""
+        code = ("import sys\n"
+                "import graph, matching, visualization, animation\n"
+                "assert not {'networkx', 'matplotlib'} & set(sys.modules)\n")
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=Path(__file__).parent.parent / "src")
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_rewriting_doesnt_load_networkx(self, backend):
+        """Only VF2 and drawing need the networkx graph (left sides use the default backend)."""
+        code = ("import sys\n"
+                "from conftest import _make_grid\n"
+                "from productions.p0 import P0\n"
+                f"g = _make_grid(3, 3, backend={backend!r})\n"
+                "assert g.apply_all(P0()) == 9\n"
+                "assert 'networkx' not in sys.modules\n")
+        root = Path(__file__).parent.parent
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(root / "src"), str(root / "test")]))
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=root / "src", env=env)
+
+    def test_symmetry_breaking(self, make_grid):
+        """unique=True must give one match per square without enumerating variants."""
+        g = make_grid(3, 3)
+        unique = list(g.iter_matches(P0().plan))
+        assert len(unique) == 9
+        assert {frozenset(m) for m in unique} == \
+            {frozenset(m) for m in g.find_subgraph_isomorphisms(P0().plan)}
+
+
+def corner_pattern() -> Graph:
+    """Two E hyperedges sharing a node (several anchor candidates per match)."""
+    g = Graph()
+    n1, n2, n3 = Node(0, 0, "n1"), Node(1, 0, "n2"), Node(1, 1, "n3")
+    g.add_edge(HyperEdge((n1, n2), "E"), check_nodes=False)
+    g.add_edge(HyperEdge((n2, n3), "E"), check_nodes=False)
+    return g
+
+
+class TestParallelMatching:
+    """Matching in worker processes must give the serial result."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_same_as_serial(self, make_grid, backend):
+        g = make_grid(5, 4, backend=backend)
+        left = P0().get_left_side()
+
+        parallel = g.find_subgraph_isomorphisms(left, workers=2)
+
+        assert as_set(parallel) == as_set(g.find_subgraph_isomorphisms(left))
+        assert len(parallel) == 8 * 5 * 4
+
+    def test_not_with_around(self, make_grid):
+        with pytest.raises(ValueError, match="around"):
+            make_grid(2, 2).find_subgraph_isomorphisms(P0().plan, around=["v0_0"], workers=2)
+
+    def test_several_anchors(self, make_grid):
+        g = make_grid(4, 3)
+        plan = MatchPlan.compile(corner_pattern())
+
+        assert as_set(parallel_matches(g, plan, 3)) == \
+            as_set(g.find_subgraph_isomorphisms(plan))
+        unique = parallel_matches(g, plan, 3, unique=True)
+        assert {frozenset(m) for m in unique} == {frozenset(m) for m in g.iter_matches(plan)}
+        assert len(unique) == len(list(g.iter_matches(plan)))
+
+    def test_partition(self, make_grid):
+        g = make_grid(6, 2)
+        q_edges = [e.label for e in g.hyperedges if e.hypertag == "Q"]
+        groups = partition(g, q_edges, 4)
+
+        assert sorted(label for group in groups for label in group) == sorted(q_edges)
+        assert [len(group) for group in groups] == [3, 3, 3, 3]
+        assert groups[0] == ["Q_v0_0_v0_1_v1_0_v1_1", "Q_v0_1_v0_2_v1_1_v1_2",
+                             "Q_v1_0_v1_1_v2_0_v2_1"]
+
+    def test_apply(self, make_grid):
+        g = make_grid(4, 4)
+        assert g.apply(P0(), workers=2) == 16
+        assert all(e.r == 1 for e in g.hyperedges if e.hypertag == "Q")
+        assert g.count_nodes() == make_grid(4, 4).count_nodes()
+
+
+class CountQNodes(Production):
+    """Test production written against the Graph API of the matched subgraph."""
+
+    seen = []
+
+    def get_left_side(self) -> Graph:
+        return P0().get_left_side()
+
+    def get_right_side(self, left: Graph) -> Graph:
+        return Graph()
+
+    def filter_match(self, matched_graph: Graph) -> bool:
+        self.seen.append((matched_graph.count_nodes(), matched_graph._hyperedges["Q_n1_n2_n3_n4"]))
+        return False
+
+
+class TestMatchView:
+    """Matched subgraphs are passed to productions as MatchView objects."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_lookups(self, make_grid, backend):
+        g = make_grid(1, 1, backend=backend)
+        match = next(g.iter_matches(P0().plan))
+        view = MatchView(g, match)
+
+        q = view.get_hyperedge("Q_n1_n2_n3_n4")
+        assert q.label == "Q_v0_0_v0_1_v1_0_v1_1"
+        assert view.get_node("n1").label == view.graph_label("n1")
+        assert view.get_node("x") is None and "x" not in view
+        assert len(view.nodes) == 4 and len(view.hyperedges) == 5 and len(view) == 9
+        if backend == "networkx":
+            assert q is g.get_hyperedge(q.label)
+
+    def test_no_copy_for_rejected(self, make_grid):
+        views = []
+
+        class Record(P0):
+            def filter_match(self, matched_graph):
+                views.append(matched_graph)
+                return False
+
+        assert make_grid(2, 2).apply(Record()) == 0
+        assert views and all(isinstance(v, MatchView) and v._copy is None for v in views)
+
+    def test_graph_api_shim(self, make_grid):
+        g = make_grid(1, 1)
+        CountQNodes.seen.clear()
+
+        assert g.apply(CountQNodes()) == 0
+
+        count, q = CountQNodes.seen[0]
+        assert (count.normal, count.hyper) == (4, 5)
+        assert q is g.get_hyperedge("Q_v0_0_v0_1_v1_0_v1_1")
@@ -0,0 +1,122 @@
+import pytest
+
+from edge import HyperEdge
+from graph import Graph
+from mesh_io import read_obj, write_obj
+from node import Node
+from productions.p0 import P0
+
+
+MESH = """\
+# two quads sharing the side 2-5
+v 0 0 0
+v 1 0 0
+v 2 0 0
+v 0 1 0
+v 1 1 0
+v 2 1 0
+vn 0 0 1
+f 1 2 5 4
+f 2//1 3//1 6//1 -2//1
+"""
+
+
+@pytest.fixture
+def mesh_file(tmp_path):
+    path = tmp_path / "mesh.obj"
+    path.write_text(MESH)
+    return path
+
+
+class TestReadObj:
+    """Importing quad meshes from OBJ files."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_read(self, mesh_file, backend):
+        g = read_obj(mesh_file, backend=backend)
+
+        assert g.backend == backend
+        assert g.count_nodes().normal == 6
+        assert g.count_nodes().hyper == 9
+        assert g.get_node("v4").x == 1 and g.get_node("v4").y == 1
+
+        q = g.get_hyperedge("Q_v1_v2_v4_v5")
+        assert [n.label for n in q.nodes] == ["v1", "v2", "v5", "v4"]
+        assert q.r == 0
+        assert g.get_hyperedge("E_v1_v4").b == 0
+        assert g.get_hyperedge("E_v0_v1").b == 1
+        assert sorted(g._incident("v1")) == ["E_v0_v1", "E_v1_v2", "E_v1_v4",
+                                             "Q_v0_v1_v3_v4", "Q_v1_v2_v4_v5"]
+        assert g.apply(P0()) == 2
+
+    def test_prefix(self, mesh_file):
+        g = read_obj(mesh_file, prefix="n")
+        assert g.get_hyperedge("E_n0_n1") is not None
+
+    @pytest.mark.parametrize("face, error", [
+        ("f 1 2 3", "quad"),
+        ("f 1 2 3 9", "missing vertex"),
+        ("f 1 2 2 4", "repeats"),
+        ("f 4 5 2 1", "twice"),
+        ("f 0 1 2 3\nv 0 1", "start at 1"),
+        ("f -1 -2 -3 -7", "missing vertex"),
+        ("v 1", ":11: a vertex needs"),
+    ])
+    def test_invalid_faces(self, tmp_path, face, error):
+        path = tmp_path / "bad.obj"
+        path.write_text(MESH + face + "\n")
+        with pytest.raises(ValueError, match=error):
+            read_obj(path)
+
+    def test_relative_indices(self, tmp_path):
+        """Negative indices refer to the vertices read before the face, not to later ones."""
+        path = tmp_path / "relative.obj"
+        path.write_text("v 0 0\nv 1 0\nv 1 1\nv 0 1\nf -4 -3 -2 -1\nv 5 5\n")
+        g = read_obj(path)
+        assert g.get_hyperedge("Q_v0_v1_v2_v3") is not None
+        assert g.count_nodes().normal == 5
+
+
+class TestWriteObj:
+    """Exporting quad meshes to OBJ files."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_round_trip(self, make_grid, tmp_path, backend):
+        g = make_grid(3, 2, backend=backend)
+        g.apply(P0())
+        write_obj(g, tmp_path / "grid.obj")
+
+        loaded = read_obj(tmp_path / "grid.obj")
+
+        assert loaded.count_nodes() == g.count_nodes()
+        boundary = [e for e in loaded.hyperedges if e.hypertag == "E" and e.b == 1]
+        assert len(boundary) == 2 * (3 + 2)
+        coords = {(n.x, n.y) for n in loaded.nodes}
+        assert coords == {(n.x, n.y) for n in g.nodes}
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_removed_node(self, make_grid, tmp_path, backend):
+        g = make_grid(2, 1, backend=backend)
+        g.remove_node("v0_0")
+        with pytest.raises(ValueError, match="refers to a removed node"):
+            write_obj(g, tmp_path / "grid.obj")
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_mixed_face_sizes(self, tmp_path, backend):
+        g = Graph(backend=backend)
+        corners = [(0, 0), (1, 0), (1, 1), (0, 1), (2, 0)]
+        nodes = [Node(x, y, f"n{k}") for k, (x, y) in enumerate(corners)]
+        g.add_nodes(nodes)
+        g.add_edges([HyperEdge(tuple(nodes[:4]), "Q"),
+                     HyperEdge((nodes[1], nodes[4], nodes[2]), "Q")])
+        path = tmp_path / "mixed.obj"
+
+        write_obj(g, path)
+
+        lines = path.read_text().splitlines()
+        assert lines[:2] == ["v 0.0 0.0 0", "v 1.0 0.0 0"]
+        assert lines[5:] == ["f 1 2 3 4", "f 2 5 3"]
+
+    def test_empty(self, tmp_path):
+        write_obj(Graph(), tmp_path / "empty.obj")
+        assert read_obj(tmp_path / "empty.obj").count_nodes().normal == 0
@@ -308,3 +308,14 @@ class TestHyperEdgeR:
 
         e = HyperEdge((n1, n2), "E", r=1)
         assert e.r == 1
+
+    def test_read_only_structure(self):
+        """Nodes and hypertag can't change after the label has been computed."""
+        n1 = Node(0, 0, "n1")
+        n2 = Node(1, 1, "n2")
+
+        e = HyperEdge((n1, n2), "E")
+        with pytest.raises(AttributeError):
+            e.hypertag = "Q"
+        assert e == HyperEdge((n2, n1), "E")
+        assert hash(e) == hash(HyperEdge((n2, n1), "E"))
@@ -0,0 +1,119 @@
+import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba_array
+import numpy as np
+import pytest
+
+from animation import Recorder
+from edge import HyperEdge
+from productions.p0 import P0
+from visualization import R_COLORS, _shapes, draw
+
+
+class TestFastDrawing:
+    """The collection-based renderer of visualization.draw."""
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    @pytest.mark.parametrize("bbox", [None, (0.5, 0.5, 2.5, 1.5)])
+    def test_writes_png(self, make_grid, tmp_path, backend, bbox):
+        g = make_grid(4, 3, backend=backend)
+        g.apply(P0())
+        path = tmp_path / "graph.png"
+
+        draw(g, str(path), mode="fast", bbox=bbox)
+
+        assert path.read_bytes()[:8] == b"\x89PNG\r\n\x1a\n"
+
+    @pytest.mark.parametrize("backend", ["networkx", "array"])
+    def test_geometry(self, make_grid, backend):
+        g = make_grid(3, 1, backend=backend)
+        g.update_edge("Q_v1_0_v1_1_v2_0_v2_1", r=1)
+
+        offsets, xy, r = g._store.tag_geometry("Q")
+        assert list(np.diff(offsets)) == [4, 4, 4]
+        assert sorted(r.tolist()) == [0, 0, 1]
+        assert sorted(g._store.tags()) == ["E", "Q"]
+
+        shapes, keep = _shapes(offsets, xy, (2.2, 0.2, 2.8, 0.8))
+        assert shapes.shape == (1, 4, 2) and keep.sum() == 1
+        assert shapes[0][:, 0].min() == 2
+
+    def test_mixed_sizes(self):
+        offsets = np.array([0, 2, 5])
+        xy = np.array([[0, 0], [1, 0], [5, 5], [6, 5], [6, 6]], dtype=float)
+
+        shapes, keep = _shapes(offsets, xy, (4, 4, 7, 7))
+
+        assert keep.tolist() == [False, True]
+        assert len(shapes) == 1 and shapes[0].shape == (3, 2)
+
+    def test_unknown_mode(self, make_grid, tmp_path):
+        with pytest.raises(ValueError):
+            draw(make_grid(1, 1), str(tmp_path / "graph.png"), mode="svg")
+
+
+class TestRecorder:
+    """animation.Recorder follows the operation log instead of redrawing."""
+
+    def test_frame_sequence(self, make_grid, tmp_path):
+        g = make_grid(2, 2)
+        with Recorder(g, str(tmp_path / "frame-{:02d}.png"), frame_on_commit=True) as recorder:
+            recorder.frame()
+            g.apply(P0())
+
+        assert recorder.frames == 5
+        assert sorted(p.name for p in tmp_path.iterdir())[-1] == "frame-04.png"
+        assert g.log is None
+        assert not plt.get_fignums()
+
+    def test_changed_artists(self, make_grid, tmp_path):
+        g = make_grid(2, 1, backend="array")
+        recorder = Recorder(g, str(tmp_path / "f{}.png"))
+        q = "Q_v0_0_v0_1_v1_0_v1_1"
+        layer, i = recorder._slots[q]
+        layers = len(recorder._layers)
+
+        snapshot = g.snapshot()
+        g.update_edge(q, r=1)
+        g.add_edge(HyperEdge((g.get_node("v0_0"), g.get_node("v1_1")), "E"))
+        recorder.frame()
+        assert layer.rgba[i].tolist() == to_rgba_array(R_COLORS)[1].tolist()
+        assert len(recorder._layers) == layers + 1
+
+        g.rollback(snapshot)
+        recorder.frame()
+        assert layer.rgba[i].tolist() == to_rgba_array(R_COLORS)[0].tolist()
+        assert "E_v0_0_v1_1" not in recorder._slots
+        recorder.close()
+
+    def test_merges_layers(self, make_grid, tmp_path, monkeypatch):
+        monkeypatch.setattr("animation.MAX_LAYERS", 4)
+        g = make_grid(3, 3)
+        recorder = Recorder(g, str(tmp_path / "f{}.png"))
+        q = "Q_v0_0_v0_1_v1_0_v1_1"
+        g.update_edge(q, r=1)
+        for step in range(10):
+            edge = HyperEdge((g.get_node("v0_0"), g.get_node("v3_3")), "E")
+            g.add_edge(edge)
+            recorder.frame()
+            g.remove_node(edge.label)
+            g.remove_node(f"E_v{step % 3}_0_v{step % 3 + 1}_0")
+            recorder.frame()
+            assert len(recorder._layers) <= 4
+
+        slots = recorder._slots
+        assert set(slots) == set(g._nodes) | set(g._hyperedges)
+        assert sum(len(layer.rgba) for layer in recorder._layers) < 2 * len(slots)
+        layer, i = slots[q]
+        assert layer.rgba[i].tolist() == to_rgba_array(R_COLORS)[1].tolist()
+        assert all(layer.rgba[i][3] > 0 for layer, i in slots.values())
+        recorder.close()
+
+    def test_gif(self, make_grid, tmp_path):
+        g = make_grid(2, 2)
+        path = tmp_path / "run.gif"
+        with Recorder(g, path, fps=2) as recorder:
+            recorder.frame()
+            g.apply(P0())
+            recorder.frame()
+
+        assert path.read_bytes()[:4] == b"GIF8"